@@ -0,0 +1,85 @@
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeServer:
+    """Base for the local stand-in servers: an HTTP server on a free localhost port, run in a background thread.
+
+    Every request is delayed by `latency` seconds (with +-50% jitter) before the handler runs.
+    """
+
+    def __init__(self, latency: float = 0.0, seed: int = 0):
+        """
+        :param float latency: Average delay in seconds added to every request
+        :param int seed: Seed for the jitter and error injection
+        """
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.__lock = threading.Lock()
+        self.__httpd = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.__httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass  # keep benchmark output clean
+
+            def do_GET(self):
+                server.delay()
+                server.handle(self, head=False)
+
+            def do_HEAD(self):
+                server.delay()
+                server.handle(self, head=True)
+
+        self.__httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.__httpd.daemon_threads = True
+        threading.Thread(target=self.__httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.__httpd.shutdown()
+        self.__httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def delay(self) -> None:
+        with self.__lock:
+            self.requests += 1
+            jitter = self.random.uniform(0.5, 1.5)
+        if self.latency:
+            time.sleep(self.latency * jitter)
+
+    def chance(self, probability: float) -> bool:
+        with self.__lock:
+            return self.random.random() < probability
+
+    def handle(self, request: BaseHTTPRequestHandler, head: bool) -> None:
+        raise NotImplementedError
+
+    @staticmethod
+    def send(request: BaseHTTPRequestHandler, status: int, body: bytes, content_type: str,
+             headers: dict = None, head: bool = False) -> None:
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.end_headers()
+        if not head:
+            request.wfile.write(body)
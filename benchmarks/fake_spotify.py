@@ -0,0 +1,156 @@
+import io
+import json
+import random
+import re
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse, parse_qs
+
+import spotipy
+from PIL import Image
+
+from .fake_server import FakeServer
+
+WORDS = ('night', 'running', 'golden', 'river', 'electric', 'summer', 'shadow', 'paper', 'silver', 'ocean',
+         'velvet', 'city', 'light', 'heart', 'wild', 'echo', 'fire', 'glass', 'dream', 'north', 'rain', 'static')
+
+
+class Catalog:
+    """Deterministic synthetic Spotify catalog of tracks, albums, playlists and one user."""
+
+    def __init__(self, playlists: int = 4, tracks_per_playlist: int = 150, overlap: float = 0.2,
+                 min_duration: int = 20, max_duration: int = 40, seed: int = 0):
+        """
+        :param int playlists: Number of playlists owned by the user
+        :param int tracks_per_playlist: Tracks in each playlist
+        :param float overlap: Fraction of each playlist taken from tracks already in other playlists
+        :param int min_duration: Shortest track in seconds
+        :param int max_duration: Longest track in seconds
+        :param int seed: Seed for generated names and durations
+        """
+        rng = random.Random(seed)
+        self.user = 'benchuser'
+        self.tracks = {}
+        self.albums = {}
+        self.playlists = {}
+
+        def name(words):
+            return ' '.join(rng.choice(WORDS).capitalize() for _ in range(words))
+
+        for p in range(playlists):
+            playlist_id = f"pl{p:05d}"
+            items = []
+            for _ in range(tracks_per_playlist):
+                if self.tracks and rng.random() < overlap:
+                    items.append(rng.choice(list(self.tracks)))
+                    continue
+
+                # Fill albums up to 10 tracks before starting a new one
+                album_id = f"al{len(self.albums) - 1:05d}"
+                if not self.albums or len(self.albums[album_id]['tracks']) >= 10:
+                    album_id = f"al{len(self.albums):05d}"
+                    self.albums[album_id] = {'name': name(2), 'artist': name(2), 'tracks': []}
+
+                track_id = f"tr{len(self.tracks):06d}"
+                self.tracks[track_id] = {
+                    'name': name(rng.randint(1, 3)),
+                    'album_id': album_id,
+                    'duration_ms': rng.randint(min_duration, max_duration) * 1000,
+                }
+                self.albums[album_id]['tracks'].append(track_id)
+                items.append(track_id)
+            self.playlists[playlist_id] = items
+
+    def track_json(self, track_id: str, base_url: str) -> dict:
+        track = self.tracks[track_id]
+        album = self.albums[track['album_id']]
+        artists = [{'id': 'ar' + track['album_id'][2:], 'name': album['artist']}]
+        return {
+            'id': track_id,
+            'name': track['name'],
+            'duration_ms': track['duration_ms'],
+            'artists': artists,
+            'album': {'id': track['album_id'], 'name': album['name'], 'artists': artists,
+                      'images': [{'url': f"{base_url}/image/{track['album_id']}.jpg"}]},
+        }
+
+    def query(self, track_id: str) -> str:
+        """The default YouTube search query (ARTIST - NAME) for a track."""
+        track = self.tracks[track_id]
+        return f"{self.albums[track['album_id']]['artist']} - {track['name']}"
+
+
+def client(url: str) -> spotipy.Spotify:
+    """Returns a spotipy client that talks to a :py:class:`FakeSpotify` at `url` instead of api.spotify.com."""
+    sp = spotipy.Spotify(auth='offline-benchmark-token', retries=10, status_retries=10, backoff_factor=0.01)
+    sp.prefix = url + '/v1/'
+    return sp
+
+
+class FakeSpotify(FakeServer):
+    """Local stand-in for the parts of the Spotify Web API that Spotify2MP3 uses.
+
+    Requests are randomly answered with 429 Too Many Requests at `throttle_rate`, like the real API does under load.
+    """
+
+    def __init__(self, catalog: Catalog, latency: float = 0.0, throttle_rate: float = 0.0, seed: int = 0):
+        """
+        :param Catalog catalog: Catalog to serve
+        :param float latency: Average delay in seconds added to every request
+        :param float throttle_rate: Fraction of requests answered with 429
+        :param int seed: Seed for the jitter and error injection
+        """
+        super().__init__(latency=latency, seed=seed)
+        self.catalog = catalog
+        self.throttle_rate = throttle_rate
+        self.throttled = 0
+
+        image = io.BytesIO()
+        Image.new('RGB', (640, 640), (30, 120, 200)).save(image, format='JPEG')
+        self.image = image.getvalue()
+
+    def handle(self, request, head):
+        url = urlparse(request.path)
+        path = url.path.rstrip('/')
+        params = {key: value[0] for key, value in parse_qs(url.query).items()}
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 50))
+
+        if path.startswith('/image/'):
+            return self.send(request, 200, self.image, 'image/jpeg', head=head)
+
+        if self.chance(self.throttle_rate):
+            self.throttled += 1
+            body = json.dumps({'error': {'status': 429, 'message': 'API rate limit exceeded'}}).encode()
+            return self.send(request, 429, body, 'application/json', {'Retry-After': '0'}, head=head)
+
+        catalog = self.catalog
+        match = re.fullmatch(r'/v1/(\w+)(?:/(\w+))?(?:/(\w+))?', path)
+        kind, id, sub = match.groups() if match else (None, None, None)
+
+        if kind == 'tracks' and id in catalog.tracks:
+            result = catalog.track_json(id, self.url)
+        elif kind == 'playlists' and sub == 'tracks' and id in catalog.playlists:
+            added = datetime(2024, 1, 1, tzinfo=timezone.utc)
+            result = self.__page(list(enumerate(catalog.playlists[id])), offset, limit)
+            result['items'] = [{'added_at': (added + timedelta(hours=i)).isoformat().replace('+00:00', 'Z'),
+                                'track': catalog.track_json(track_id, self.url)} for i, track_id in result['items']]
+        elif kind == 'albums' and id in catalog.albums and sub is None:
+            result = {'id': id, 'name': catalog.albums[id]['name']}
+        elif kind == 'albums' and sub == 'tracks' and id in catalog.albums:
+            result = self.__page([{'id': track_id} for track_id in catalog.albums[id]['tracks']], offset, limit)
+        elif kind == 'users' and sub == 'playlists' and id == catalog.user:
+            result = self.__page([{'id': playlist_id} for playlist_id in catalog.playlists], offset, limit)
+        elif kind == 'search':
+            query = params.get('q', '').split(':', 1)[-1].lower()
+            items = [catalog.track_json(track_id, self.url) for track_id, track in catalog.tracks.items()
+                     if query in track['name'].lower()][:limit]
+            result = {'tracks': {'items': items, 'total': len(items)}}
+        else:
+            body = json.dumps({'error': {'status': 404, 'message': 'Not found'}}).encode()
+            return self.send(request, 404, body, 'application/json', head=head)
+
+        self.send(request, 200, json.dumps(result).encode(), 'application/json', head=head)
+
+    @staticmethod
+    def __page(items: list, offset: int, limit: int) -> dict:
+        return {'items': items[offset:offset + limit], 'total': len(items), 'offset': offset, 'limit': limit}
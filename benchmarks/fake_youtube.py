@@ -0,0 +1,174 @@
+import io
+import json
+import math
+import re
+import struct
+import wave
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from .fake_server import FakeServer
+from .fake_spotify import Catalog
+
+SAMPLE_RATES = {48: 6000, 64: 8000, 128: 16000}  # abr (kbps) -> sample rate of 8-bit mono audio
+
+
+def synthetic_wav(seconds: int, sample_rate: int, frequency: float = 440.0) -> bytes:
+    """Returns an 8-bit mono WAV file with a sine tone."""
+    period = [int(128 + 100 * math.sin(2 * math.pi * frequency * i / sample_rate)) for i in range(sample_rate)]
+    one_second = struct.pack(f'{sample_rate}B', *period)
+
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(1)
+        wav.setframerate(sample_rate)
+        wav.writeframes(one_second * seconds)
+    return out.getvalue()
+
+
+class FakeYouTube(FakeServer):
+    """Local stand-in for YouTube search and audio streams.
+
+    Every catalog track has three videos: the right one, a live version that is 90 seconds longer and a cover by
+    another channel, so the resolver has something to reject. Audio is served with HTTP Range support, and
+    responses are cut off halfway at `drop_rate` to exercise resuming.
+    """
+
+    def __init__(self, catalog: Catalog, latency: float = 0.0, drop_rate: float = 0.0, seed: int = 0):
+        """
+        :param Catalog catalog: Catalog the videos are generated from
+        :param float latency: Average delay in seconds added to every request
+        :param float drop_rate: Fraction of audio responses cut off halfway
+        :param int seed: Seed for the jitter and error injection
+        """
+        super().__init__(latency=latency, seed=seed)
+        self.catalog = catalog
+        self.drop_rate = drop_rate
+        self.dropped = 0
+        self.queries = {catalog.query(track_id).lower(): track_id for track_id in catalog.tracks}
+
+    def videos(self, track_id: str) -> list[dict]:
+        track = self.catalog.tracks[track_id]
+        artist = self.catalog.albums[track['album_id']]['artist']
+        length = track['duration_ms'] // 1000
+        return [
+            {'video_id': 'l' + track_id, 'title': f"{artist} - {track['name']} (Live)", 'author': artist,
+             'length': length + 90},
+            {'video_id': 'v' + track_id, 'title': f"{artist} - {track['name']} (Official Audio)", 'author': artist,
+             'length': length},
+            {'video_id': 'c' + track_id, 'title': f"{track['name']} cover", 'author': 'Bedroom Covers',
+             'length': length + 5},
+        ]
+
+    def handle(self, request, head):
+        url = urlparse(request.path)
+        params = {key: value[0] for key, value in parse_qs(url.query).items()}
+
+        if url.path == '/search':
+            track_id = self.queries.get(params.get('q', '').lower())
+            results = self.videos(track_id) if track_id is not None else []
+            return self.send(request, 200, json.dumps(results).encode(), 'application/json', head=head)
+
+        if url.path == '/watch':
+            video_id = params.get('v', '')
+            if video_id[1:] not in self.catalog.tracks:
+                return self.send(request, 404, b'', 'text/plain', head=head)
+            video = next(v for v in self.videos(video_id[1:]) if v['video_id'] == video_id)
+            return self.send(request, 200, json.dumps(video).encode(), 'application/json', head=head)
+
+        match = re.fullmatch(r'/audio/([lvc])(\w+)/(\d+)\.wav', url.path)
+        if match is None or match[2] not in self.catalog.tracks or int(match[3]) not in SAMPLE_RATES:
+            return self.send(request, 404, b'', 'text/plain', head=head)
+
+        kind, track_id, abr = match[1], match[2], int(match[3])
+        seconds = next(v['length'] for v in self.videos(track_id) if v['video_id'] == kind + track_id)
+        data = synthetic_wav(seconds, SAMPLE_RATES[abr])
+
+        start, end = 0, len(data) - 1
+        status = 200
+        range_header = request.headers.get('Range')
+        if range_header:
+            range_match = re.fullmatch(r'bytes=(\d+)-(\d*)', range_header)
+            start = int(range_match[1])
+            end = min(int(range_match[2]), end) if range_match[2] else end
+            if start >= len(data):
+                return self.send(request, 416, b'', 'audio/wav', head=head)
+            status = 206
+
+        body = data[start:end + 1]
+        headers = {'Accept-Ranges': 'bytes', 'Content-Range': f"bytes {start}-{end}/{len(data)}"}
+        if head:
+            return self.send(request, 200, data, 'audio/wav', {'Accept-Ranges': 'bytes'}, head=True)
+
+        if len(body) > 1 and self.chance(self.drop_rate):
+            self.dropped += 1
+            request.send_response(status)
+            request.send_header('Content-Length', str(len(body)))
+            for key, value in headers.items():
+                request.send_header(key, value)
+            request.end_headers()
+            request.wfile.write(body[:len(body) // 2])
+            request.close_connection = True
+            return
+
+        self.send(request, status, body, 'audio/wav', headers)
+
+
+class FakeStream:
+    """Has the attributes of a pytubefix Stream that Spotify2MP3 uses."""
+
+    def __init__(self, base_url: str, video: dict, abr: int):
+        self.abr = f"{abr}kbps"
+        self.itag = abr
+        self.audio_codec = 'pcm'
+        self.mime_type = 'audio/wav'
+        self.url = f"{base_url}/audio/{video['video_id']}/{abr}.wav"
+        self.default_filename = f"{video['video_id']}-{abr}.wav"
+        self._filesize = 44 + video['length'] * SAMPLE_RATES[abr]  # WAV header + 8-bit mono samples
+
+
+class FakeStreamQuery(list):
+    def filter(self, only_audio: bool = False, **kwargs):
+        return self
+
+    def get_by_itag(self, itag: int):
+        return next((stream for stream in self if stream.itag == int(itag)), None)
+
+
+class FakeVideo:
+    """Has the attributes of a pytubefix YouTube object that Spotify2MP3 uses."""
+
+    def __init__(self, base_url: str, video: dict):
+        self.video_id = video['video_id']
+        self.title = video['title']
+        self.author = video['author']
+        self.length = video['length']
+        self.watch_url = f"{base_url}/watch?v={self.video_id}"
+        self.streams = FakeStreamQuery(FakeStream(base_url, video, abr) for abr in SAMPLE_RATES)
+
+
+def searcher(url: str, session: requests.Session = None):
+    """Returns a search function for :py:class:`smp3.Resolver` that queries a :py:class:`FakeYouTube` at `url`."""
+    session = session if session is not None else requests.Session()
+
+    def search(query: str) -> list[FakeVideo]:
+        response = session.get(f"{url}/search", params={'q': query}, timeout=30)
+        response.raise_for_status()
+        return [FakeVideo(url, video) for video in response.json()]
+
+    return search
+
+
+def opener(url: str, session: requests.Session = None):
+    """Returns a function for :py:class:`smp3.Resolver` that opens videos of a :py:class:`FakeYouTube` at `url` by
+    their watch URL."""
+    session = session if session is not None else requests.Session()
+
+    def open_video(watch_url: str) -> FakeVideo:
+        response = session.get(watch_url, timeout=30)
+        response.raise_for_status()
+        return FakeVideo(url, response.json())
+
+    return open_video
@@ -0,0 +1,56 @@
+import os
+import random
+
+import music_tag
+
+from .fake_spotify import Catalog
+
+# One silent MPEG-1 Layer III frame: 128kbps, 44.1kHz, mono, no padding. 417 bytes, ~26ms of audio
+SILENT_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC0]) + bytes(413)
+
+
+def generate_library(root: str, catalog: Catalog, size: int = 500, duplicate_ratio: float = 0.2,
+                     folders: int = 5, seconds: int = 2, seed: int = 0) -> list[str]:
+    """Writes a library of tagged, silent MP3s spread over several folders, like per-playlist download folders.
+
+    A `duplicate_ratio` fraction of the files repeat the title and artist of an earlier file in another folder.
+
+    :param str root: Directory to create the library in
+    :param Catalog catalog: Catalog to take titles, artists and albums from
+    :param int size: Number of files
+    :param float duplicate_ratio: Fraction of files that are duplicates
+    :param int folders: Number of folders to spread the files over
+    :param int seconds: Length of every file
+    :param int seed: Seed for picking tracks and duplicates
+    :return: Paths of the created files
+    :rtype: list[str]
+    """
+    rng = random.Random(seed)
+    track_ids = list(catalog.tracks)
+    audio = SILENT_FRAME * int(seconds / 0.026)
+
+    written = []  # track ids already in the library
+    paths = []
+    for i in range(size):
+        if written and rng.random() < duplicate_ratio:
+            track_id = rng.choice(written)
+        else:
+            track_id = track_ids[len(written) % len(track_ids)]
+            written.append(track_id)
+
+        folder = os.path.join(root, f"playlist-{rng.randrange(folders):02d}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{i:06d}.mp3")
+        with open(path, 'wb') as file:
+            file.write(audio)
+
+        track = catalog.tracks[track_id]
+        album = catalog.albums[track['album_id']]
+        f = music_tag.load_file(path)
+        f['title'] = track['name']
+        f['artist'] = album['artist']
+        f['album'] = album['name']
+        f.save()
+
+        paths.append(path)
+    return paths
@@ -0,0 +1,158 @@
+"""Offline end-to-end benchmarks for Spotify2MP3.
+
+Spotify and YouTube are replaced by local servers, so results only depend on this machine and the configured
+latency and error injection. Run from the repository root:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --update-baseline
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from .fake_spotify import Catalog, FakeSpotify
+from .fake_youtube import FakeYouTube
+from .stages import STAGES, run_stage
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def percentile(values: list, p: float) -> float | None:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+
+def latency_summary(values: list) -> dict:
+    return {f"p{p}_ms": None if percentile(values, p) is None else round(percentile(values, p) * 1000, 2)
+            for p in (50, 90, 99)}
+
+
+def summarize(result: dict) -> dict:
+    summary = {
+        'items': result['items'],
+        'seconds': round(result['seconds'], 3),
+        'throughput': round(result['items'] / result['seconds'], 2) if result['seconds'] else None,
+        'latency': latency_summary(result['latencies']),
+        'peak_rss_mb': None if result['peak_rss_mb'] is None else round(result['peak_rss_mb'], 1),
+    }
+    if result.get('substages'):
+        summary['substages'] = {stage: latency_summary(values) for stage, values in result['substages'].items()}
+    return summary
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns a description of every metric that got worse than the baseline by more than `tolerance`."""
+    regressions = []
+    for stage, current in report.items():
+        base = baseline.get(stage)
+        if base is None:
+            continue
+        if base['throughput'] and (current['throughput'] or 0) < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{stage}: throughput {current['throughput']}/s, baseline {base['throughput']}/s")
+        if base['latency']['p90_ms'] and current['latency']['p90_ms'] is not None \
+                and current['latency']['p90_ms'] > base['latency']['p90_ms'] * (1 + tolerance):
+            regressions.append(f"{stage}: p90 latency {current['latency']['p90_ms']}ms, "
+                               f"baseline {base['latency']['p90_ms']}ms")
+        if base['peak_rss_mb'] and current['peak_rss_mb'] is not None \
+                and current['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{stage}: peak RSS {current['peak_rss_mb']}MB, baseline {base['peak_rss_mb']}MB")
+    return regressions
+
+
+def print_report(report: dict) -> None:
+    print(f"{'stage':<24}{'items':>8}{'seconds':>10}{'items/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+          f"{'RSS MB':>9}")
+    for stage, s in report.items():
+        lat = s['latency']
+        print(f"{stage:<24}{s['items']:>8}{s['seconds']:>10}{str(s['throughput']):>10}{str(lat['p50_ms']):>10}"
+              f"{str(lat['p90_ms']):>10}{str(lat['p99_ms']):>10}{str(s['peak_rss_mb']):>9}")
+        for substage, sub in s.get('substages', {}).items():
+            print(f"  {substage:<38}{str(sub['p50_ms']):>10}{str(sub['p90_ms']):>10}{str(sub['p99_ms']):>10}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmarks for Spotify2MP3.')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES), help='Stages to run')
+    parser.add_argument('--playlists', type=int, default=4, help='Playlists in the fake catalog')
+    parser.add_argument('--tracks-per-playlist', type=int, default=150, help='Tracks in each playlist')
+    parser.add_argument('--download-tracks', type=int, default=20, help='Tracks downloaded by download_tracks')
+    parser.add_argument('--library-size', type=int, default=500, help='Files in the find_duplicates library')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.2, help='Fraction of duplicate library files')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Average latency of the fake servers')
+    parser.add_argument('--throttle-rate', type=float, default=0.05, help='Fraction of Spotify requests answered 429')
+    parser.add_argument('--drop-rate', type=float, default=0.1, help='Fraction of audio responses cut off')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the catalog and error injection')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline file to compare with')
+    parser.add_argument('--update-baseline', action='store_true', help='Save this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed regression, as a fraction')
+    parser.add_argument('--output', type=str, help='File to save the report to (JSON)')
+    args = parser.parse_args()
+
+    stages = list(args.stages)
+    if 'download_tracks' in stages and shutil.which('ffmpeg') is None:
+        print('ffmpeg not found, skipping download_tracks')
+        stages.remove('download_tracks')
+
+    catalog_config = {'playlists': args.playlists, 'tracks_per_playlist': args.tracks_per_playlist,
+                      'seed': args.seed}
+    catalog = Catalog(**catalog_config)
+    latency = args.latency_ms / 1000
+
+    report = {}
+    with FakeSpotify(catalog, latency=latency, throttle_rate=args.throttle_rate, seed=args.seed) as spotify, \
+            FakeYouTube(catalog, latency=latency, drop_rate=args.drop_rate, seed=args.seed) as youtube:
+        config = {
+            'spotify_url': spotify.url,
+            'youtube_url': youtube.url,
+            'user': catalog.user,
+            'playlists': list(catalog.playlists),
+            'download_tracks': args.download_tracks,
+            'library_size': args.library_size,
+            'duplicate_ratio': args.duplicate_ratio,
+            'catalog': catalog_config,
+        }
+        for stage in stages:
+            print(f"Running {stage}...")
+            # A fresh process per stage, so peak RSS is that stage's alone
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                report[stage] = summarize(pool.submit(run_stage, stage, config).result())
+
+        print(f"\n{spotify.requests} Spotify requests ({spotify.throttled} throttled), "
+              f"{youtube.requests} YouTube requests ({youtube.dropped} dropped)\n")
+
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('\nNo baseline to compare with, run with --update-baseline to create one')
+        return 0
+
+    with open(args.baseline) as file:
+        regressions = compare(report, json.load(file), args.tolerance)
+    if regressions:
+        print('\nRegressions:')
+        for regression in regressions:
+            print(' ', regression)
+        return 1
+    print('\nNo regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Benchmark stages. Each one runs in its own process so its peak memory use can be measured on its own."""
+import io
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from smp3 import Spotify2MP3, Resolver, metrics
+from smp3.utils import find_duplicates
+
+from . import fake_spotify, fake_youtube
+from .fake_spotify import Catalog
+from .library import generate_library
+
+
+def run_stage(name: str, config: dict) -> dict:
+    """Runs a stage and returns {'items', 'seconds', 'latencies', 'substages', 'peak_rss_mb'}."""
+    with redirect_stdout(io.StringIO()):  # Spotify2MP3 prints progress
+        result = STAGES[name](config)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def client(config: dict) -> Spotify2MP3:
+    s = Spotify2MP3(client_id='offline', client_secret='offline')
+    s.sp = fake_spotify.client(config['spotify_url'])
+    s.resolver = Resolver(search=fake_youtube.searcher(config['youtube_url']),
+                          opener=fake_youtube.opener(config['youtube_url']))
+    return s
+
+
+def get_playlist_tracks(config: dict) -> dict:
+    s = client(config)
+    latencies = []
+    items = 0
+    start = time.perf_counter()
+    for playlist_id in config['playlists']:
+        call_start = time.perf_counter()
+        items += len(s.get_playlist_tracks(playlist_id))
+        latencies.append(time.perf_counter() - call_start)
+    return {'items': items, 'seconds': time.perf_counter() - start, 'latencies': latencies}
+
+
+def get_user_tracks(config: dict) -> dict:
+    s = client(config)
+    start = time.perf_counter()
+    items = len(s.get_user_tracks(config['user']))
+    seconds = time.perf_counter() - start
+    return {'items': items, 'seconds': seconds, 'latencies': [seconds]}
+
+
+def download_tracks(config: dict) -> dict:
+    s = client(config)
+    tracks = s.get_playlist_tracks(config['playlists'][0])
+    for track_id in list(tracks)[config['download_tracks']:]:
+        del tracks[track_id]
+
+    substages = {}
+    started = {}
+    latencies = []
+
+    def on_event(event):
+        if 'previous_stage' in event:
+            substages.setdefault(event['previous_stage'], []).append(event['duration'])
+        if event['stage'] == 'searching':
+            started[event['track']] = event['time']
+        elif event['stage'] == 'added_metadata':
+            latencies.append(event['time'] - started.pop(event['track']))
+
+    metrics.subscribe(on_event)
+    with tempfile.TemporaryDirectory() as download_dir:
+        s.set_dir(download_dir)
+        start = time.perf_counter()
+        paths = s.download_tracks(tracks)
+        seconds = time.perf_counter() - start
+    metrics.unsubscribe(on_event)
+
+    return {'items': len(paths), 'seconds': seconds, 'latencies': latencies, 'substages': substages}
+
+
+def find_duplicates_stage(config: dict) -> dict:
+    catalog = Catalog(**config['catalog'])
+    with tempfile.TemporaryDirectory() as library_dir:
+        generate_library(library_dir, catalog, size=config['library_size'],
+                         duplicate_ratio=config['duplicate_ratio'], seed=config['catalog']['seed'])
+        start = time.perf_counter()
+        find_duplicates(library_dir)
+        seconds = time.perf_counter() - start
+    return {'items': config['library_size'], 'seconds': seconds, 'latencies': []}
+
+
+STAGES = {
+    'get_playlist_tracks': get_playlist_tracks,
+    'get_user_tracks': get_user_tracks,
+    'download_tracks': download_tracks,
+    'find_duplicates': find_duplicates_stage,
+}
@@ -1,7 +1,12 @@
 import argparse
-from os.path import exists, isdir, isfile
+from contextlib import nullcontext
+from os.path import abspath, exists, isdir, isfile
 # Local
-from smp3 import Spotify2MP3, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SAVE_PATH, DOWNLOAD_PATH
+from smp3 import Spotify2MP3, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SAVE_PATH, DOWNLOAD_PATH, metrics, \
+    profile, WorkQueue, ServiceClient, Timeouts, Hedger, TracksDict
+from smp3.arguments import add_network_arguments, add_quality_arguments, add_target_arguments, add_store_arguments, \
+    apply_network, apply_quality, apply_targets, apply_store
+from smp3.scheduler import POLICIES, get_policy, by_priority
 
 parser = argparse.ArgumentParser(description="""Spotify2MP3 is a simple and easy Python module and (command-line utility) for downloading songs from Spotify.
 Song metadata collected from Spotify is used to search YouTube and download audio.""", formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -11,14 +16,50 @@ group = parser.add_mutually_exclusive_group(required=True)
 group.add_argument('-i', '--id', metavar='id', type=str, help='Spotify ID/URI/URL')
 group.add_argument('-n', '--name', metavar='name', type=str, help='Name of Track/Playlist/Album/Artist')
 group.add_argument('-nl', '--namelist', metavar='namelist', type=str, help='location of file with list of Track/Playlist/Album/Artist')
+group.add_argument('-e', '--execute', metavar='plan', type=str, help='With --download, download the tracks of a plan saved with --plan')
 
 group2 = parser.add_mutually_exclusive_group(required=True)
 group2.add_argument('-s', '--save', metavar='save', help='*.txt file to save song metadata, leave value empty if set in __init__', nargs='?', const=True)
 group2.add_argument('-d', '--download', metavar='download', help='Path/folder to download tracks, leave value empty if set in __init__', nargs='?', const=True)
+group2.add_argument('-r', '--retag', metavar='retag', help='Update the tags of tracks already downloaded to path/folder, leave value empty if set in __init__. The Spotify ID is kept in the comment tag, after any comment already there', nargs='?', const=True)
+group2.add_argument('-q', '--queue', metavar='queue', type=str, help='Work queue database to add tracks to, for worker.py to download')
+
+add_network_arguments(parser)
+add_quality_arguments(parser)
+add_target_arguments(parser)
+add_store_arguments(parser)
+parser.add_argument('--search-timeout', metavar='seconds', type=float, help='Skip tracks whose YouTube search takes longer, e.g. 60')
+parser.add_argument('--download-timeout', metavar='seconds', type=float, help='Skip tracks whose download takes longer')
+parser.add_argument('--hedge', action='store_true', help='Repeat unusually slow searches and Spotify requests, and use whichever finishes first')
+parser.add_argument('--refresh-artwork', action='store_true', help='With --retag, fetch artwork again even if it is cached')
+parser.add_argument('--plan', metavar='path', type=str, help='With --download, only plan the download: find tracks already downloaded, pick YouTube streams, estimate size and time, and save the plan (JSON) to path')
+parser.add_argument('--plan-metrics', metavar='path', type=str, help='With --plan, metrics (JSON) exported with --metrics from an earlier download, to estimate time with')
+parser.add_argument('--schedule', type=str, choices=list(POLICIES), help='Order to download tracks in. Choices: insertion, newest (recently added first), shortest, round-robin (across playlists)')
+parser.add_argument('--priority', metavar='ID=N', type=str, action='append', help='Download a track, or the tracks of a playlist/album, before others. Higher N first, others are 0. Repeat for several')
+parser.add_argument('--workers', metavar='N', type=int, default=1, help='Number of tracks to download or retag at once')
+parser.add_argument('--progress', type=str, choices=['bar', 'quiet', 'json'], default='bar', help='Progress output. Choices: bar, quiet, json')
+parser.add_argument('--profile', metavar='path', type=str, help='Profile the run by stage and save the report (JSON) to path')
+parser.add_argument('--batch', metavar='name', type=str, default='default', help='Batch name for tracks added to the work queue')
+parser.add_argument('--server', metavar='URL', type=str, help='Send the job to a running service (service.py) instead of running it here')
+parser.add_argument('--wait', action='store_true', help='With --server, wait for the job to finish and print the result')
+parser.add_argument('--metrics', metavar='path', type=str, help='File to export download metrics to, Prometheus format if it ends with .prom, else JSON')
 
 
 args = parser.parse_args()
 
+apply_network(args)
+
+
+def set_schedule(s):
+    if args.priority:
+        priorities = {}
+        for priority in args.priority:
+            id, _, value = priority.rpartition('=')
+            priorities[id] = int(value)
+        s.set_schedule(by_priority(priorities, then=get_policy(args.schedule or 'insertion')))
+    elif args.schedule is not None:
+        s.set_schedule(args.schedule)
+
 
 def save(s, savefile):
     if args.name is not None:
@@ -46,7 +87,23 @@ def save(s, savefile):
 
 def download(s, downloadpath):
     s.set_dir(dir=downloadpath)
-    if args.name is not None:
+    s.set_progress(args.progress)
+    apply_targets(s, args)
+    apply_store(s, args)
+    set_schedule(s)
+    s.set_timeouts(Timeouts(search=args.search_timeout, download=args.download_timeout))
+    if args.hedge:
+        s.set_hedging(Hedger())
+    apply_quality(s, args)
+    if args.execute is not None:
+        s.execute_plan(plan=args.execute, workers=args.workers)
+    elif args.plan is not None:
+        tracks = TracksDict()
+        for id in get_ids(s):
+            tracks.update(s.get_tracks(id=id, type=args.type))
+        plan = s.plan_tracks(tracks=tracks, workers=args.workers, metrics_file=args.plan_metrics)
+        plan.save(args.plan)
+    elif args.name is not None:
         s.download_name(query=args.name, type=args.type)
     elif args.namelist is not None:
         s.download_namelist(file_path=args.namelist, type=args.type)
@@ -56,20 +113,101 @@ def download(s, downloadpath):
             s.download_track(track=track)
         elif args.type == 'playlist':
             playlist = s.get_playlist_tracks(playlist_id=args.id)
-            s.download_tracks(tracks=playlist)
+            s.download_tracks(tracks=playlist, workers=args.workers)
         elif args.type == 'album':
             album = s.get_album_tracks(album_id=args.id)
-            s.download_tracks(tracks=album)
+            s.download_tracks(tracks=album, workers=args.workers)
         elif args.type == 'user':
             user = s.get_user_tracks(user_id=args.id)
-            s.download_tracks(tracks=user)
+            s.download_tracks(tracks=user, workers=args.workers)
+
+    if args.metrics is not None:
+        if args.metrics.endswith('.prom'):
+            metrics.export_prometheus(args.metrics)
+        else:
+            metrics.export_json(args.metrics)
+
+
+
+def get_ids(s):
+    if args.id is not None:
+        ids = [args.id]
+    else:
+        if args.name is not None:
+            names = [args.name]
+        else:
+            with open(args.namelist, 'r', encoding='utf-8') as file:
+                names = [line.strip() for line in file if line.strip()]
+        ids = []
+        for name in names:
+            id = s.search_id(query=name, type=args.type)
+            if id is None:
+                print("ERROR: Could not find", name)
+            else:
+                ids.append(id)
+    return ids
+
+
+def enqueue(s, queuepath):
+    queue = WorkQueue(queuepath)
+    set_schedule(s)
+    for id in get_ids(s):
+        s.enqueue_tracks(tracks=s.get_tracks(id=id, type=args.type), queue=queue, batch=args.batch)
+
+
+def retag(s, retagpath):
+    s.set_dir(dir=retagpath)
+    s.set_progress(args.progress)
+    tracks = TracksDict()
+    for id in get_ids(s):
+        tracks.update(s.get_tracks(id=id, type=args.type))
+    s.retag_tracks(tracks=tracks, workers=args.workers, refresh_artwork=args.refresh_artwork)
+
+
+
+def submit(url):
+    request = {'type': args.type, 'workers': args.workers}
+    if args.schedule is not None:
+        request['schedule'] = args.schedule
+    if args.priority:
+        raise ValueError("--priority cannot be sent to a service, use --schedule")
+    if args.id is not None:
+        request['id'] = args.id
+    elif args.name is not None:
+        request['name'] = args.name
+    else:
+        with open(args.namelist, 'r', encoding='utf-8') as file:
+            request['namelist'] = [line.strip() for line in file if line.strip()]
+
+    if args.save:
+        request['action'] = 'save'
+        request['output_file'] = abspath(SAVE_PATH if args.save == True else args.save)
+    elif args.download:
+        request['action'] = 'download'
+        if args.download != True:
+            request['dir'] = abspath(args.download)
+    else:
+        raise ValueError("--server can only be used with --save or --download")
+
+    client = ServiceClient(url)
+    job = client.submit(request)
+    print("Job", job['id'], job['status'])
+    if args.wait:
+        job = client.wait(job['id'])
+        print(job['log'], end='')
+        print("Job", job['id'], job['status'] + (f": {job['error']}" if job['error'] else ''))
+        if request['action'] == 'download':
+            print(job['downloaded'], 'of', job['tracks'], 'tracks downloaded')
 
 
 
 if args.type == 'user' and args.name is not None:
     raise TypeError("Cannot get user tracks with user's name")
 
-if args.save:
+if args.server is not None:
+    submit(args.server)
+
+elif args.save:
     if args.save == True:
         savefile = SAVE_PATH
     else:
@@ -82,8 +220,9 @@ if args.save:
     elif not isfile(savefile):
         raise ValueError("Provided path is not a file")
     else:
-        s = Spotify2MP3(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
-        save(s, savefile)
+        with profile(args.profile) if args.profile else nullcontext():
+            s = Spotify2MP3(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
+            save(s, savefile)
 
 elif args.download:
     if args.download == True:
@@ -98,7 +237,28 @@ elif args.download:
     elif not isdir(downloadpath):
         raise ValueError("Provided path is not a directory")
     else:
+        with profile(args.profile) if args.profile else nullcontext():
+            s = Spotify2MP3(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
+            download(s, downloadpath)
+
+elif args.queue:
+    with profile(args.profile) if args.profile else nullcontext():
         s = Spotify2MP3(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
-        download(s, downloadpath)
+        enqueue(s, args.queue)
 
+elif args.retag:
+    if args.retag == True:
+        retagpath = DOWNLOAD_PATH
+    else:
+        retagpath = args.retag
 
+    if not isinstance(retagpath, str):
+        raise ValueError("Retag path must be a str type")
+    elif not exists(retagpath):
+        raise FileNotFoundError("Retag directory does not exist.")
+    elif not isdir(retagpath):
+        raise ValueError("Provided path is not a directory")
+    else:
+        with profile(args.profile) if args.profile else nullcontext():
+            s = Spotify2MP3(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
+            retag(s, retagpath)
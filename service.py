@@ -0,0 +1,79 @@
+import argparse
+import json
+import signal
+import threading
+from os.path import exists, isdir
+# Local
+from smp3 import Spotify2MP3, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, DOWNLOAD_PATH, Service, ServiceClient
+from smp3.arguments import add_network_arguments, add_quality_arguments, add_target_arguments, add_store_arguments, \
+    apply_network, apply_quality, apply_targets, apply_store
+
+parser = argparse.ArgumentParser(description="""Runs Spotify2MP3 as a service, so the Spotify token, connections and caches
+stay warm between downloads. Send jobs with `cli.py ... --server URL`, and check on them with the status and cancel
+commands.""", formatter_class=argparse.RawDescriptionHelpFormatter)
+commands = parser.add_subparsers(dest='command', required=True)
+
+serve = commands.add_parser('serve', help='Start the service')
+serve.add_argument('-d', '--download', metavar='download', help='Default path/folder to download tracks, leave value empty if set in __init__', nargs='?', const=True)
+serve.add_argument('--host', type=str, default='127.0.0.1', help='Interface to listen on, localhost by default')
+serve.add_argument('--port', type=int, default=8765, help='Port to listen on')
+serve.add_argument('--jobs', metavar='N', type=int, default=2, help='Number of jobs to run at once')
+serve.add_argument('--workers', metavar='N', type=int, default=1, help='Number of tracks each job downloads at once')
+add_network_arguments(serve)
+add_quality_arguments(serve)
+add_target_arguments(serve)
+add_store_arguments(serve)
+
+status = commands.add_parser('status', help='Show all jobs, or one job with its output')
+status.add_argument('job', nargs='?', type=str, help='ID of the job')
+status.add_argument('--server', metavar='URL', type=str, default='http://127.0.0.1:8765', help='Address of the service')
+
+cancel = commands.add_parser('cancel', help='Cancel a job')
+cancel.add_argument('job', type=str, help='ID of the job')
+cancel.add_argument('--server', metavar='URL', type=str, default='http://127.0.0.1:8765', help='Address of the service')
+
+
+args = parser.parse_args()
+
+if args.command == 'serve':
+    downloadpath = DOWNLOAD_PATH if args.download == True else args.download
+    if downloadpath is not None:
+        if not isinstance(downloadpath, str):
+            raise ValueError("Download path must be a str type")
+        elif not exists(downloadpath):
+            raise FileNotFoundError("Download directory does not exist.")
+        elif not isdir(downloadpath):
+            raise ValueError("Provided path is not a directory")
+
+    apply_network(args)
+
+    s = Spotify2MP3(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
+    if downloadpath is not None:
+        s.set_dir(dir=downloadpath)
+    apply_targets(s, args)
+    apply_store(s, args)
+    apply_quality(s, args)
+
+    service = Service(s, jobs=args.jobs, workers=args.workers)
+    service.warm()
+
+    # serve_forever blocks, so it runs in its own thread and the main thread waits for Ctrl+C/SIGTERM
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    thread = threading.Thread(target=service.serve, args=(args.host, args.port), daemon=True)
+    thread.start()
+    print(f"Listening on http://{args.host}:{args.port}")
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    print("Stopping, waiting for running downloads to finish...")
+    service.shutdown()
+
+elif args.command == 'status':
+    client = ServiceClient(args.server)
+    print(json.dumps(client.status(args.job) if args.job else client.jobs(), indent=2))
+
+elif args.command == 'cancel':
+    print(json.dumps(ServiceClient(args.server).cancel(args.job), indent=2))
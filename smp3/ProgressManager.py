@@ -1,86 +1,162 @@
-import sys
+import json
+import threading
+import time
 
+from .capture import original_stdout
+from .metrics import Metrics, metrics as default_metrics
 
-class ProgressManager:
+MODES = ('bar', 'quiet', 'json')
 
-    def __init__(self, tracks):
-        self.name_list = []
-        for track in tracks.values():
-            self.name_list.append(track.name)
+STAGE_MESSAGES = {
+    'searching': "Searching for: {}",
+    'downloading': "Downloading: {}",
+    'converting': "Converting: {}",
+    'downloaded': "Song {} downloaded",
+    'added_metadata': "Added metadata for: {}",
+    'error': "ERROR: Could not download {}",
+}
 
-        self.max_count = len(self.name_list)
 
-        self.count = 0
-        self.fill_char = "█"
-        self.empty_char = ' '
-        self.cap_char = '|'
-        self.width = 50
+class _Line:
+    """A single terminal line that is redrawn in place. Shared by everything that draws progress bars."""
 
-        self.error_list = []
+    def __init__(self):
+        self.lock = threading.Lock()
         self.prev_length = 0
 
-    def __progress_bar2(self, msg, update_count: bool) -> None:
+    def draw(self, out: str) -> None:
+        with self.lock:
+            stream = original_stdout()
+            stream.write(' ' * self.prev_length + '\r')
+            stream.write(out + '\r')
+            stream.flush()
+            self.prev_length = len(out)
 
-        if msg is not None:
-            msg = " - " + msg  # for formatting
+    def clear(self) -> None:
+        self.draw('')
 
-        fill_amount = int(self.count / self.max_count * self.width)
-        fill_percentage = int(self.count / self.max_count * 100)
-        fraction_completed = str(self.count) + '/' + str(self.max_count)
 
-        fill_str = self.fill_char * fill_amount
-        empty_str = self.empty_char * (self.width - fill_amount)
+_line = _Line()
+
 
-        out = f"{self.cap_char}{fill_str}{empty_str}{self.cap_char} {str(fill_percentage)}% [{fraction_completed}]{msg}"
+class ProgressManager:
+    """Progress of a batch of tracks, which can be worked on by several threads at once.
 
-        print(' ' * self.prev_length, end='\r')
+    Tracks are identified by their Spotify ID. Every stage method can be called from any thread. The bar is redrawn
+    at most `max_fps` times per second, errors and completion are always drawn.
 
-        print(out, end='\r')
-        sys.stdout.flush()
+    Modes:
+        * bar: a progress bar on the terminal
+        * quiet: no output
+        * json: one JSON object per line for every stage transition, for headless runs
+    """
 
-        self.prev_length = len(out)
+    def __init__(self, tracks, metrics: Metrics = None, mode: str = 'bar', max_fps: float = 10):
+        """
+        :param TracksDict tracks: Tracks in the batch
+        :param Metrics metrics: Metrics to report stage transitions to, defaults to the shared metrics
+        :param str mode: 'bar', 'quiet' or 'json'
+        :param float max_fps: Maximum redraws of the bar per second
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+
+        self.names = {id: track.name for id, track in tracks.items()}
+        self.order = list(self.names)
+        self.max_count = len(self.names)
+        self.count = 0
+        self.in_flight = {}  # id -> stage
 
-        if update_count:
-            self.count += 1
+        self.mode = mode
+        self.min_interval = 1 / max_fps if max_fps else 0
+        self.fill_char = "█"
+        self.empty_char = ' '
+        self.cap_char = '|'
+        self.width = 50
 
+        self.error_list = []
+        self.metrics = metrics if metrics is not None else default_metrics
+
+        self.__lock = threading.Lock()
+        self.__last_draw = 0.0
+
+    def __update(self, stage: str, track_id: str = None, exc: BaseException = None) -> None:
+        with self.__lock:
+            if track_id is None:  # sequential use, the track being worked on is the next unfinished one
+                track_id = self.order[min(self.count, self.max_count - 1)]
+            name = self.names.get(track_id, track_id)
+
+            if stage in ('added_metadata', 'error'):
+                self.in_flight.pop(track_id, None)
+                self.count += 1
+                if stage == 'error':
+                    self.error_list.append(name)
+            else:
+                self.in_flight[track_id] = stage
+
+            count = self.count
+            msg = STAGE_MESSAGES[stage].format(name)
+            if len(self.in_flight) > 1:
+                msg += f" (+{len(self.in_flight) - 1} more)"
+
+            now = time.monotonic()
+            draw = stage == 'error' or count == self.max_count or now - self.__last_draw >= self.min_interval
+            if draw:
+                self.__last_draw = now
+
+        data = {'error': type(exc).__name__} if stage == 'error' and exc is not None else {}
+        event = self.metrics.event(f"{id(self)}:{track_id}", stage, name=name, **data)
+
+        if self.mode == 'json':
+            self.__emit({'event': 'stage', 'id': track_id, 'name': name, 'stage': stage, 'count': count,
+                         'total': self.max_count, 'time': event['time'], **data})
+        elif self.mode == 'bar' and draw:
+            _line.draw(self.__bar(count, msg))
+
+    def __bar(self, count: int, msg: str) -> str:
+        fill_amount = int(count / self.max_count * self.width) if self.max_count else self.width
+        fill_percentage = int(count / self.max_count * 100) if self.max_count else 100
+        fraction_completed = str(count) + '/' + str(self.max_count)
 
-    def __progress_bar(self, msg, update_count: bool) -> None:
+        fill_str = self.fill_char * fill_amount
+        empty_str = self.empty_char * (self.width - fill_amount)
 
-        simple_bar(max_count=self.max_count, count=self.count, msg=msg)
+        return f"{self.cap_char}{fill_str}{empty_str}{self.cap_char} {str(fill_percentage)}% [{fraction_completed}] - {msg}"
 
-        if update_count:
-            self.count += 1
+    @staticmethod
+    def __emit(obj: dict) -> None:
+        stream = original_stdout()
+        with _line.lock:
+            stream.write(json.dumps(obj) + '\n')
+            stream.flush()
 
-    def downloaded(self):
-        msg = f"Song {self.name_list[self.count]} downloaded"
-        self.__progress_bar(msg, False)
+    def searching(self, track_id: str = None):
+        self.__update('searching', track_id)
 
-    def downloading(self):
-        msg = f"Downloading: {self.name_list[self.count]}"
-        self.__progress_bar(msg, False)
+    def downloading(self, track_id: str = None):
+        self.__update('downloading', track_id)
 
-    def converting(self):
-        msg = f"Converting: {self.name_list[self.count]}"
-        self.__progress_bar(msg, False)
+    def converting(self, track_id: str = None):
+        self.__update('converting', track_id)
 
-    def searching(self):
-        msg = f"Searching for: {self.name_list[self.count]}"
-        self.__progress_bar(msg, False)
+    def downloaded(self, track_id: str = None):
+        self.__update('downloaded', track_id)
 
-    def added_metadata(self):
-        msg = f"Added metadata for: {self.name_list[self.count]}"
-        self.__progress_bar(msg, True)
+    def added_metadata(self, track_id: str = None):
+        self.__update('added_metadata', track_id)
 
-    def error(self):
-        msg = f"ERROR: Could not download {self.name_list[self.count]}"
-        self.error_list.append(self.song_list[self.index])
-        self.__progress_bar(msg, True)
+    def error(self, exc: BaseException = None, track_id: str = None):
+        if exc is not None:
+            self.metrics.error(exc)
+        self.__update('error', track_id, exc)
 
     def completed(self):
-        msg = 'Completed'
-        self.__progress_bar(msg, False)
-        print(' ' * self.prev_length, end='\r')
-        sys.stdout.flush()
+        if self.mode == 'bar':
+            _line.draw(self.__bar(self.count, 'Completed'))
+            _line.clear()
+        elif self.mode == 'json':
+            self.__emit({'event': 'completed', 'count': self.count, 'total': self.max_count,
+                         'errors': self.error_list})
         return self.error_list
 
 
@@ -98,28 +174,19 @@ def simple_bar(count: int, max_count: int, msg: str = None, fill_char: str = "
     :param int width: Width of progress bar
     """
 
-    if hasattr(simple_bar, 'prev_length'):
-        prev = getattr(simple_bar, 'prev_length')
-    else:
-        prev = 0
-
     if msg is not None:
         msg = " - " + msg  # for formatting
+    else:
+        msg = ''
 
-    fill_amount = int(count / max_count * width)
-    fill_percentage = int(count / max_count * 100)
+    fill_amount = int(count / max_count * width) if max_count else width
+    fill_percentage = int(count / max_count * 100) if max_count else 100
     fraction_completed = str(count) + '/' + str(max_count)
 
     fill_str = fill_char * fill_amount
     empty_str = empty_char * (width - fill_amount)
 
-    print(' ' * prev, end='\r')
-
     out = f"{lcap_char}{fill_str}{empty_str}{rcap_char} {str(fill_percentage)}% [{fraction_completed}]{msg}"
-    print(out, end='\r')
-
-    sys.stdout.flush()
-
-    setattr(simple_bar, 'prev_length', len(out))
+    _line.draw(out)
 
     return len(out)
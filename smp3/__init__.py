@@ -1,6 +1,20 @@
 from .smp3 import Spotify2MP3
+from .downloader import Downloader, DownloadError
+from .governor import BandwidthGovernor, governor
+from .quality import QualityProfile
+from .resolver import Resolver, NoMatchError
+from .metrics import Metrics, metrics
+from .profiling import Profiler, profile, profile_stage
+from .workqueue import WorkQueue
+from .service import Service, ServiceClient
+from .deadline import Timeouts, Hedger, StageTimeoutError
+from .targets import OutputTarget
+from .planner import Plan
+from .store import ContentStore
+from .watcher import FolderWatcher
+from .track import TracksDict
 
-SPOTIFY_CLIENT_ID=
-SPOTIFY_CLIENT_SECRET=
-DOWNLOAD_PATH=
-SAVE_PATH=
\ No newline at end of file
+SPOTIFY_CLIENT_ID=''
+SPOTIFY_CLIENT_SECRET=''
+DOWNLOAD_PATH=''
+SAVE_PATH=''
\ No newline at end of file
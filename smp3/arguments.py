@@ -0,0 +1,88 @@
+"""Command-line arguments shared by cli.py, worker.py, service.py and watch.py, so every script takes the same options
+with the same meaning. Each add_* function defines a group of arguments and the matching apply_* function applies
+the parsed values."""
+from .governor import governor
+from .quality import QualityProfile
+from .store import ContentStore, LINK_MODES
+from .targets import FORMATS, OutputTarget
+
+
+def add_network_arguments(parser, connections: bool = True) -> None:
+    """Adds --limit-rate, and --max-connections if files are downloaded.
+
+    :param parser: ArgumentParser, or a subcommand's parser
+    :param bool connections: False for scripts that only convert files, which only take --limit-rate
+    """
+    if not connections:
+        parser.add_argument('--limit-rate', metavar='KB/s', type=float, help='Maximum speed in KB/s to read files being converted at')
+        return
+    parser.add_argument('--limit-rate', metavar='KB/s', type=float, help='Maximum total download speed in KB/s')
+    parser.add_argument('--max-connections', metavar='N', type=int, help='Maximum number of concurrent downloads')
+
+
+def apply_network(args) -> None:
+    """Limits the shared :py:data:`governor` as set by :py:func:`add_network_arguments`."""
+    if args.limit_rate is not None:
+        governor.set_rate(args.limit_rate * 1024)
+    if getattr(args, 'max_connections', None) is not None:
+        governor.set_max_connections(args.max_connections)
+
+
+def add_quality_arguments(parser, streams: bool = True) -> None:
+    """Adds --bitrate, and --codec and --max-size if streams are downloaded.
+
+    :param parser: ArgumentParser, or a subcommand's parser
+    :param bool streams: False for scripts that only convert files, which only take --bitrate
+    """
+    if not streams:
+        parser.add_argument('--bitrate', metavar='kbps', type=int, help='Bitrate of outputs without one, 192 by default')
+        return
+    parser.add_argument('--bitrate', metavar='kbps', type=int, help='Target bitrate, the smallest stream meeting it is downloaded')
+    parser.add_argument('--codec', metavar='codec', type=str, help='Preferred audio codec of downloaded streams, e.g. opus, mp4a')
+    parser.add_argument('--max-size', metavar='MB', type=float, help='Maximum size of a downloaded stream in MB, streams of unknown size are skipped')
+
+
+def apply_quality(s, args) -> None:
+    """Sets the quality profile of a Spotify2MP3 object from :py:func:`add_quality_arguments`."""
+    codec = getattr(args, 'codec', None)
+    max_size = getattr(args, 'max_size', None)
+    if args.bitrate is not None or codec is not None or max_size is not None:
+        max_size = int(max_size * 1024 * 1024) if max_size is not None else None
+        s.set_quality(QualityProfile(bitrate=args.bitrate, codec=codec, max_size=max_size))
+
+
+def add_target_arguments(parser) -> None:
+    """Adds --target, which can be repeated."""
+    parser.add_argument('--target', metavar='FORMAT', nargs='+', action='append', help=f'Output to create for every track: FORMAT [KBPS [DIR]], e.g. --target mp3 320 --target opus 96 phone/. Repeat for several outputs. Formats: {", ".join(FORMATS)}')
+
+
+def parse_targets(values: list[list[str]]) -> list[OutputTarget]:
+    """Returns the output targets of --target values, each FORMAT [KBPS [DIR]].
+
+    :raises ValueError: If a value has more than three parts
+    """
+    targets = []
+    for target in values:
+        if len(target) > 3:
+            raise ValueError("--target takes FORMAT [KBPS [DIR]]")
+        bitrate = int(target[1]) if len(target) > 1 else None
+        targets.append(OutputTarget(format=target[0], bitrate=bitrate, dir=target[2] if len(target) > 2 else None))
+    return targets
+
+
+def apply_targets(s, args) -> None:
+    """Sets the output targets of a Spotify2MP3 object from :py:func:`add_target_arguments`."""
+    if args.target:
+        s.set_targets(parse_targets(args.target))
+
+
+def add_store_arguments(parser) -> None:
+    """Adds --store and --link."""
+    parser.add_argument('--store', metavar='dir', type=str, help='Content store shared by all download folders: tracks in it are linked instead of downloaded again')
+    parser.add_argument('--link', type=str, choices=list(LINK_MODES), default='hardlink', help=f'How stored tracks are put into download folders, falls back to the next choice. Choices: {", ".join(LINK_MODES)}')
+
+
+def apply_store(s, args) -> None:
+    """Sets the content store of a Spotify2MP3 object from :py:func:`add_store_arguments`."""
+    if args.store is not None:
+        s.set_store(ContentStore(args.store, link=args.link))
@@ -0,0 +1,87 @@
+import functools
+import io
+import sys
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+_install_lock = threading.Lock()
+
+
+class _ThreadStream(io.TextIOBase):
+    """Stands in for sys.stdout/sys.stderr and sends writes to the current thread's capture buffer, if it has one,
+    or to the original stream otherwise."""
+
+    def __init__(self, name: str, original):
+        self.name = name
+        self.original = original
+
+    def __target(self):
+        return getattr(_local, self.name, None) or self.original
+
+    def write(self, text):
+        return self.__target().write(text)
+
+    def flush(self):
+        return self.__target().flush()
+
+    def isatty(self):
+        return self.original.isatty()
+
+    def fileno(self):
+        return self.original.fileno()
+
+    @property
+    def encoding(self):
+        return self.original.encoding
+
+
+def install() -> None:
+    """Replaces sys.stdout and sys.stderr with thread aware streams. Only done once, later calls do nothing."""
+    with _install_lock:
+        if not isinstance(sys.stdout, _ThreadStream):
+            sys.stdout = _ThreadStream('stdout', sys.stdout)
+        if not isinstance(sys.stderr, _ThreadStream):
+            sys.stderr = _ThreadStream('stderr', sys.stderr)
+
+
+def original_stdout():
+    """Returns the real stdout, bypassing any capture."""
+    return sys.stdout.original if isinstance(sys.stdout, _ThreadStream) else sys.stdout
+
+
+@contextmanager
+def capture_output(buffer: io.StringIO = None):
+    """Captures what the current thread prints to stdout and stderr in the block.
+    Because some modules output too much to the terminal.
+
+    Other threads keep printing as normal, so this is safe to use from several workers at once.
+
+    :param io.StringIO buffer: Buffer to write captured output to, a new one if None
+    :return: The buffer
+    """
+    install()
+    buffer = buffer if buffer is not None else io.StringIO()
+    previous = getattr(_local, 'stdout', None), getattr(_local, 'stderr', None)
+    _local.stdout = _local.stderr = buffer
+    try:
+        yield buffer
+    finally:
+        _local.stdout, _local.stderr = previous
+
+
+def carry(func):
+    """Wraps `func` so that it prints to the current thread's capture buffer when called from another thread,
+    e.g. in a thread pool. Returns `func` unchanged if the current thread is not capturing.
+
+    :param func: Function to wrap
+    """
+    buffer = getattr(_local, 'stdout', None)
+    if buffer is None:
+        return func
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        with capture_output(buffer):
+            return func(*args, **kwargs)
+    return run
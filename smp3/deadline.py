@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from typing import NamedTuple
+
+from .capture import carry
+from .metrics import metrics
+from .profiling import carry_stages
+
+MAX_THREADS = 32  # calls with a timeout or hedging that can run at once, across all stages
+
+
+class StageTimeoutError(TimeoutError):
+    """Raised when a stage takes longer than its timeout."""
+
+
+class Timeouts(NamedTuple):
+    """Seconds each stage may take for one track or request. None means no limit, the default for every stage.
+
+    A stage with a timeout runs in a separate thread, so it can be abandoned when it takes too long.
+
+    * spotify: a single Spotify API request, e.g. one page of a playlist
+    * search: searching YouTube and picking a result
+    * download: downloading a whole stream, across retries. The partial file is kept, so a later attempt resumes it
+    * artwork: downloading cover art
+    """
+    spotify: float | None = None
+    search: float | None = None
+    download: float | None = None
+    artwork: float | None = None
+
+
+class Hedger:
+    """Sends a duplicate of requests that are slower than usual, and uses whichever finishes first.
+
+    Latencies are tracked per stage. Once `min_samples` have been seen, a request still running after the
+    `quantile` latency of its stage gets one duplicate, so at most about 1 - `quantile` of requests are sent twice.
+    """
+
+    def __init__(self, quantile: float = 0.95, min_samples: int = 20, window: int = 500):
+        """
+        :param float quantile: Latency quantile after which a duplicate is sent
+        :param int min_samples: Latencies to collect for a stage before hedging it
+        :param int window: Number of recent latencies per stage the quantile is computed from
+        """
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.window = window
+        self.__latencies = {}
+        self.__lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Records the latency of a successful request.
+
+        :param str stage: Stage name
+        :param float seconds: Latency
+        """
+        with self.__lock:
+            if stage not in self.__latencies:
+                self.__latencies[stage] = deque(maxlen=self.window)
+            self.__latencies[stage].append(seconds)
+
+    def delay(self, stage: str) -> float | None:
+        """Returns how long to wait before sending a duplicate, or None if there are not enough samples yet.
+
+        :param str stage: Stage name
+        :rtype: float | None
+        """
+        with self.__lock:
+            latencies = sorted(self.__latencies.get(stage, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(int(len(latencies) * self.quantile), len(latencies) - 1)]
+
+
+class _Pool:
+    """A bounded pool of daemon threads, started as they are needed.
+
+    Unlike the threads of a ThreadPoolExecutor they do not hold up the exit of the interpreter, so calls that were
+    abandoned after a timeout cannot either.
+    """
+
+    def __init__(self, max_threads: int):
+        self.max_threads = max_threads
+        self.threads = 0
+        self.__queue = queue.SimpleQueue()
+        self.__idle = threading.Semaphore(0)
+        self.__lock = threading.Lock()
+
+    def submit(self, func) -> None:
+        self.__queue.put(func)
+        if self.__idle.acquire(blocking=False):
+            return
+        with self.__lock:
+            if self.threads < self.max_threads:
+                self.threads += 1
+                threading.Thread(target=self.__work, name=f'smp3-deadline-{self.threads}', daemon=True).start()
+
+    def __work(self) -> None:
+        while True:
+            self.__queue.get()()
+            self.__idle.release()
+
+
+_pool = _Pool(MAX_THREADS)
+
+
+def _start(stage: str, hedger: Hedger | None, func, args, kwargs) -> Future:
+    """Runs func on the shared pool, so it can be abandoned if it takes too long. What it prints and the profiler
+    stages it runs in are carried over from the calling thread."""
+    future = Future()
+    func = carry_stages(carry(func))
+
+    def run():
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            return
+        if hedger is not None:
+            hedger.record(stage, time.monotonic() - start)
+        future.set_result(result)
+
+    _pool.submit(run)
+    return future
+
+
+def call(stage: str, func, *args, timeout: float = None, hedger: Hedger = None, **kwargs):
+    """Calls `func(*args, **kwargs)` with a timeout, hedging it if it is slow.
+
+    Python threads cannot be killed, so a call that times out or loses to its duplicate is left to finish in the
+    background and its result is discarded. Use it for requests, not for work with side effects. Calls run on a
+    shared pool of at most :py:data:`MAX_THREADS` threads, and wait for a free one when they are all busy.
+
+    :param str stage: Stage name, used for the timeout error, latency tracking and metrics
+    :param func: Function to call
+    :param float timeout: Seconds before :py:class:`StageTimeoutError` is raised, None for no limit
+    :param Hedger hedger: Hedger to track latencies with and decide when to send a duplicate, None to not hedge
+    :return: Result of the first call to succeed
+    :raises StageTimeoutError: If no call succeeded in time
+    """
+    hedge_after = hedger.delay(stage) if hedger is not None else None
+    if timeout is None and hedge_after is None:
+        start = time.monotonic()
+        result = func(*args, **kwargs)
+        if hedger is not None:
+            hedger.record(stage, time.monotonic() - start)
+        return result
+
+    start = time.monotonic()
+    primary = _start(stage, hedger, func, args, kwargs)
+    pending = [primary]
+    hedged = False
+    error = None
+
+    while pending:
+        elapsed = time.monotonic() - start
+        waits = []
+        if timeout is not None:
+            waits.append(timeout - elapsed)
+        if not hedged and hedge_after is not None:
+            waits.append(hedge_after - elapsed)
+
+        done, _ = wait(pending, timeout=max(min(waits), 0) if waits else None, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            if future.exception() is None:
+                if hedged:
+                    metrics.hedge(stage, won=future is not primary)
+                return future.result()
+            error = error or future.exception()
+
+        elapsed = time.monotonic() - start
+        if timeout is not None and elapsed >= timeout:
+            raise StageTimeoutError(f"{stage} took longer than {timeout}s")
+        if pending and not hedged and hedge_after is not None and elapsed >= hedge_after:
+            pending.append(_start(stage, hedger, func, args, kwargs))
+            hedged = True
+
+    if hedged:
+        metrics.hedge(stage, won=False)
+    raise error
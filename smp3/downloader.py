@@ -0,0 +1,206 @@
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .deadline import StageTimeoutError
+from .governor import BandwidthGovernor, governor as default_governor
+from .profiling import profiled
+
+
+class DownloadError(Exception):
+    """Raised when a stream could not be downloaded after all retries."""
+
+
+class Downloader:
+    """Chunked, resumable and retrying HTTP downloader for audio streams.
+
+    Data is fetched with HTTP Range requests into a ``.part`` file next to the destination. If the connection
+    drops, the download resumes from the last byte written instead of starting over. A ``.part.json`` file next to it
+    records which stream (`key`) and size the partial data belongs to, so a partial file left by another stream is
+    discarded instead of being resumed. Large streams can optionally
+    be split into several range segments that are fetched in parallel. The finished file is atomically renamed
+    into place, so a complete file at the destination path is never partially written.
+    """
+
+    def __init__(self, chunk_size: int = 1024 * 1024, retries: int = 5, backoff: float = 1.0,
+                 max_backoff: float = 30.0, segments: int = 1, segment_threshold: int = 16 * 1024 * 1024,
+                 timeout: float = 30.0, session: requests.Session = None, governor: BandwidthGovernor = None):
+        """
+        :param int chunk_size: Bytes read from the connection per iteration
+        :param int retries: Consecutive failed attempts (without progress) before giving up
+        :param float backoff: Base delay in seconds, doubled on every consecutive failure
+        :param float max_backoff: Maximum delay in seconds between attempts
+        :param int segments: Number of parallel range segments for large streams (1 disables splitting)
+        :param int segment_threshold: Minimum stream size in bytes before it is split into segments
+        :param float timeout: Connect/read timeout in seconds for each request
+        :param requests.Session session: Session to reuse connections with
+        :param BandwidthGovernor governor: Bandwidth and connection limits, defaults to the shared governor
+        """
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+        self.timeout = timeout
+        self.session = session if session is not None else requests.Session()
+        self.governor = governor if governor is not None else default_governor
+
+    @profiled('download')
+    def download(self, url: str, output_path: str, filename: str, size: int = None, deadline: float = None,
+                 key: str = None) -> str:
+        """Downloads `url` to `output_path`/`filename`, resuming any earlier partial download.
+
+        :param str url: Direct URL of the stream
+        :param str output_path: Directory to save the file in
+        :param str filename: Name of the downloaded file
+        :param int size: Size of the stream in bytes if already known, saves a HEAD request
+        :param float deadline: Seconds the whole download may take, including retries. The partial file is kept,
+            so the next call resumes it
+        :param str key: Identifies the stream, e.g. video ID and itag. A partial file is only resumed by a download
+            with the same key and size. Defaults to the URL
+        :return: Path to downloaded file
+        :rtype: str
+        :raises StageTimeoutError: If the deadline passed
+        """
+        final_path = os.path.join(output_path, filename)
+        part_path = final_path + '.part'
+        meta_path = part_path + '.json'
+        expires = time.monotonic() + deadline if deadline is not None else None
+
+        if size is None:
+            size = self.__content_length(url)
+
+        # Only resume partial data of the same stream
+        meta = {'key': key if key is not None else url, 'size': size}
+        if self.__read_meta(meta_path) != meta:
+            self.__discard(part_path)
+        with open(meta_path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+
+        if self.segments > 1 and size is not None and size >= self.segment_threshold:
+            self.__download_segmented(url, part_path, size, expires)
+        else:
+            self.__download_range(url, part_path, 0, None if size is None else size - 1, expires)
+
+        if size is not None and os.path.getsize(part_path) != size:
+            received = os.path.getsize(part_path)
+            self.__discard(part_path)  # cannot be resumed, start over next time
+            os.remove(meta_path)
+            raise DownloadError(f"Incomplete download: expected {size} bytes, got {received}")
+
+        os.replace(part_path, final_path)
+        os.remove(meta_path)
+        return final_path
+
+    @staticmethod
+    def __read_meta(meta_path: str) -> dict | None:
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def __discard(self, part_path: str) -> None:
+        """Removes a partial download and its segments."""
+        for path in [part_path] + [f"{part_path}.{i}" for i in range(self.segments)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __content_length(self, url: str) -> int | None:
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+            response.raise_for_status()
+            length = response.headers.get('Content-Length')
+            return int(length) if length is not None else None
+        except (requests.RequestException, ValueError):
+            return None  # unknown size, fall back to a single open-ended range
+
+    def __download_segmented(self, url: str, part_path: str, size: int, expires: float | None) -> None:
+        # Each segment is stored in its own file so it can be resumed independently
+        step = -(-size // self.segments)  # ceil division
+        ranges = [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+        segment_paths = [f"{part_path}.{i}" for i in range(len(ranges))]
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [pool.submit(self.__download_range, url, seg_path, start, end, expires)
+                       for seg_path, (start, end) in zip(segment_paths, ranges)]
+            for future in futures:
+                future.result()
+
+        with open(part_path, 'wb') as out:
+            for seg_path in segment_paths:
+                with open(seg_path, 'rb') as seg:
+                    while data := seg.read(self.chunk_size):
+                        out.write(data)
+        for seg_path in segment_paths:
+            os.remove(seg_path)
+
+    def __download_range(self, url: str, path: str, start: int, end: int | None, expires: float | None) -> None:
+        """Fetches bytes `start`..`end` (inclusive, or to EOF if None) into `path`, appending to what is already there."""
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        if end is not None and offset > end - start + 1:  # more than the range holds, the data cannot be trusted
+            os.remove(path)
+            offset = 0
+        failures = 0
+
+        while end is None or start + offset <= end:
+            headers = {'Range': f"bytes={start + offset}-{'' if end is None else end}"}
+            received = offset
+            try:
+                with self.governor.connection(), \
+                        self.session.get(url, headers=headers, stream=True,
+                                         timeout=self.__request_timeout(expires)) as response:
+                    if response.status_code == 416:  # nothing left to fetch
+                        return
+                    response.raise_for_status()
+
+                    if response.status_code != 206 and start + offset > 0:
+                        # server ignored the Range header, start this range over
+                        if start > 0:
+                            raise DownloadError("Server does not support range requests")
+                        offset = 0
+                        mode = 'wb'
+                    else:
+                        mode = 'ab'
+
+                    with open(path, mode) as file:
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            if not chunk:
+                                continue
+                            file.write(chunk)
+                            offset += len(chunk)
+                            self.governor.consume(len(chunk))
+                            failures = 0  # progress was made, reset backoff
+                            self.__check(expires)
+
+                if end is None:
+                    return  # open-ended range finished without an error
+                if offset == received:
+                    raise requests.ConnectionError("Connection closed before any data was received")
+
+            except requests.RequestException as e:
+                failures += 1
+                if failures > self.retries:
+                    raise DownloadError(f"Failed to download {url} after {self.retries} retries") from e
+
+                self.__check(expires)
+                delay = min(self.max_backoff, self.backoff * 2 ** (failures - 1)) * random.uniform(0.5, 1.0)
+                if expires is not None:
+                    delay = min(delay, max(expires - time.monotonic(), 0))
+                time.sleep(delay)
+
+    def __request_timeout(self, expires: float | None) -> float:
+        self.__check(expires)
+        return self.timeout if expires is None else min(self.timeout, expires - time.monotonic())
+
+    @staticmethod
+    def __check(expires: float | None) -> None:
+        if expires is not None and time.monotonic() >= expires:
+            raise StageTimeoutError("Download took longer than its deadline")
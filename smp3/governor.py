@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class BandwidthGovernor:
+    """Process-wide limit on download bandwidth and concurrent connections.
+
+    Bandwidth is limited with a token bucket: every byte read from the network takes a token, and tokens are
+    refilled at `rate` bytes per second up to `burst`. Connections are limited with a counter that blocks new
+    connections while `max_connections` are open. Both limits can be changed at any time, including while
+    downloads are running, and ``None`` disables a limit.
+
+    Also See:
+        * :py:data:`governor` for the shared instance used by all downloads
+    """
+
+    def __init__(self, rate: float = None, max_connections: int = None, burst: float = None, window: float = 5.0):
+        """
+        :param float rate: Maximum bytes per second across all downloads, None for unlimited
+        :param int max_connections: Maximum number of open connections, None for unlimited
+        :param float burst: Bucket size in bytes, defaults to one second worth of `rate`
+        :param float window: Seconds over which the current transfer rate is measured
+        """
+        self.__lock = threading.Lock()
+        self.__slots = threading.Condition(self.__lock)
+
+        self.rate = None
+        self.burst = None
+        self.__tokens = 0.0
+        self.__last_refill = time.monotonic()
+        self.set_rate(rate, burst)
+
+        self.max_connections = max_connections
+        self.active_connections = 0
+        self.waiting_connections = 0
+
+        self.window = window
+        self.bytes_total = 0
+        self.__history = deque()  # (timestamp, bytes)
+
+    def set_rate(self, rate: float = None, burst: float = None) -> None:
+        """Changes the bandwidth limit.
+
+        :param float rate: Maximum bytes per second, None for unlimited
+        :param float burst: Bucket size in bytes, defaults to one second worth of `rate`
+        """
+        with self.__lock:
+            self.__refill()
+            self.rate = rate
+            self.burst = burst if burst is not None else rate
+            if self.burst is not None:
+                self.__tokens = min(self.__tokens, self.burst)
+
+    def set_max_connections(self, max_connections: int = None) -> None:
+        """Changes the connection limit. Waiting connections are woken up if the limit was raised.
+
+        :param int max_connections: Maximum number of open connections, None for unlimited
+        """
+        with self.__slots:
+            self.max_connections = max_connections
+            self.__slots.notify_all()
+
+    @contextmanager
+    def connection(self):
+        """Holds one connection slot for the duration of the block, waiting until a slot is free."""
+        with self.__slots:
+            self.waiting_connections += 1
+            try:
+                while self.max_connections is not None and self.active_connections >= self.max_connections:
+                    self.__slots.wait()
+            finally:
+                self.waiting_connections -= 1
+            self.active_connections += 1
+        try:
+            yield
+        finally:
+            with self.__slots:
+                self.active_connections -= 1
+                self.__slots.notify()
+
+    def consume(self, nbytes: int) -> None:
+        """Takes `nbytes` tokens from the bucket, sleeping until the transfer is within the rate limit.
+
+        :param int nbytes: Number of bytes transferred
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.bytes_total += nbytes
+            self.__history.append((now, nbytes))
+            self.__trim_history(now)
+
+            if self.rate is None:
+                return
+            self.__refill()
+            # The bucket is allowed to go into debt, the caller then waits until it is paid back
+            self.__tokens -= nbytes
+            delay = -self.__tokens / self.rate if self.__tokens < 0 else 0
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def utilization(self) -> dict:
+        """Returns the current limits and how much of them is being used.
+
+        :return: {'rate_limit', 'current_rate', 'bandwidth_used', 'max_connections', 'active_connections',
+            'waiting_connections', 'bytes_total'}. `bandwidth_used` is a fraction of `rate_limit`, or None if unlimited
+        :rtype: dict
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__trim_history(now)
+            current_rate = sum(n for _, n in self.__history) / self.window
+
+            return {
+                'rate_limit': self.rate,
+                'current_rate': current_rate,
+                'bandwidth_used': current_rate / self.rate if self.rate else None,
+                'max_connections': self.max_connections,
+                'active_connections': self.active_connections,
+                'waiting_connections': self.waiting_connections,
+                'bytes_total': self.bytes_total,
+            }
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        if self.rate is not None:
+            self.__tokens = min(self.burst, self.__tokens + (now - self.__last_refill) * self.rate)
+        self.__last_refill = now
+
+    def __trim_history(self, now: float) -> None:
+        while self.__history and self.__history[0][0] < now - self.window:
+            self.__history.popleft()
+
+
+governor = BandwidthGovernor()
+"""Shared governor that every download in this process goes through."""
@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Stages after which a track is no longer in progress
+FINAL_STAGES = ('added_metadata', 'error')
+
+
+class Histogram:
+    """Cumulative histogram of observed values, in the same shape as a Prometheus histogram."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'buckets': {str(bound): n for bound, n in zip(self.buckets, self.counts)},
+        }
+
+
+class Metrics:
+    """Collects per-stage timings, byte counts, cache hit rates and errors for downloads.
+
+    Stage transitions are reported with :py:meth:`event`. The time a track spends in a stage is recorded in
+    that stage's histogram when it moves to the next one. Every event is also passed to the subscribed callbacks.
+
+    Also See:
+        * :py:data:`metrics` for the shared instance used by :py:class:`ProgressManager`
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        :param tuple buckets: Upper bounds in seconds of the stage latency histogram buckets
+        """
+        self.buckets = buckets
+        self.__lock = threading.Lock()
+        self.__subscribers = []
+        self.__open_stages = {}  # track -> (stage, start time)
+
+        self.stages = {}
+        self.bytes = {}
+        self.caches = {}
+        self.errors = {}
+        self.hedges = {}
+
+    def subscribe(self, callback) -> None:
+        """Calls `callback(event)` for every event. Events are dicts with 'track', 'stage', 'time' and, if the track
+        left a stage, 'previous_stage' and 'duration'.
+
+        :param callback: Function taking an event dict
+        """
+        with self.__lock:
+            self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        """Stops calling `callback` for events.
+
+        :param callback: Previously subscribed function
+        """
+        with self.__lock:
+            self.__subscribers.remove(callback)
+
+    def event(self, track: str, stage: str, **data) -> dict:
+        """Records that `track` entered `stage`, and how long it spent in the stage it was in before.
+
+        :param str track: Track identifier
+        :param str stage: Stage entered, e.g. 'searching', 'downloading', 'converting', 'downloaded',
+            'added_metadata' or 'error'
+        :param data: Extra fields to include in the event
+        :return: The event passed to subscribers
+        :rtype: dict
+        """
+        now = time.time()
+        event = {'track': track, 'stage': stage, 'time': now, **data}
+
+        with self.__lock:
+            if track in self.__open_stages:
+                previous, start = self.__open_stages.pop(track)
+                event['previous_stage'] = previous
+                event['duration'] = now - start
+                self.__histogram(previous).observe(now - start)
+
+            if stage not in FINAL_STAGES:
+                self.__open_stages[track] = (stage, now)
+
+            subscribers = list(self.__subscribers)
+
+        for callback in subscribers:
+            callback(event)
+        return event
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Records a stage latency directly, for work that is not reported through :py:meth:`event`.
+
+        :param str stage: Stage name
+        :param float seconds: Time spent in the stage
+        """
+        with self.__lock:
+            self.__histogram(stage).observe(seconds)
+
+    def add_bytes(self, kind: str, nbytes: int) -> None:
+        """Adds to a byte counter.
+
+        :param str kind: Counter name, e.g. 'downloaded' or 'encoded'
+        :param int nbytes: Number of bytes
+        """
+        with self.__lock:
+            self.bytes[kind] = self.bytes.get(kind, 0) + nbytes
+
+    def cache(self, name: str, hit: bool) -> None:
+        """Records a cache lookup.
+
+        :param str name: Cache name, e.g. 'artwork'
+        :param bool hit: If the lookup was a hit
+        """
+        with self.__lock:
+            hits, misses = self.caches.get(name, (0, 0))
+            self.caches[name] = (hits + 1, misses) if hit else (hits, misses + 1)
+
+    def error(self, exc: BaseException) -> None:
+        """Counts an error by its exception type.
+
+        :param BaseException exc: The exception raised
+        """
+        with self.__lock:
+            name = type(exc).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def hedge(self, stage: str, won: bool) -> None:
+        """Records a hedged request, a duplicate sent because the first one was slow.
+
+        :param str stage: Stage name, e.g. 'search'
+        :param bool won: If the duplicate finished first
+        """
+        with self.__lock:
+            sent, wins = self.hedges.get(stage, (0, 0))
+            self.hedges[stage] = (sent + 1, wins + 1) if won else (sent + 1, wins)
+
+    def snapshot(self) -> dict:
+        """Returns all metrics as a JSON serializable dict.
+
+        :rtype: dict
+        """
+        with self.__lock:
+            return {
+                'time': time.time(),
+                'stages': {stage: hist.to_dict() for stage, hist in self.stages.items()},
+                'bytes': dict(self.bytes),
+                'caches': {name: {'hits': hits, 'misses': misses,
+                                  'hit_rate': hits / (hits + misses) if hits + misses else None}
+                           for name, (hits, misses) in self.caches.items()},
+                'errors': dict(self.errors),
+                'hedges': {stage: {'sent': sent, 'won': won} for stage, (sent, won) in self.hedges.items()},
+                'in_progress': len(self.__open_stages),
+            }
+
+    def export_json(self, path: str) -> None:
+        """Writes a snapshot of all metrics to a JSON file.
+
+        :param str path: Output file
+        """
+        self.__write(path, json.dumps(self.snapshot(), indent=2))
+
+    def export_prometheus(self, path: str) -> None:
+        """Writes all metrics in the Prometheus text format, e.g. for node_exporter's textfile collector.
+
+        :param str path: Output file, should end with .prom
+        """
+        snap = self.snapshot()
+        lines = ['# HELP smp3_stage_seconds Time tracks spent in each download stage.',
+                 '# TYPE smp3_stage_seconds histogram']
+        for stage, hist in snap['stages'].items():
+            for bound, count in hist['buckets'].items():
+                lines.append(f'smp3_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'smp3_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist["count"]}')
+            lines.append(f'smp3_stage_seconds_sum{{stage="{stage}"}} {hist["sum"]}')
+            lines.append(f'smp3_stage_seconds_count{{stage="{stage}"}} {hist["count"]}')
+
+        lines += ['# HELP smp3_bytes_total Bytes downloaded and encoded.', '# TYPE smp3_bytes_total counter']
+        lines += [f'smp3_bytes_total{{kind="{kind}"}} {n}' for kind, n in snap['bytes'].items()]
+
+        lines += ['# HELP smp3_cache_requests_total Cache lookups by result.',
+                  '# TYPE smp3_cache_requests_total counter']
+        for name, cache in snap['caches'].items():
+            lines.append(f'smp3_cache_requests_total{{cache="{name}",result="hit"}} {cache["hits"]}')
+            lines.append(f'smp3_cache_requests_total{{cache="{name}",result="miss"}} {cache["misses"]}')
+
+        lines += ['# HELP smp3_errors_total Errors by exception type.', '# TYPE smp3_errors_total counter']
+        lines += [f'smp3_errors_total{{type="{name}"}} {n}' for name, n in snap['errors'].items()]
+
+        lines += ['# HELP smp3_hedged_requests_total Duplicate requests sent for slow requests, and how many finished '
+                  'first.', '# TYPE smp3_hedged_requests_total counter']
+        for stage, hedges in snap['hedges'].items():
+            lines.append(f'smp3_hedged_requests_total{{stage="{stage}",result="sent"}} {hedges["sent"]}')
+            lines.append(f'smp3_hedged_requests_total{{stage="{stage}",result="won"}} {hedges["won"]}')
+
+        lines += ['# HELP smp3_tracks_in_progress Tracks currently being processed.',
+                  '# TYPE smp3_tracks_in_progress gauge', f'smp3_tracks_in_progress {snap["in_progress"]}']
+
+        self.__write(path, '\n'.join(lines) + '\n')
+
+    def __histogram(self, stage: str) -> Histogram:
+        if stage not in self.stages:
+            self.stages[stage] = Histogram(self.buckets)
+        return self.stages[stage]
+
+    @staticmethod
+    def __write(path: str, text: str) -> None:
+        # Write to a temporary file first so readers never see a partially written file
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(tmp_path, path)
+
+
+metrics = Metrics()
+"""Shared metrics that every download in this process reports to."""
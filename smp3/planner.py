@@ -0,0 +1,248 @@
+import json
+import time
+from typing import NamedTuple
+
+from .quality import abr_kbps, known_filesize
+from .targets import FORMATS, OutputTarget
+from .track import TDValue
+
+LOSSLESS_KBPS = 850  # typical FLAC bitrate of CD quality audio
+ARTWORK_BYTES = 150 * 1024  # typical size of Spotify cover art
+
+# Used to project wall time when no measurements of earlier downloads are available
+DEFAULT_RATES = {
+    'search_s': 2.0,  # seconds per track
+    'download_bps': 2 * 1024 * 1024,  # bytes per second per worker
+    'convert_s_per_mb': 1.0,  # seconds per MB downloaded
+    'tag_s': 0.5,  # seconds per track for artwork and metadata
+}
+
+STATUSES = ('download', 'stored', 'exists', 'no_match', 'error')
+
+
+class PlannedTrack(NamedTuple):
+    """A track of a :py:class:`Plan`.
+
+    * status: 'download', 'stored' (linked from the content store), 'exists' (already in the library), 'no_match'
+      (no YouTube result close enough) or 'error'
+    * video_url, itag: the YouTube video and stream to download
+    * download_bytes: estimated size of the stream
+    * output_bytes: estimated size of the created files
+    * path: existing file, for tracks that exist, or stored file, for tracks in the store
+    """
+    id: str
+    track: TDValue
+    status: str
+    video_url: str | None = None
+    itag: int | None = None
+    download_bytes: int = 0
+    output_bytes: int = 0
+    path: str | None = None
+    error: str | None = None
+
+
+def estimate_download_bytes(stream, duration_s: float) -> int:
+    """Returns the size of a stream, or an estimate from its bitrate and the duration of the track."""
+    size = known_filesize(stream)
+    if size is not None:
+        return size
+    return int((abr_kbps(stream) or 128) * 1000 / 8 * duration_s)
+
+
+def estimate_output_bytes(targets: list[OutputTarget], bitrate: str, duration_s: float, with_artwork: bool) -> int:
+    """Returns the estimated size of the files created for a track.
+
+    :param list[OutputTarget] targets: Output targets
+    :param str bitrate: ffmpeg bitrate used for targets without one, e.g. '128k'
+    :param float duration_s: Duration of the track
+    :param bool with_artwork: If artwork is embedded in every file
+    :rtype: int
+    """
+    total = 0
+    for target in targets:
+        if not FORMATS[target.format][3]:
+            kbps = LOSSLESS_KBPS
+        else:
+            kbps = target.bitrate if target.bitrate is not None else int(bitrate.rstrip('k'))
+        total += int(kbps * 1000 / 8 * duration_s)
+        if with_artwork:
+            total += ARTWORK_BYTES
+    return total
+
+
+def measured_rates(snapshot: dict) -> dict:
+    """Returns per-stage rates measured in a :py:meth:`Metrics.snapshot` (or a file saved by
+    :py:meth:`Metrics.export_json`). Stages without measurements are left out.
+
+    :param dict snapshot: Metrics snapshot
+    :rtype: dict
+    """
+    stages = snapshot.get('stages', {})
+    downloaded = snapshot.get('bytes', {}).get('downloaded', 0)
+    rates = {}
+
+    def total(stage: str) -> tuple[int, float]:
+        hist = stages.get(stage, {})
+        return hist.get('count', 0), hist.get('sum', 0.0)
+
+    count, seconds = total('searching')
+    if count:
+        rates['search_s'] = seconds / count
+    count, seconds = total('downloading')
+    if count and seconds and downloaded:
+        rates['download_bps'] = downloaded / seconds
+    count, seconds = total('converting')
+    if count and downloaded:
+        rates['convert_s_per_mb'] = seconds / (downloaded / (1024 * 1024))
+    count, seconds = total('downloaded')
+    if count:
+        rates['tag_s'] = seconds / count
+    return rates
+
+
+class Plan:
+    """What downloading a set of tracks will do: which tracks are downloaded, from which YouTube streams, how many
+    bytes that takes and how long it should take.
+
+    Plans are made by :py:meth:`Spotify2MP3.plan_tracks`, can be saved and loaded, and are carried out exactly as
+    planned by :py:meth:`Spotify2MP3.execute_plan`.
+    """
+
+    def __init__(self, tracks: list[PlannedTrack], dir: str, search_syntax: str = 'ARTIST - NAME',
+                 with_artwork: bool = True, artwork_fetches: int = 0, rates: dict = None, created: float = None):
+        """
+        :param list[PlannedTrack] tracks: Planned tracks
+        :param str dir: Download directory the plan was made for
+        :param str search_syntax: Search syntax the tracks were resolved with
+        :param bool with_artwork: If artwork is downloaded
+        :param int artwork_fetches: Number of albums whose artwork is not cached yet
+        :param dict rates: Measured stage rates to project time with, see :py:data:`DEFAULT_RATES`
+        :param float created: Time the plan was made
+        """
+        self.tracks = tracks
+        self.dir = dir
+        self.search_syntax = search_syntax
+        self.with_artwork = with_artwork
+        self.artwork_fetches = artwork_fetches
+        self.rates = rates if rates is not None else {}
+        self.created = created if created is not None else time.time()
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def to_download(self) -> list[PlannedTrack]:
+        return [planned for planned in self.tracks if planned.status == 'download']
+
+    def totals(self) -> dict:
+        """Returns the number of tracks by status, and the bytes and audio duration of the tracks to download.
+
+        :rtype: dict
+        """
+        counts = {status: 0 for status in STATUSES}
+        for planned in self.tracks:
+            counts[planned.status] += 1
+        to_download = self.to_download()
+        return {
+            'tracks': counts,
+            'download_bytes': sum(planned.download_bytes for planned in to_download),
+            'output_bytes': sum(planned.output_bytes for planned in to_download)
+                            + (self.artwork_fetches * ARTWORK_BYTES if self.with_artwork else 0),
+            'duration_s': sum(planned.track.duration_ms for planned in to_download) / 1000,
+        }
+
+    def projection(self, workers: int = 1, rate: float = None) -> dict:
+        """Projects how long carrying out the plan takes, per stage and in total.
+
+        Stage times are summed over all tracks and split over `workers`. A bandwidth limit caps the download stage.
+
+        :param int workers: Number of tracks downloaded at once
+        :param float rate: Bandwidth limit in bytes per second, None for no limit
+        :return: {'seconds': total, 'stages': {stage: seconds}, 'measured': [rates measured, not defaults]}
+        :rtype: dict
+        """
+        rates = {**DEFAULT_RATES, **self.rates}
+        to_download = self.to_download()
+        download_bytes = sum(planned.download_bytes for planned in to_download)
+
+        stages = {
+            'search': len(to_download) * rates['search_s'] / workers,
+            'download': download_bytes / (rates['download_bps'] * workers),
+            'convert': download_bytes / (1024 * 1024) * rates['convert_s_per_mb'] / workers,
+            'tag': len(to_download) * rates['tag_s'] / workers,
+        }
+        if rate:
+            stages['download'] = max(stages['download'], download_bytes / rate)
+
+        return {'seconds': sum(stages.values()), 'stages': stages, 'measured': sorted(self.rates)}
+
+    def describe(self, workers: int = 1, rate: float = None) -> str:
+        """Returns a readable summary of the plan and its projection.
+
+        :param int workers: Number of tracks downloaded at once
+        :param float rate: Bandwidth limit in bytes per second, None for no limit
+        :rtype: str
+        """
+        totals = self.totals()
+        counts = totals['tracks']
+        projection = self.projection(workers, rate)
+        stages = ', '.join(f"{stage} {_duration(seconds)}" for stage, seconds in projection['stages'].items())
+
+        lines = [
+            f"{len(self)} tracks: {counts['download']} to download, {counts['stored']} to link from the store, "
+            f"{counts['exists']} already downloaded, {counts['no_match']} without a match, "
+            f"{counts['error']} could not be resolved",
+            f"Download {_size(totals['download_bytes'])}, {_size(totals['output_bytes'])} on disk, "
+            f"{_duration(totals['duration_s'])} of audio",
+            f"Estimated time with {workers} worker(s): {_duration(projection['seconds'])} ({stages})",
+        ]
+        missing = sorted(set(DEFAULT_RATES) - set(projection['measured']))
+        if missing:
+            lines.append(f"Not measured yet, assumed: {', '.join(missing)}. "
+                         f"Pass metrics exported from an earlier download for a better estimate.")
+        return '\n'.join(lines)
+
+    def save(self, path: str) -> None:
+        """Saves the plan to a JSON file.
+
+        :param str path: Output file
+        """
+        data = {
+            'created': self.created,
+            'dir': self.dir,
+            'search_syntax': self.search_syntax,
+            'with_artwork': self.with_artwork,
+            'artwork_fetches': self.artwork_fetches,
+            'rates': self.rates,
+            'tracks': [{**planned._asdict(), 'track': list(planned.track)} for planned in self.tracks],
+        }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, path: str) -> 'Plan':
+        """Loads a plan saved with :py:meth:`save`.
+
+        :param str path: Plan file
+        :rtype: Plan
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        tracks = [PlannedTrack(**{**planned, 'track': TDValue(*planned['track'])}) for planned in data.pop('tracks')]
+        return cls(tracks, **data)
+
+
+def _size(nbytes: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if nbytes < 1024:
+            return f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} TB"
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
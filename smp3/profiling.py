@@ -0,0 +1,287 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, ExitStack
+
+_active = None  # Profiler currently running, if any
+
+
+class _StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.subprocess_cpu = 0.0
+        self.peak_alloc = 0
+        self.samples = 0
+        self.self_samples = {}
+        self.total_samples = {}
+
+
+class _OpenStage:
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        self.children_start = _children_cpu()
+        self.alloc_start = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        self.peak = 0
+
+
+def _children_cpu() -> float:
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class Profiler:
+    """Profiles Spotify2MP3 by stage (spotify, search, download, convert, artwork, metadata).
+
+    For every stage it records:
+        * a sampled CPU profile: the call stacks of threads inside the stage are sampled every `interval` seconds
+        * the peak memory allocated by Python while in the stage (tracemalloc), e.g. AudioSegment PCM buffers
+        * wall-clock time split into CPU time of the thread, CPU time of subprocesses (ffmpeg), and waiting
+          (network and disk I/O)
+
+    Memory is traced for the whole process, so with several workers running at once it is attributed to every
+    stage that was open at the time.
+
+    Also See:
+        * :py:func:`profile` to profile a block of code and save the report
+    """
+
+    def __init__(self, interval: float = 0.005, trace_memory: bool = True, top: int = 25):
+        """
+        :param float interval: Seconds between stack samples
+        :param bool trace_memory: If allocations should be traced (slows Python code down noticeably)
+        :param int top: Number of functions per stage to include in the report
+        """
+        self.interval = interval
+        self.trace_memory = trace_memory
+        self.top = top
+
+        self.stages = {}
+        self.__open = {}  # thread id -> [_OpenStage, ...]
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__sampler = None
+        self.__started_tracing = False
+        self.__start_time = None
+        self.wall = 0.0
+
+    def start(self) -> None:
+        global _active
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.__started_tracing = True
+        self.__start_time = time.perf_counter()
+        self.__stop.clear()
+        self.__sampler = threading.Thread(target=self.__sample_loop, name='smp3-profiler', daemon=True)
+        self.__sampler.start()
+        _active = self
+
+    def stop(self) -> None:
+        global _active
+        _active = None
+        self.__stop.set()
+        self.__sampler.join()
+        self.wall += time.perf_counter() - self.__start_time
+        if self.__started_tracing:
+            tracemalloc.stop()
+            self.__started_tracing = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @contextmanager
+    def stage(self, name: str, carried: bool = False):
+        """Attributes everything the current thread does in the block to stage `name`.
+
+        Stages can be nested. A stage nested in another stage of the same name is counted once.
+
+        :param str name: Stage name
+        :param bool carried: If the stage was opened by another thread that waits for this one, see
+            :py:func:`carry_stages`. Only the CPU time, samples and memory of the block are added, because calls,
+            wall-clock time and subprocesses are already counted by the thread that opened it.
+        """
+        thread_id = threading.get_ident()
+        with self.__lock:
+            stack = self.__open.setdefault(thread_id, [])
+            if any(open_stage.name == name for open_stage in stack):
+                reentered = True
+            else:
+                reentered = False
+                self.__update_peaks()
+                open_stage = _OpenStage(name)
+                stack.append(open_stage)
+        if reentered:
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - open_stage.wall_start
+            cpu = time.thread_time() - open_stage.cpu_start
+            children = _children_cpu() - open_stage.children_start
+            with self.__lock:
+                self.__update_peaks()
+                stack.remove(open_stage)
+                stats = self.__stats(name)
+                if not carried:
+                    stats.calls += 1
+                    stats.wall += wall
+                    stats.subprocess_cpu += children
+                stats.cpu += cpu
+                stats.peak_alloc = max(stats.peak_alloc, open_stage.peak - open_stage.alloc_start)
+
+    def open_stages(self) -> list[str]:
+        """Returns the names of the stages the current thread is in, outermost first.
+
+        :rtype: list[str]
+        """
+        with self.__lock:
+            return [open_stage.name for open_stage in self.__open.get(threading.get_ident(), ())]
+
+    def report(self) -> dict:
+        """Returns the profile as a dict. Keys are sorted and numbers rounded so reports of two runs diff cleanly.
+
+        :rtype: dict
+        """
+        with self.__lock:
+            stages = {}
+            for name, stats in sorted(self.stages.items()):
+                # Hot spots first: functions the samples were taken in, then their callers
+                top = sorted(stats.total_samples.items(),
+                             key=lambda item: (-stats.self_samples.get(item[0], 0), -item[1], item[0]))[:self.top]
+                stages[name] = {
+                    'calls': stats.calls,
+                    'wall_s': round(stats.wall, 3),
+                    'cpu_s': round(stats.cpu, 3),
+                    'subprocess_cpu_s': round(stats.subprocess_cpu, 3),
+                    'wait_s': round(max(stats.wall - stats.cpu - stats.subprocess_cpu, 0.0), 3),
+                    'peak_alloc_mb': round(stats.peak_alloc / (1024 * 1024), 2),
+                    'samples': stats.samples,
+                    'functions': [{'function': function, 'total': total,
+                                   'self': stats.self_samples.get(function, 0)} for function, total in top],
+                }
+            return {'interval_s': self.interval, 'wall_s': round(self.wall, 3), 'stages': stages}
+
+    def save(self, path: str) -> None:
+        """Writes the report to a JSON file.
+
+        :param str path: Output file
+        """
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, indent=2, sort_keys=True)
+
+    def __stats(self, name: str) -> _StageStats:
+        if name not in self.stages:
+            self.stages[name] = _StageStats()
+        return self.stages[name]
+
+    def __update_peaks(self) -> None:
+        # tracemalloc only keeps one peak, so record it in every open stage before it is reset
+        if not tracemalloc.is_tracing():
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for stack in self.__open.values():
+            for open_stage in stack:
+                open_stage.peak = max(open_stage.peak, peak)
+        tracemalloc.reset_peak()
+
+    def __sample_loop(self) -> None:
+        while not self.__stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self.__lock:
+                for thread_id, stack in self.__open.items():
+                    frame = frames.get(thread_id)
+                    if frame is None or not stack:
+                        continue
+
+                    functions = []
+                    while frame is not None:
+                        code = frame.f_code
+                        if code.co_filename != __file__:  # leave out the profiler's own wrappers
+                            functions.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    if not functions:
+                        continue
+
+                    for open_stage in stack:
+                        stats = self.__stats(open_stage.name)
+                        stats.samples += 1
+                        stats.self_samples[functions[0]] = stats.self_samples.get(functions[0], 0) + 1
+                        for function in set(functions):
+                            stats.total_samples[function] = stats.total_samples.get(function, 0) + 1
+
+
+@contextmanager
+def profile(path: str = None, **kwargs):
+    """Profiles the block and optionally saves the report.
+
+    Example::
+
+        with profile('profile.json'):
+            s.download_tracks(tracks)
+
+    :param str path: File to save the report to
+    :param kwargs: Arguments for :py:class:`Profiler`
+    """
+    profiler = Profiler(**kwargs)
+    with profiler:
+        yield profiler
+    if path is not None:
+        profiler.save(path)
+
+
+@contextmanager
+def profile_stage(name: str):
+    """Attributes the block to stage `name` of the running profiler. Does nothing if no profiler is running.
+
+    :param str name: Stage name
+    """
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name):
+        yield
+
+
+def profiled(name: str):
+    """Decorator version of :py:func:`profile_stage`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def carry_stages(func):
+    """Wraps `func` so that it is attributed to the stages the current thread is in when it is called from another
+    thread. Returns `func` unchanged if no profiler is running or no stage is open.
+
+    :param func: Function to wrap
+    """
+    profiler = _active
+    names = profiler.open_stages() if profiler is not None else []
+    if not names:
+        return func
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        with ExitStack() as stack:
+            for name in names:
+                stack.enter_context(profiler.stage(name, carried=True))
+            return func(*args, **kwargs)
+    return run
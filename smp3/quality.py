@@ -0,0 +1,95 @@
+from typing import NamedTuple
+
+from .resolver import NoMatchError
+
+
+# Bitrates within this fraction of the best match count as equal, so the preferred codec wins between e.g. a
+# 128kbps mp4a and a 160kbps opus stream
+CODEC_TOLERANCE = 0.25
+
+
+class QualityProfile(NamedTuple):
+    """Audio quality to download and encode tracks at.
+
+    :param int bitrate: Target bitrate in kbps. The smallest stream at or above it is used, and MP3s are encoded
+        at (at most) this bitrate. None always picks the highest bitrate stream
+    :param str codec: Preferred audio codec of the downloaded stream, e.g. 'opus' or 'mp4a'. Preferred over streams
+        of another codec within :py:data:`CODEC_TOLERANCE` of the best matching bitrate
+    :param int max_size: Maximum size of the downloaded stream in bytes. Streams of unknown size are skipped
+    """
+    bitrate: int = None
+    codec: str = None
+    max_size: int = None
+
+
+def abr_kbps(stream) -> int:
+    """Returns the average bitrate of a pytubefix stream in kbps, e.g. 160 for '160kbps'. 0 if unknown."""
+    try:
+        return int(stream.abr.replace('kbps', ''))
+    except (AttributeError, ValueError):
+        return 0
+
+
+def known_filesize(stream) -> int | None:
+    """Returns the size of a stream in bytes if YouTube reported it, without making a request."""
+    size = getattr(stream, '_filesize', 0)  # pytubefix fetches the size over HTTP if it is not already known
+    return size or None
+
+
+def select_stream(streams, profile: QualityProfile = None):
+    """Selects the audio stream to download for a quality profile.
+
+    Streams larger than `max_size`, or of unknown size if there is a `max_size`, are skipped. If none are left, the
+    smallest stream of known size is picked, or the lowest bitrate if no size is known.
+
+    Of the rest, the best bitrate is the smallest at or above the target, or the highest if none reaches the target
+    or there is no target. Streams of the `codec` within :py:data:`CODEC_TOLERANCE` of it are preferred, then the
+    closest bitrate and the smaller file.
+
+    :param streams: pytubefix StreamQuery of a video
+    :param QualityProfile profile: Quality profile, None for highest bitrate
+    :return: Selected pytubefix Stream
+    :raises NoMatchError: If the video has no audio streams
+    """
+    audio_streams = list(streams.filter(only_audio=True))
+    if not audio_streams:
+        raise NoMatchError("Video has no audio streams")
+
+    if profile is None or profile.bitrate is None and profile.codec is None and profile.max_size is None:
+        return max(audio_streams, key=abr_kbps)
+
+    if profile.max_size is not None:
+        sized = [s for s in audio_streams if known_filesize(s) is not None]
+        fitting = [s for s in sized if known_filesize(s) <= profile.max_size]
+        if not fitting:  # nothing is known to fit, fall back to the smallest stream
+            if sized:
+                return min(sized, key=lambda s: (known_filesize(s), abr_kbps(s)))
+            return min(audio_streams, key=abr_kbps)
+        audio_streams = fitting
+
+    meeting = [] if profile.bitrate is None else [s for s in audio_streams if abr_kbps(s) >= profile.bitrate]
+    if meeting:
+        best = min(abr_kbps(s) for s in meeting)
+        candidates = [s for s in meeting if abr_kbps(s) <= best * (1 + CODEC_TOLERANCE)]
+    else:
+        best = max(abr_kbps(s) for s in audio_streams)
+        candidates = [s for s in audio_streams if abr_kbps(s) * (1 + CODEC_TOLERANCE) >= best]
+
+    def rank(stream):
+        preferred = profile.codec is not None and (stream.audio_codec or '').startswith(profile.codec)
+        return not preferred, abs(abr_kbps(stream) - best), known_filesize(stream) or 0
+
+    return min(candidates, key=rank)
+
+
+def encode_bitrate(stream, profile: QualityProfile = None) -> str:
+    """Returns the bitrate to encode a downloaded stream at, as an ffmpeg bitrate string, e.g. '128k'.
+
+    :param stream: pytubefix Stream that was downloaded
+    :param QualityProfile profile: Quality profile, None to keep the stream's bitrate
+    :rtype: str
+    """
+    bitrate = abr_kbps(stream)
+    if profile is not None and profile.bitrate is not None:
+        bitrate = min(bitrate, profile.bitrate) if bitrate else profile.bitrate
+    return f"{bitrate or 192}k"
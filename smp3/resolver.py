@@ -0,0 +1,119 @@
+import re
+from difflib import SequenceMatcher
+
+from pytubefix import Search, YouTube
+
+from .profiling import profiled
+
+
+class NoMatchError(Exception):
+    """Raised when no search result is close enough to the Spotify track."""
+
+
+# Versions of a song that are usually not what the Spotify track is, unless its name says so
+ALT_VERSION_WORDS = ('live', 'cover', 'remix', 'karaoke', 'instrumental', 'acoustic', 'slowed', 'sped up',
+                     'reverb', '8d', 'nightcore', 'reaction', 'lyrics video')
+
+
+# A single bracket group with words that describe the upload rather than the song, e.g. "[Official Video]"
+_NOISE = r'(official|video|audio|lyrics?|visuali[sz]er|hd|hq|4k)'
+_UPLOAD_INFO = re.compile(rf'\([^()]*{_NOISE}[^()]*\)|\[[^\[\]]*{_NOISE}[^\[\]]*\]')
+
+
+def _normalize(text: str) -> str:
+    text = text.lower()
+    text = _UPLOAD_INFO.sub(' ', text)
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+class Resolver:
+    """Picks the YouTube video to download for a Spotify track.
+
+    The top `candidates` search results are scored against the track before anything is downloaded. Scores combine
+    title/artist similarity with how close the video length is to the Spotify duration. Results whose length is
+    further than `duration_tolerance` seconds away, or whose score is below `min_score`, are rejected.
+    """
+
+    def __init__(self, candidates: int = 5, duration_tolerance: float = 15.0, min_score: float = 0.4,
+                 search=None, opener=None):
+        """
+        :param int candidates: Number of search results to consider
+        :param float duration_tolerance: Maximum difference in seconds between video length and track duration
+        :param float min_score: Minimum score (0 to 1) for a result to be accepted
+        :param search: Function taking a query and returning a list of pytubefix YouTube objects.
+            Defaults to a YouTube web search
+        :param opener: Function taking a watch URL and returning a pytubefix YouTube object, used to open videos
+            resolved earlier. Defaults to pytubefix YouTube
+        """
+        self.candidates = candidates
+        self.duration_tolerance = duration_tolerance
+        self.min_score = min_score
+        self.search = search if search is not None else (lambda query: Search(query, 'WEB').videos)
+        self.opener = opener if opener is not None else (lambda url: YouTube(url, 'WEB'))
+
+    @profiled('search')
+    def resolve(self, query: str, track):
+        """Searches YouTube and returns the best matching video for a track.
+
+        :param str query: Search query
+        :param track: Track or TDValue to match against
+        :return: pytubefix YouTube object
+        :raises NoMatchError: If no result is within tolerance
+        """
+        ranked = self.rank(self.search(query)[:self.candidates], track)
+        if not ranked:
+            raise NoMatchError(f"No YouTube result matches '{track.name}' by {track.artist}")
+        return ranked[0][1]
+
+    def rank(self, results: list, track) -> list[tuple[float, object]]:
+        """Scores search results against a track, best first. Rejected results are left out.
+
+        :param list results: pytubefix YouTube objects
+        :param track: Track or TDValue to match against
+        :return: [(score, result) ...]
+        :rtype: list[tuple[float, YouTube]]
+        """
+        scored = []
+        for result in results:
+            score = self.score(result, track)
+            if score is not None and score >= self.min_score:
+                scored.append((score, result))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored
+
+    def score(self, result, track) -> float | None:
+        """Scores a single search result from 0 to 1, or None if its length is outside the tolerance.
+
+        :param result: pytubefix YouTube object
+        :param track: Track or TDValue to match against
+        :rtype: float | None
+        """
+        title = _normalize(result.title)
+        author = _normalize(result.author or '')
+        name = _normalize(track.name)
+        artist = _normalize(track.artist)
+
+        # Title similarity, and how many words of the track name appear in the title
+        name_words = name.split()
+        containment = sum(word in title.split() for word in name_words) / len(name_words) if name_words else 0
+        similarity = SequenceMatcher(None, f"{artist} {name}", title).ratio()
+        title_score = max(containment * 0.8 + similarity * 0.2, similarity)
+
+        artist_score = 1.0 if artist and (artist in title or artist in author) else 0.0
+
+        duration_score = 0.5  # unknown duration, neither rewarded nor rejected
+        if track.duration_ms and result.length:
+            difference = abs(result.length - track.duration_ms / 1000)
+            if difference > self.duration_tolerance:
+                return None
+            duration_score = 1 - difference / self.duration_tolerance
+
+        score = 0.45 * title_score + 0.2 * artist_score + 0.35 * duration_score
+
+        for word in ALT_VERSION_WORDS:
+            if re.search(rf'\b{word}\b', title) and not re.search(rf'\b{word}\b', name):
+                score -= 0.2
+
+        return max(score, 0.0)
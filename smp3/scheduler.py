@@ -0,0 +1,87 @@
+from itertools import chain, zip_longest
+
+from .track import TracksDict, bare_id
+
+# A policy takes a TracksDict and returns its track IDs in the order they should be downloaded. Policies only
+# reorder, so they can be combined with :py:func:`by_priority` and work on tracks merged from several playlists.
+
+
+def insertion_order(tracks: TracksDict) -> list[str]:
+    """Tracks in the order they were found, e.g. playlist order."""
+    return list(tracks)
+
+
+def newest_first(tracks: TracksDict) -> list[str]:
+    """Tracks most recently added to their playlist first. Tracks without an added date go last."""
+    dated = [track_id for track_id, track in tracks.items() if track.added_at]
+    undated = [track_id for track_id, track in tracks.items() if not track.added_at]
+    return sorted(dated, key=lambda track_id: tracks[track_id].added_at, reverse=True) + undated
+
+
+def shortest_first(tracks: TracksDict) -> list[str]:
+    """Shortest tracks first, to finish as many tracks as possible in a given time. Tracks of unknown length go
+    last."""
+    return sorted(tracks, key=lambda track_id: (tracks[track_id].duration_ms <= 0, tracks[track_id].duration_ms))
+
+
+def round_robin(tracks: TracksDict) -> list[str]:
+    """One track of each playlist or album in turn, so a large playlist does not hold up the others."""
+    sources = {}
+    for track_id, track in tracks.items():
+        sources.setdefault(track.source, []).append(track_id)
+    return [track_id for track_id in chain.from_iterable(zip_longest(*sources.values())) if track_id is not None]
+
+
+def by_priority(priorities: dict, default: int = 0, then=insertion_order):
+    """Returns a policy that downloads tracks with higher priority first.
+
+    Example::
+
+        s.set_schedule(by_priority({'PLAYLIST_ID': 10, 'TRACK_ID': 20}, then=shortest_first))
+
+    :param dict priorities: Priority by track ID, or by playlist/album ID for all of its tracks. Track IDs win.
+        IDs can also be given as URIs or URLs
+    :param int default: Priority of tracks not in `priorities`
+    :param then: Policy ordering tracks of the same priority
+    """
+    priorities = {bare_id(id): value for id, value in priorities.items()}
+
+    def policy(tracks: TracksDict) -> list[str]:
+        order = then(tracks)
+
+        def priority(track_id: str) -> int:
+            return priorities.get(track_id, priorities.get(bare_id(tracks[track_id].source), default))
+
+        return sorted(order, key=priority, reverse=True)  # sorted is stable, so `then` orders ties
+
+    return policy
+
+
+POLICIES = {
+    'insertion': insertion_order,
+    'newest': newest_first,
+    'shortest': shortest_first,
+    'round-robin': round_robin,
+}
+
+
+def get_policy(name: str):
+    """Returns a policy by name, one of insertion, newest, shortest, round-robin."""
+    if name not in POLICIES:
+        raise ValueError(f"Unknown schedule '{name}', choose from {tuple(POLICIES)}")
+    return POLICIES[name]
+
+
+def schedule(tracks: TracksDict, policy) -> TracksDict:
+    """Returns the tracks reordered by a policy.
+
+    :param TracksDict tracks: Tracks to download
+    :param policy: Function taking a TracksDict and returning its track IDs in download order, or the name of one
+    :rtype: TracksDict
+    """
+    if isinstance(policy, str):
+        policy = get_policy(policy)
+    order = policy(tracks)
+    if sorted(order) != sorted(tracks):
+        raise ValueError("Schedule policy must return every track ID exactly once")
+    return TracksDict({track_id: tracks[track_id] for track_id in order})
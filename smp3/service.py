@@ -0,0 +1,380 @@
+import copy
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .capture import capture_output
+from .scheduler import POLICIES
+
+TYPES = ('track', 'playlist', 'album', 'user', 'artist')
+ACTIONS = ('download', 'save')
+FINISHED = ('done', 'failed', 'cancelled')
+
+
+class _ServiceJob:
+    def __init__(self, request: dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.request = request
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.total = 0
+        self.paths = []
+        self.error = None
+        self.log = io.StringIO()
+        self.cancel = threading.Event()
+
+    def summary(self, log: bool = False) -> dict:
+        summary = {'id': self.id, 'status': self.status, 'request': self.request, 'created': self.created,
+                   'started': self.started, 'finished': self.finished, 'tracks': self.total,
+                   'downloaded': len(self.paths), 'paths': self.paths, 'error': self.error}
+        if log:
+            summary['log'] = self.log.getvalue()
+        return summary
+
+
+def _validate(request: dict) -> dict:
+    """Checks a job request and fills in defaults. Raises ValueError if it is invalid."""
+    if not isinstance(request, dict):
+        raise ValueError("Job must be a JSON object")
+    request = dict(request)
+    request.setdefault('action', 'download')
+
+    if request.get('type') not in TYPES:
+        raise ValueError(f"type must be one of {TYPES}")
+    if request['action'] not in ACTIONS:
+        raise ValueError(f"action must be one of {ACTIONS}")
+    if sum(key in request for key in ('id', 'name', 'namelist')) != 1:
+        raise ValueError("Exactly one of id, name or namelist is required")
+    if 'namelist' in request and not isinstance(request['namelist'], list):
+        raise ValueError("namelist must be a list of names")
+    if request['type'] == 'user' and 'id' not in request:
+        raise ValueError("Cannot get user tracks with user's name")
+    workers = request.get('workers', 1)
+    if not isinstance(workers, int) or isinstance(workers, bool) or workers < 1:
+        raise ValueError("workers must be a positive integer")
+    if request.get('schedule') is not None and request['schedule'] not in POLICIES:
+        raise ValueError(f"schedule must be one of {tuple(POLICIES)}")
+    if request['action'] == 'save' and not request.get('output_file'):
+        raise ValueError("output_file is required to save")
+    return request
+
+
+class Service:
+    """Runs Spotify2MP3 jobs in a long-running process.
+
+    One Spotify2MP3 object is kept for the life of the service, so its Spotify token, HTTP connection pools and
+    caches are reused by every job instead of being set up again for each run. Jobs run on a pool of `jobs` threads,
+    each downloading `workers` tracks at once on a second pool that lives as long as the service, and can be cancelled
+    between tracks.
+
+    Jobs are dicts::
+
+        {'type': 'playlist', 'id': '...', 'action': 'download', 'dir': 'C:/Music', 'workers': 4, 'schedule': 'newest'}
+        {'type': 'track', 'namelist': ['Song 1', 'Song 2'], 'action': 'save', 'output_file': 'songs.txt'}
+
+    Also See:
+        * :py:meth:`serve` for the HTTP API, and :py:class:`ServiceClient` to use it.
+    """
+
+    def __init__(self, client, jobs: int = 2, workers: int = 1, history: int = 100):
+        """
+        :param Spotify2MP3 client: Client to share between jobs, with its directory and quality already set
+        :param int jobs: Number of jobs to run at once
+        :param int workers: Default number of tracks each job downloads at once
+        :param int history: Number of finished jobs to keep
+        """
+        self.client = client
+        self.workers = workers
+        self.history = history
+        self.jobs = {}
+
+        self.__lock = threading.Lock()
+        self.__pool = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='smp3-job')
+        self.__tracks = ThreadPoolExecutor(max_workers=jobs * workers, thread_name_prefix='smp3-track')
+        self.__server = None
+
+    def warm(self) -> None:
+        """Gets a Spotify token up front, so the first job does not wait for it."""
+        self.client.sp.auth_manager.get_access_token(as_dict=False)
+
+    def submit(self, request: dict) -> dict:
+        """Adds a job.
+
+        :param dict request: Job, see :py:class:`Service`
+        :return: Summary of the job
+        :rtype: dict
+        :raises ValueError: If the job is invalid
+        """
+        job = _ServiceJob(_validate(request))
+        with self.__lock:
+            self.jobs[job.id] = job
+            self.__prune()
+        self.__pool.submit(self.__run, job)
+        return job.summary()
+
+    def get(self, job_id: str, log: bool = False) -> dict | None:
+        """Returns the summary of a job, or None if there is no such job.
+
+        :param str job_id: ID of the job
+        :param bool log: If the output of the job should be included
+        :rtype: dict | None
+        """
+        with self.__lock:
+            job = self.jobs.get(job_id)
+        return job.summary(log) if job is not None else None
+
+    def get_jobs(self) -> list[dict]:
+        """Returns summaries of all jobs, oldest first.
+
+        :rtype: list[dict]
+        """
+        with self.__lock:
+            jobs = list(self.jobs.values())
+        return [job.summary() for job in jobs]
+
+    def cancel(self, job_id: str) -> dict | None:
+        """Cancels a job. Tracks that are already downloading are finished first.
+
+        :param str job_id: ID of the job
+        :return: Summary of the job, or None if there is no such job
+        :rtype: dict | None
+        """
+        with self.__lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        job.cancel.set()
+        with self.__lock:
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished = time.time()
+        return job.summary()
+
+    def serve(self, host: str = '127.0.0.1', port: int = 8765) -> None:
+        """Serves the HTTP API until :py:meth:`shutdown` is called.
+
+        Endpoints:
+            * GET /health
+            * GET /jobs: all jobs
+            * POST /jobs: add a job, body is the job as JSON
+            * GET /jobs/ID: a job with its output
+            * DELETE /jobs/ID: cancel a job
+
+        Anyone who can reach the port can download to the service's machine, so only bind to other interfaces than
+        localhost on trusted networks.
+
+        :param str host: Interface to listen on
+        :param int port: Port to listen on, 0 for any free port
+        """
+        self.__server = ThreadingHTTPServer((host, port), _handler(self))
+        self.__server.daemon_threads = True
+        self.__server.serve_forever()
+
+    @property
+    def address(self) -> tuple[str, int] | None:
+        """(host, port) the service is listening on, once :py:meth:`serve` is running."""
+        return self.__server.server_address if self.__server is not None else None
+
+    def shutdown(self) -> None:
+        """Stops serving and cancels all jobs. Waits for tracks that are already downloading to finish."""
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+        with self.__lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            self.cancel(job.id)
+        self.__pool.shutdown(wait=True)
+        self.__tracks.shutdown(wait=True)
+
+    def __prune(self) -> None:
+        finished = [job for job in self.jobs.values() if job.status in FINISHED]
+        for job in finished[:max(len(finished) - self.history, 0)]:
+            del self.jobs[job.id]
+
+    def __run(self, job: _ServiceJob) -> None:
+        with self.__lock:
+            if job.status != 'queued':
+                return
+            job.status = 'running'
+            job.started = time.time()
+
+        try:
+            with capture_output(job.log):
+                self.__execute(job)
+        except Exception as e:
+            status, job.error = 'failed', f"{type(e).__name__}: {e}"
+        else:
+            status = 'cancelled' if job.cancel.is_set() else 'done'
+
+        with self.__lock:
+            job.status = status
+            job.finished = time.time()
+
+    def __execute(self, job: _ServiceJob) -> None:
+        request = job.request
+
+        # Each job gets its own directory and progress settings, the Spotify client, connection pools and caches are
+        # shared with the service, and so is the pool the tracks are downloaded on
+        client = copy.copy(self.client)
+        client.set_progress('quiet')
+        client.set_executor(self.__tracks)
+        if request.get('dir'):
+            client.set_dir(request['dir'])
+        if request.get('schedule') is not None:
+            client.set_schedule(request['schedule'])
+
+        if 'id' in request:
+            ids = [request['id']]
+        else:
+            names = [request['name']] if 'name' in request else request['namelist']
+            ids = []
+            for name in names:
+                if job.cancel.is_set():
+                    return
+                id = client.search_id(query=name, type=request['type'])
+                if id is None:
+                    print("ERROR: Could not find", name)
+                else:
+                    ids.append(id)
+
+        for id in ids:
+            if job.cancel.is_set():
+                return
+            tracks = client.get_tracks(id=id, type=request['type'])
+            job.total += len(tracks)
+
+            if request['action'] == 'save':
+                client.save_tracks(tracks=tracks, output_file=request['output_file'])
+            else:
+                paths = client.download_tracks(tracks=tracks, search_syntax=request.get('search_syntax', 'ARTIST - NAME'),
+                                               with_artwork=request.get('with_artwork', True),
+                                               workers=request.get('workers', self.workers), cancel=job.cancel)
+                if paths is None:
+                    raise ValueError("No download directory set for the job or the service")
+                job.paths.extend(paths)
+
+
+def _handler(service: Service):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            parts = self.path.strip('/').split('/')
+            if parts == ['health']:
+                counts = {}
+                for job in service.get_jobs():
+                    counts[job['status']] = counts.get(job['status'], 0) + 1
+                self.__send(200, {'status': 'ok', 'jobs': counts})
+            elif parts == ['jobs']:
+                self.__send(200, service.get_jobs())
+            elif len(parts) == 2 and parts[0] == 'jobs':
+                self.__send_job(service.get(parts[1], log=True))
+            else:
+                self.__send(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            if self.path.strip('/') != 'jobs':
+                self.__send(404, {'error': 'Not found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                self.__send(202, service.submit(json.loads(self.rfile.read(length) or b'null')))
+            except ValueError as e:  # includes invalid JSON
+                self.__send(400, {'error': str(e)})
+
+        def do_DELETE(self):
+            parts = self.path.strip('/').split('/')
+            if len(parts) == 2 and parts[0] == 'jobs':
+                self.__send_job(service.cancel(parts[1]))
+            else:
+                self.__send(404, {'error': 'Not found'})
+
+        def __send_job(self, job: dict | None):
+            if job is None:
+                self.__send(404, {'error': 'No such job'})
+            else:
+                self.__send(200, job)
+
+        def __send(self, status: int, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+class ServiceClient:
+    """Client for the HTTP API of a running :py:class:`Service`."""
+
+    def __init__(self, url: str = 'http://127.0.0.1:8765', timeout: float = 30):
+        """
+        :param str url: Address of the service
+        :param float timeout: Seconds to wait for a response
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def __request(self, method: str, path: str, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            error = json.loads(e.read() or b'{}').get('error', e.reason)
+            if e.code == 400:
+                raise ValueError(error) from None
+            if e.code == 404:
+                raise KeyError(error) from None
+            raise
+
+    def health(self) -> dict:
+        return self.__request('GET', '/health')
+
+    def submit(self, request: dict) -> dict:
+        """Adds a job. See :py:class:`Service` for the format of jobs.
+
+        :rtype: dict
+        :raises ValueError: If the service rejects the job
+        """
+        return self.__request('POST', '/jobs', request)
+
+    def jobs(self) -> list[dict]:
+        return self.__request('GET', '/jobs')
+
+    def status(self, job_id: str) -> dict:
+        """
+        :raises KeyError: If there is no such job
+        """
+        return self.__request('GET', f'/jobs/{job_id}')
+
+    def cancel(self, job_id: str) -> dict:
+        """
+        :raises KeyError: If there is no such job
+        """
+        return self.__request('DELETE', f'/jobs/{job_id}')
+
+    def wait(self, job_id: str, poll_interval: float = 0.5) -> dict:
+        """Waits until a job has finished and returns its final status.
+
+        :rtype: dict
+        """
+        while True:
+            job = self.status(job_id)
+            if job['status'] in FINISHED:
+                return job
+            time.sleep(poll_interval)
@@ -1,21 +1,36 @@
 import os
 import re
-import sys
+import threading
+import time
 import warnings
+from concurrent.futures import Executor, ThreadPoolExecutor
 from contextlib import contextmanager
 from pathlib import Path
 
 import music_tag
-import requests
 import spotipy
-from pydub import AudioSegment
-from pytubefix import Search, exceptions
+from pytubefix import exceptions
 from spotipy.oauth2 import SpotifyClientCredentials
 import json
 
 # Local Imports
-from .track import TracksDict, TDValue, Track
-from .ProgressManager import ProgressManager, simple_bar
+from .track import TracksDict, TDValue, Track, bare_id
+from .ProgressManager import ProgressManager, simple_bar, MODES
+from .downloader import Downloader, DownloadError
+from .quality import QualityProfile, select_stream, encode_bitrate, known_filesize
+from .resolver import Resolver, NoMatchError
+from .metrics import metrics
+from .profiling import profiled
+from .capture import capture_output, carry
+from .workqueue import WorkQueue, Job, default_worker_name
+from . import deadline
+from .deadline import Timeouts, Hedger, StageTimeoutError
+from .targets import OutputTarget, OutputNames, check_targets, copy_outputs, fan_out, read_audio
+from .tags import AUDIO_EXTENSIONS, apply_tags, read_track_id
+from .planner import Plan, PlannedTrack, estimate_download_bytes, estimate_output_bytes, measured_rates
+from .store import ContentStore, profile_key
+from .scheduler import schedule, get_policy
+from .watcher import FolderWatcher
 
 
 class Spotify2MP3:
@@ -45,7 +60,18 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
         self.dir = None
         self.img_dir = None
         self.search_lim = 5
-
+        self.downloader = Downloader()
+        self.quality = None
+        self.resolver = Resolver()
+        self.progress_mode = 'bar'
+        self.timeouts = Timeouts()
+        self.hedger = None
+        self.targets = None
+        self.store = None
+        self.schedule = None
+        self.executor = None
+
+    @profiled('spotify')
     def get_track(self, track_id: str) -> Track:
         """Gets a track and its metadata from Spotify.
 
@@ -57,7 +83,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
         :rtype: Track
         """
         track_id = track_id.split('?si=')[0]
-        track = self.sp.track(track_id=track_id)
+        track = self.__spotify(self.sp.track, track_id=track_id)
 
         # Get Metadata
         id = track['id']
@@ -65,11 +91,11 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
         artist = track['album']['artists'][0]['name']
         album = track['album']['name']
         artwork = track['album']['images'][0]['url']
+        duration_ms = track['duration_ms']
 
+        return Track(id=id, name=name, artist=artist, album=album, artwork=artwork, duration_ms=duration_ms)
 
-
-        return Track(id=id, name=name, artist=artist, album=album, artwork=artwork)
-
+    @profiled('spotify')
     def get_playlist_tracks(self, playlist_id: str) -> TracksDict:
         """Gets tracks and their metadata from a Spotify playlist.
 
@@ -90,7 +116,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
         print('Getting tracks...', end=' ')
         while True:
             # Track No.0-100, Track No.100-200 etc. Using offset to determine starting point.
-            playlist_tracks = self.sp.playlist_items(playlist_id=playlist_id, offset=offset)["items"]
+            playlist_tracks = self.__spotify(self.sp.playlist_items, playlist_id=playlist_id, offset=offset)["items"]
             count = 0
             for track in playlist_tracks:
                 # Get metadata
@@ -99,8 +125,11 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
                 artist = track["track"]["album"]["artists"][0]["name"]
                 album = track["track"]["album"]["name"]
                 artwork = track['track']['album']['images'][0]['url']
+                duration_ms = track['track']['duration_ms']
+                added_at = track.get('added_at') or ''
 
-                output[id] = TDValue(name=name, artist=artist, album=album, artwork=artwork)
+                output[id] = TDValue(name=name, artist=artist, album=album, artwork=artwork, duration_ms=duration_ms,
+                                     added_at=added_at, source=bare_id(playlist_id))
                 count += 1
 
             tracks_found += count
@@ -114,6 +143,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
 
         return output
 
+    @profiled('spotify')
     def get_album_tracks(self, album_id: str) -> TracksDict:
         """Gets tracks and their metadata from a Spotify album.
 
@@ -133,11 +163,11 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
         tracks_found = 0
         print('Getting tracks...', end=' ')
 
-        album_name = self.sp.album(album_id=album_id)["name"]
+        album_name = self.__spotify(self.sp.album, album_id=album_id)["name"]
 
         while True:
             # Track No.0-50, Track No.50-100 etc. Using offset to determine starting point.
-            album_tracks = self.sp.album_tracks(album_id=album_id, offset=offset)["items"]
+            album_tracks = self.__spotify(self.sp.album_tracks, album_id=album_id, offset=offset)["items"]
 
             count = 0
             for track in album_tracks:
@@ -145,7 +175,8 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
                 id = track["id"]
                 value = self.get_track(id)
 
-                output[id] = TDValue(name=value.name, artist=value.artist, album=value.album, artwork=value.artwork)
+                output[id] = TDValue(name=value.name, artist=value.artist, album=value.album, artwork=value.artwork,
+                                     duration_ms=value.duration_ms, source=bare_id(album_id))
                 count += 1
 
             tracks_found += count
@@ -159,6 +190,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
 
         return output
 
+    @profiled('spotify')
     def get_user_tracks(self, user_id: str):
         """Gets playlist tracks and their metadata from a Spotify user.
 
@@ -180,7 +212,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
 
         while True:
             # Track No.0-50, Track No.50-100 etc. Using offset to determine starting point.
-            user_playlists = self.sp.user_playlists(user=user_id, offset=offset)["items"]
+            user_playlists = self.__spotify(self.sp.user_playlists, user=user_id, offset=offset)["items"]
 
             count = 0
             for playlist in user_playlists:
@@ -188,7 +220,8 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
                 print(f"Playlist {playlists_found + count + 1}.", end=' ')
                 curr_playlist_tracks = self.get_playlist_tracks(playlist["id"])
 
-                output.update(curr_playlist_tracks)
+                # A track in several playlists keeps the source and added date of the first one
+                output.update({id: value for id, value in curr_playlist_tracks.items() if id not in output})
                 count += 1
 
             playlists_found += count
@@ -202,6 +235,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
 
         return output
 
+    @profiled('spotify')
     def get_artist_tracks(self, artist_id):
         """Gets artists' tracks and their metadata from an artist.
 
@@ -223,7 +257,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
 
         while True:
             # Track No.0-50, Track No.50-100 etc. Using offset to determine starting point.
-            artist_albums = self.sp.artist_albums(artist_id=artist_id, offset=offset)["items"]
+            artist_albums = self.__spotify(self.sp.artist_albums, artist_id=artist_id, offset=offset)["items"]
 
             count = 0
             for album in artist_albums:
@@ -308,7 +342,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
         :param output_file: output file location
         """
 
-        result = self.sp.search(q=f'{type}:{query}', type=type, limit=self.search_lim)[type + "s"]["items"]
+        result = self.__spotify(self.sp.search, q=f'{type}:{query}', type=type, limit=self.search_lim)[type + "s"]["items"]
         i = 0
 
         while i < self.search_lim:
@@ -360,7 +394,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
 
         for query in list(items):
 
-            all_results = self.sp.search(q=f'{type}:{query}', type=type, limit=self.search_lim)[type + "s"]["items"]
+            all_results = self.__spotify(self.sp.search, q=f'{type}:{query}', type=type, limit=self.search_lim)[type + "s"]["items"]
             if len(all_results) < 1:
                 failed.append(query)
                 continue
@@ -396,6 +430,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
         :param str search_syntax: Syntax used to search YouTube. Possible keywords: NAME, ARTIST, ALBUM
         :return: Path to downloaded track
         :rtype: str | None
+        :raises NoMatchError: If no YouTube result matches the track's title, artist and duration
         """
         if self.dir is None:
             warnings.warn("Directory not set")
@@ -403,34 +438,44 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
 
         print("Download directory:", self.dir)
 
+        stored = self.__from_store(track.id)
+        if stored is not None:
+            print('Linked from the content store')
+            return stored[0]
+
         query = search_syntax
         query = query.replace('NAME', track.name)
         query = query.replace('ARTIST', track.artist)
         query = query.replace('ALBUM', track.album)
 
-        with self.__suppress_std():
-            result = Search(query, 'WEB').results[0]
-            stream = result.streams.filter(only_audio=True).order_by('abr').last()
+        video, stream = self.__call('search', self.__resolve, query, track, hedge=True)
 
-        downloaded_path = stream.download(output_path=self.dir)
+        downloaded_path = self.downloader.download(stream.url, self.dir, stream.default_filename,
+                                                   size=known_filesize(stream), deadline=self.timeouts.download,
+                                                   key=f"{video.video_id}-{stream.itag}")
+        metrics.add_bytes('downloaded', os.path.getsize(downloaded_path))
 
-        downloaded_path = self.__single_to_mp3(downloaded_path, stream.abr)
+        output_paths = self.__convert(downloaded_path, encode_bitrate(stream, self.quality))
+        downloaded_path = output_paths[0]
 
-        size = os.stat(downloaded_path).st_size / (1024 * 1024)
+        size = sum(os.stat(path).st_size for path in output_paths) / (1024 * 1024)
 
         if with_artwork:
             # download image
-            img_data = requests.get(track.artwork).content
-            artwork_name = f"Artist-{track.artist}_Album-{track.album}"
-            artwork_name = re.sub(r'[/\:*?"<>|]', '_', artwork_name)  # noqa
-            artwork_path = f"{self.img_dir}\\{artwork_name}.jpg"
+            img_data = self.__call('artwork', self.__fetch_artwork, track.artwork)
+            artwork_path = self.__artwork_path(track)
             with open(artwork_path, "wb") as img:
                 img.write(img_data)
-            self.__add_metadata(file_path=downloaded_path, title=track.name, artist=track.artist, album=track.album,
-                                artwork_local_path=artwork_path)
+            for path in output_paths:
+                self.__add_metadata(file_path=path, title=track.name, artist=track.artist, album=track.album,
+                                    artwork_local_path=artwork_path, track_id=track.id)
             size += os.stat(artwork_path).st_size / (1024 * 1024)
         else:
-            self.__add_metadata(file_path=downloaded_path, title=track.name, artist=track.artist, album=track.album)
+            for path in output_paths:
+                self.__add_metadata(file_path=path, title=track.name, artist=track.artist, album=track.album,
+                                    track_id=track.id)
+
+        self.__add_to_store(track.id, output_paths)
 
         print('Downloaded')
         print(str(round(size, 2)), 'MBs used')
@@ -438,7 +483,8 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
         return downloaded_path
 
 
-    def download_tracks(self, tracks: TracksDict, search_syntax: str = 'ARTIST - NAME', with_artwork: bool = True) -> list[str] | None:
+    def download_tracks(self, tracks: TracksDict, search_syntax: str = 'ARTIST - NAME', with_artwork: bool = True,
+                        workers: int = 1, cancel: threading.Event = None) -> list[str] | None:
         """Downloads all tracks from a TracksDict obj. Searches YouTube for tracks and downloads them.
 
         Also See:
@@ -446,84 +492,161 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
 
         :param TracksDict tracks: TracksDict object containing all metadata
         :param str search_syntax: Syntax used to search YouTube. Possible keywords: NAME, ARTIST, ALBUM
+        :param int workers: Number of tracks to download at once
+        :param threading.Event cancel: When set, tracks that have not started yet are skipped
         :return: Paths to downloaded files
         :rtype: list[str] | None
         """
+        return self.__download_batch(tracks, search_syntax, with_artwork, workers, cancel)
+
+    def __download_batch(self, tracks: TracksDict, search_syntax: str, with_artwork: bool, workers: int,
+                         cancel: threading.Event | None, planned: dict = None,
+                         progress_mode: str = None) -> list[str] | None:
         if self.dir is None:
             warnings.warn("Directory not set")
             return
 
-        space_used = 0
-
-        print(f"Download directory: {self.dir}\n")
+        if self.schedule is not None:
+            tracks = schedule(tracks, self.schedule)
 
-        download_paths = []
+        progress_mode = progress_mode if progress_mode is not None else self.progress_mode
+        verbose = progress_mode == 'bar'
+        if verbose:
+            print(f"Download directory: {self.dir}\n")
 
-        progress = ProgressManager(tracks)
+        progress = ProgressManager(tracks, mode=progress_mode)
+        names = OutputNames()
 
-        for track in tracks.values():
+        @carry
+        def work(track_id: str, track: TDValue):
+            if cancel is not None and cancel.is_set():
+                return None, 0
             try:
-                query = search_syntax
-                query = query.replace('NAME', track.name)
-                query = query.replace('ARTIST', track.artist)
-                query = query.replace('ALBUM', track.album)
-
-                progress.searching()
-
-                with self.__suppress_std():
+                return self.__download_one(track_id, track, search_syntax, with_artwork, progress,
+                                           planned.get(track_id) if planned is not None else None, names)
+            except (exceptions.AgeRestrictedError, DownloadError, NoMatchError, StageTimeoutError) as e:
+                progress.error(e, track_id)
+                return None, 0
 
-                    result = Search(query, 'WEB').results[0]
+        results = self.__map(lambda item: work(*item), list(tracks.items()), workers)
 
-                stream = result.streams.filter(only_audio=True).order_by('abr').last()  # get stream
+        download_paths = [path for path, _ in results if path is not None]
+        space_used = sum(space for _, space in results)
 
-                progress.downloading()
-
-                downloaded_path = stream.download(output_path=self.dir)  # download and store path
+        errors = progress.completed()
+        num_errors = len(errors)
 
-                progress.converting()
+        if verbose:
+            print(len(download_paths), 'songs downloaded')
+            print(str(round(space_used, 2)), 'MBs used\n')
+            if num_errors > 0:
+                print(f'{num_errors} tracks failed to download (no matching YouTube video, Age Restriction on YouTube or connection errors).\n{errors}')
 
-                downloaded_path = self.__single_to_mp3(downloaded_path, stream.abr)
+        return download_paths
 
-                progress.downloaded()
+    def __map(self, func, items: list, workers: int) -> list:
+        """Calls `func` on each item, `workers` at a time, and returns the results in order. Runs on the executor set
+        with :py:meth:`set_executor`, or on a thread pool made for the call if there is none."""
+        if workers <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        if self.executor is None:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(func, items))
+
+        # The executor is shared with other batches, so this one only takes `workers` of its threads
+        results = [None] * len(items)
+        pending = iter(enumerate(items))
+        lock = threading.Lock()
+
+        def run():
+            while True:
+                with lock:
+                    index, item = next(pending, (None, None))
+                if index is None:
+                    return
+                results[index] = func(item)
+
+        for future in [self.executor.submit(run) for _ in range(min(workers, len(items)))]:
+            future.result()
+        return results
+
+    def __download_one(self, track_id: str, track: TDValue, search_syntax: str, with_artwork: bool,
+                       progress: ProgressManager, planned: PlannedTrack = None,
+                       names: OutputNames = None) -> tuple[str, float]:
+        """Downloads a single track of a batch. Returns the path of its first output and the MBs used.
+
+        `names` is shared by the tracks of the batch, see :py:class:`OutputNames`."""
+        stored = self.__from_store(track_id)
+        if stored is not None:
+            progress.added_metadata(track_id)
+            return stored[0], 0
+
+        names = names if names is not None else OutputNames()
+        space_used = 0
 
-                if with_artwork:
-                    # download image
-                    img_data = requests.get(track.artwork).content
+        query = search_syntax
+        query = query.replace('NAME', track.name)
+        query = query.replace('ARTIST', track.artist)
+        query = query.replace('ALBUM', track.album)
 
-                    artwork_name = f"Artist-{track.artist}_Album-{track.album}"
-                    artwork_name = re.sub(r'[/\:*?"<>|]', '_', artwork_name)  # noqa
-                    artwork_path = f"{self.img_dir}\\{artwork_name}.jpg"
-                    if not os.path.exists(artwork_path):
-                        with open(artwork_path, "wb") as img:
-                            img.write(img_data)
-                        space_used += os.stat(artwork_path).st_size / (1024 * 1024)
+        progress.searching(track_id)
 
-                    self.__add_metadata(file_path=downloaded_path, title=track.name, artist=track.artist,
-                                        album=track.album,
-                                        artwork_local_path=artwork_path)
+        video, stream = self.__call('search', self.__resolve, query, track, planned, hedge=True)  # get stream
 
-                else:
-                    self.__add_metadata(file_path=downloaded_path, title=track.name, artist=track.artist,
-                                        album=track.album)
+        stem, extension = os.path.splitext(stream.default_filename)
+        name = names.claim(track_id, stem)
 
-                progress.added_metadata()
+        with names.video(video.video_id) as first_outputs:
+            if first_outputs:  # another track of the batch already downloaded this video
+                output_paths = copy_outputs(first_outputs, name)
+            else:
+                progress.downloading(track_id)
+
+                # named after the track, so tracks of the same title never share a partial download
+                downloaded_path = self.downloader.download(stream.url, self.dir, f"{stem}.{track_id}{extension}",
+                                                           size=known_filesize(stream),
+                                                           deadline=self.timeouts.download,
+                                                           key=f"{video.video_id}-{stream.itag}")
+                metrics.add_bytes('downloaded', os.path.getsize(downloaded_path))
+
+                progress.converting(track_id)
+
+                output_paths = self.__convert(downloaded_path, encode_bitrate(stream, self.quality), name)
+
+            progress.downloaded(track_id)
+
+            if with_artwork:
+                # download image
+                artwork_path = self.__artwork_path(track)
+                metrics.cache('artwork', hit=os.path.exists(artwork_path))
+                if not os.path.exists(artwork_path):
+                    img_data = self.__call('artwork', self.__fetch_artwork, track.artwork)
+                    # other workers may be writing the same artwork, so write to a temporary file first
+                    tmp_path = f"{artwork_path}.{threading.get_ident()}.tmp"
+                    with open(tmp_path, "wb") as img:
+                        img.write(img_data)
+                    os.replace(tmp_path, artwork_path)
+                    space_used += len(img_data) / (1024 * 1024)
+
+                for path in output_paths:
+                    self.__add_metadata(file_path=path, title=track.name, artist=track.artist, album=track.album,
+                                        artwork_local_path=artwork_path, track_id=track_id)
 
-                download_paths.append(downloaded_path)
+            else:
+                for path in output_paths:
+                    self.__add_metadata(file_path=path, title=track.name, artist=track.artist, album=track.album,
+                                        track_id=track_id)
 
-                space_used += (os.stat(downloaded_path).st_size / (1024 * 1024))
+            if not first_outputs:
+                first_outputs.extend(output_paths)
 
-            except exceptions.AgeRestrictedError:
-                progress.error()
+        self.__add_to_store(track_id, output_paths)
 
-        errors = progress.completed()
-        num_errors = len(errors)
+        progress.added_metadata(track_id)
 
-        print(len(tracks) - num_errors, 'songs downloaded')
-        print(str(round(space_used, 2)), 'MBs used\n')
-        if num_errors > 0:
-            print(f'{num_errors} tracks failed to download due to an Age Restriction on YouTube.\n{errors}')
+        space_used += sum(os.stat(path).st_size for path in output_paths) / (1024 * 1024)
 
-        return download_paths
+        return output_paths[0], space_used
 
     def download_name(self, query: str, type: str, choice: bool = True, callback=None) -> str | None:
         """Download track/album/playlist/artist from name and type
@@ -537,7 +660,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
 
         """
 
-        result = self.sp.search(q=f'{type}:{query}', type=type, limit=self.search_lim)[type + "s"]["items"]
+        result = self.__spotify(self.sp.search, q=f'{type}:{query}', type=type, limit=self.search_lim)[type + "s"]["items"]
 
 
         if choice:
@@ -591,6 +714,9 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
     def download_namelist(self, file_path: str, type: str, delim='\n'):
         """Download track/album/playlist/artist from names in a file
 
+        With a schedule set (see :py:meth:`set_schedule`), the tracks of all names are fetched first and downloaded as
+        one batch in the order of the schedule, and the paths of the batch are returned.
+
         :param file_path: location of track/album/playlist/artist list
         :param type: options - track/album/playlist/artist
         :param delim: separator str for names in list
@@ -605,13 +731,14 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
         paths = []
         failed = []
         count = 0
+        merged = TracksDict()
 
 
         for query in list(items):
             if not query:
                 continue
 
-            all_results = self.sp.search(q=f'{type}:{query}', type=type, limit=self.search_lim)[type + "s"]["items"]
+            all_results = self.__spotify(self.sp.search, q=f'{type}:{query}', type=type, limit=self.search_lim)[type + "s"]["items"]
             if len(all_results) < 1:
                 failed.append(query)
                 items.remove(query)
@@ -632,13 +759,22 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
             else:
                 raise ValueError("Incorrect Type")
 
+            if self.schedule is not None:  # downloaded together after every name is fetched
+                if type == 'track':
+                    merged.add_track(data)
+                else:
+                    merged.update(data)
+                count += 1
+                continue
+
             simple_bar(max_count=len(items), count=count, msg=f'downloading {query}')
 
-            with self.__suppress_std():
+            # The outer bar is the only one drawn, the nested batch reports nothing
+            with capture_output():
                 if type == 'track':
                     path = self.download_track(data)
                 else:
-                    path = self.download_tracks(data)
+                    path = self.__download_batch(data, 'ARTIST - NAME', True, 1, None, progress_mode='quiet')
 
             count += 1
 
@@ -646,20 +782,508 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
 
             paths.append(path)
 
+        if self.schedule is not None and merged:
+            paths = self.download_tracks(merged)
+
         if len(failed) > 0:
             print("\nfailed: " + str(failed))
         return paths
 
+    def plan_tracks(self, tracks: TracksDict, search_syntax: str = 'ARTIST - NAME', with_artwork: bool = True,
+                    workers: int = 1, metrics_file: str = None) -> Plan | None:
+        """Plans downloading tracks without downloading anything: finds the tracks already in the download directory
+        or in the content store, resolves the others on YouTube, and estimates the bytes and time the download takes.
+
+        Also See:
+            * :py:class:`Plan` for the return type, and :py:meth:`execute_plan` to carry it out.
+
+        :param TracksDict tracks: TracksDict object containing all metadata
+        :param str search_syntax: Syntax used to search YouTube. Possible keywords: NAME, ARTIST, ALBUM
+        :param bool with_artwork: If artwork will be downloaded
+        :param int workers: Number of tracks to resolve at once
+        :param str metrics_file: Metrics exported (JSON) from an earlier download, to project time with.
+            Defaults to the metrics of this process
+        :rtype: Plan | None
+        """
+        if self.dir is None:
+            warnings.warn("Directory not set")
+            return
+
+        verbose = self.progress_mode == 'bar'
+        targets = self.targets or [OutputTarget()]
+
+        # Tracks are found by the Spotify ID stored in them, see retag_tracks
+        local = {}
+        for file in Path(self.dir).glob('**/*'):
+            if file.suffix.lower() in AUDIO_EXTENSIONS:
+                try:
+                    track_id = read_track_id(music_tag.load_file(str(file)))
+                except Exception:
+                    continue
+                if track_id is not None:
+                    local.setdefault(track_id, str(file))
+
+        search_times = []
+        done = [0]
+        lock = threading.Lock()
+
+        def plan_one(track_id: str, track: TDValue) -> PlannedTrack:
+            if track_id in local:
+                return PlannedTrack(track_id, track, 'exists', path=local[track_id])
+            stored = self.__stored(track_id)
+            if stored is not None:
+                return PlannedTrack(track_id, track, 'stored', path=stored[0])
+
+            query = search_syntax
+            query = query.replace('NAME', track.name)
+            query = query.replace('ARTIST', track.artist)
+            query = query.replace('ALBUM', track.album)
+
+            start = time.monotonic()
+            try:
+                video, stream = self.__call('search', self.__resolve, query, track, hedge=True)
+            except NoMatchError as e:
+                return PlannedTrack(track_id, track, 'no_match', error=str(e))
+            except Exception as e:
+                return PlannedTrack(track_id, track, 'error', error=f"{type(e).__name__}: {e}")
+            with lock:
+                search_times.append(time.monotonic() - start)
+
+            # Files downloaded before IDs were stored are found by name
+            name = os.path.splitext(stream.default_filename)[0]
+            target = targets[0]
+            path = os.path.join(target.dir if target.dir is not None else self.dir, f"{name}.{target.format}")
+            if os.path.exists(path):
+                return PlannedTrack(track_id, track, 'exists', path=path)
+
+            duration_s = track.duration_ms / 1000 or video.length
+            return PlannedTrack(track_id, track, 'download', video_url=video.watch_url, itag=int(stream.itag),
+                                download_bytes=estimate_download_bytes(stream, duration_s),
+                                output_bytes=estimate_output_bytes(targets, encode_bitrate(stream, self.quality),
+                                                                   duration_s, with_artwork))
+
+        def work(item) -> PlannedTrack:
+            planned = plan_one(*item)
+            with lock:
+                done[0] += 1
+                if verbose:
+                    simple_bar(count=done[0], max_count=len(tracks), msg='Planning')
+            return planned
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            planned_tracks = list(pool.map(work, tracks.items()))
+
+        artwork_paths = {self.__artwork_path(planned.track) for planned in planned_tracks if planned.status == 'download'}
+        artwork_fetches = sum(not os.path.exists(path) for path in artwork_paths)
+
+        if metrics_file is not None:
+            with open(metrics_file, 'r', encoding='utf-8') as file:
+                rates = measured_rates(json.load(file))
+        else:
+            rates = measured_rates(metrics.snapshot())
+        if search_times:
+            rates['search_s'] = sum(search_times) / len(search_times)
+
+        plan = Plan(planned_tracks, dir=self.dir, search_syntax=search_syntax, with_artwork=with_artwork,
+                    artwork_fetches=artwork_fetches if with_artwork else 0, rates=rates)
+
+        if verbose:
+            print('\n' + plan.describe(workers, self.downloader.governor.rate))
+        elif self.progress_mode == 'json':
+            print(json.dumps({'event': 'plan', **plan.totals(), 'projection': plan.projection(workers)}))
+
+        return plan
+
+    def execute_plan(self, plan: Plan | str, workers: int = 1, cancel: threading.Event = None) -> list[str] | None:
+        """Downloads the tracks of a plan from exactly the YouTube streams it chose.
+
+        Also See:
+            * :py:meth:`plan_tracks` to make a plan.
+
+        :param Plan | str plan: Plan, or path to a plan saved with :py:meth:`Plan.save`
+        :param int workers: Number of tracks to download at once
+        :param threading.Event cancel: When set, tracks that have not started yet are skipped
+        :return: Paths to downloaded files
+        :rtype: list[str] | None
+        """
+        if isinstance(plan, str):
+            plan = Plan.load(plan)
+        if self.dir is not None and os.path.abspath(self.dir) != os.path.abspath(plan.dir):
+            warnings.warn(f"Plan was made for {plan.dir}, downloading to {self.dir}")
+
+        # stored tracks are linked from the store by __download_one
+        to_download = plan.to_download()
+        tracks = TracksDict({planned.id: planned.track for planned in plan.tracks
+                             if planned.status in ('download', 'stored')})
+        return self.__download_batch(tracks, plan.search_syntax, plan.with_artwork, workers, cancel,
+                                     planned={planned.id: planned for planned in to_download})
+
+    def get_tracks(self, id: str, type: str) -> TracksDict:
+        """Gets the tracks of a track/playlist/album/user/artist as a TracksDict.
+
+        :param str id: ID/URI/URL of the spotify item
+        :param str type: options - track/playlist/album/user/artist
+        :rtype: TracksDict
+        """
+        if type == 'track':
+            output = TracksDict()
+            output.add_track(self.get_track(id))
+            return output
+        elif type == 'playlist':
+            return self.get_playlist_tracks(id)
+        elif type == 'album':
+            return self.get_album_tracks(id)
+        elif type == 'user':
+            return self.get_user_tracks(id)
+        elif type == 'artist':
+            return self.get_artist_tracks(id)
+        else:
+            raise ValueError("Incorrect Type")
+
+    def search_id(self, query: str, type: str) -> str | None:
+        """Returns the ID of the first Spotify search result for a name.
+
+        :param str query: name of track/album/playlist/artist
+        :param str type: options - track/album/playlist/artist
+        :rtype: str | None
+        """
+        result = self.__spotify(self.sp.search, q=f'{type}:{query}', type=type, limit=1)[type + "s"]["items"]
+        return result[0]["id"] if result else None
+
+    def enqueue_tracks(self, tracks: TracksDict, queue: WorkQueue, batch: str = 'default') -> int:
+        """Adds tracks to a work queue, for :py:meth:`work_queue` workers on any machine to download.
+
+        Also See:
+            * :py:class:`WorkQueue` for parameter queue.
+
+        :param TracksDict tracks: TracksDict object containing all metadata
+        :param WorkQueue queue: Queue to add the tracks to
+        :param str batch: Name of the batch, tracks already queued in the same batch are skipped
+        :return: Number of tracks added
+        :rtype: int
+        """
+        if self.schedule is not None:
+            tracks = schedule(tracks, self.schedule)
+        added = queue.push(tracks, batch=batch)
+        print(added, 'tracks queued,', len(tracks) - added, 'already in queue')
+        return added
+
+    def work_queue(self, queue: WorkQueue, worker: str = None, workers: int = 1, search_syntax: str = 'ARTIST - NAME',
+                   with_artwork: bool = True, wait: bool = False, poll_interval: float = 10) -> list[str] | None:
+        """Downloads tracks from a work queue until it is empty. Run this on as many machines as needed.
+
+        Leases are renewed while a track is being worked on, so only crashed workers lose their jobs. Failed jobs
+        are put back in the queue for another attempt.
+
+        Also See:
+            * :py:class:`WorkQueue` for parameter queue.
+
+        :param WorkQueue queue: Queue to take tracks from
+        :param str worker: Name of this worker, defaults to hostname-pid
+        :param int workers: Number of tracks to download at once
+        :param str search_syntax: Syntax used to search YouTube. Possible keywords: NAME, ARTIST, ALBUM
+        :param bool wait: Keep waiting for new jobs instead of stopping when the queue is empty
+        :param float poll_interval: Seconds between checks for new jobs while waiting
+        :return: Paths to downloaded files
+        :rtype: list[str] | None
+        """
+        if self.dir is None:
+            warnings.warn("Directory not set")
+            return
+
+        worker = worker if worker is not None else default_worker_name()
+        download_paths = []
+        names = OutputNames()
+
+        @carry
+        def loop(name: str):
+            while True:
+                job = queue.lease(name)
+                if job is None:
+                    # Jobs leased by others come back if their worker dies, so keep going until they are done
+                    if wait or queue.status()['total'].get('leased'):
+                        time.sleep(poll_interval)
+                        continue
+                    return
+
+                progress = ProgressManager(TracksDict({job.track_id: job.track}), mode='quiet')
+                try:
+                    with self.__lease_keeper(queue, job):
+                        path, _ = self.__download_one(job.track_id, job.track, search_syntax, with_artwork, progress,
+                                                      names=names)
+                except Exception as e:
+                    progress.error(e, job.track_id)
+                    queue.fail(job, f"{type(e).__name__}: {e}")
+                    self.__report_job(name, job, 'failed', f"{type(e).__name__}: {e}")
+                    continue
+
+                queue.ack(job, path)
+                download_paths.append(path)
+                self.__report_job(name, job, 'done', path)
+
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for future in [pool.submit(loop, f"{worker}/{n}") for n in range(workers)]:
+                    future.result()
+        else:
+            loop(worker)
+
+        return download_paths
+
+    @contextmanager
+    def __lease_keeper(self, queue: WorkQueue, job: Job):
+        """Renews the lease of `job` in the background until the block ends."""
+        done = threading.Event()
+
+        def renew():
+            while not done.wait(queue.lease_seconds / 3):
+                if not queue.renew(job):
+                    return
+
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+    def __report_job(self, worker: str, job: Job, status: str, detail: str) -> None:
+        if self.progress_mode == 'bar':
+            print(f"[{worker}] {status}: {job.track.name} ({detail})")
+        elif self.progress_mode == 'json':
+            print(json.dumps({'event': 'job', 'worker': worker, 'id': job.track_id, 'name': job.track.name,
+                              'batch': job.batch, 'attempt': job.attempts, 'status': status, 'detail': detail}))
+
+    def retag_tracks(self, tracks: TracksDict | str, workers: int = 4, with_artwork: bool = True,
+                     refresh_artwork: bool = False, check_subfolders: bool = True) -> list[str] | None:
+        """Updates the tags of tracks already in the download directory, without downloading them again.
+
+        Files are matched to tracks by the Spotify ID stored in them when they were downloaded, or by title and artist
+        if they have none. Only files whose tags differ are rewritten. Artwork comes from the artwork cache, and is
+        fetched once per album if it is not cached.
+
+        Also See:
+            * :py:class:`TracksDict` for parameter tracks.
+
+        :param TracksDict | str tracks: TracksDict object, or path to a manifest saved with :py:meth:`TracksDict.save`
+        :param int workers: Number of files to process at once
+        :param bool with_artwork: If artwork should be embedded
+        :param bool refresh_artwork: Fetch artwork even if it is cached, e.g. to get a higher resolution
+        :param bool check_subfolders: If subfolders should be searched for files
+        :return: Paths to retagged files
+        :rtype: list[str] | None
+        """
+        if self.dir is None:
+            warnings.warn("Directory not set")
+            return
+
+        if isinstance(tracks, str):
+            tracks = TracksDict.load(tracks)
+
+        def key(text: str) -> str:
+            return ' '.join(text.lower().split())
+
+        by_name = {(key(track.name), key(track.artist)): track_id for track_id, track in tracks.items()}
+        pattern = '**/*' if check_subfolders else '*'
+        file_list = [str(file) for file in Path(self.dir).glob(pattern) if file.suffix.lower() in AUDIO_EXTENSIONS]
+
+        artwork_cache = {}  # artwork path -> [lock, bytes]
+        artwork_lock = threading.Lock()
+
+        def artwork(track: TDValue) -> bytes:
+            artwork_path = self.__artwork_path(track)
+            with artwork_lock:
+                entry = artwork_cache.setdefault(artwork_path, [threading.Lock(), None])
+            with entry[0]:  # one fetch per album, files of other albums carry on
+                if entry[1] is None:
+                    cached = os.path.exists(artwork_path) and not refresh_artwork
+                    metrics.cache('artwork', hit=cached)
+                    if cached:
+                        with open(artwork_path, 'rb') as img:
+                            entry[1] = img.read()
+                    else:
+                        entry[1] = self.__call('artwork', self.__fetch_artwork, track.artwork)
+                        tmp_path = f"{artwork_path}.{threading.get_ident()}.tmp"
+                        with open(tmp_path, "wb") as img:
+                            img.write(entry[1])
+                        os.replace(tmp_path, artwork_path)
+            return entry[1]
+
+        def retag(file_path: str) -> str:
+            f = music_tag.load_file(file_path)
+            track_id = read_track_id(f)
+            if track_id is None:  # downloaded before IDs were stored
+                track_id = by_name.get((key(str(f['title'])), key(str(f['artist']))))
+            if track_id not in tracks:
+                return 'unmatched'
+
+            track = tracks[track_id]
+            if not apply_tags(f, title=track.name, artist=track.artist, album=track.album, track_id=track_id,
+                              artwork=artwork(track) if with_artwork else None):
+                return 'unchanged'
+            f.save()
+            return 'updated'
+
+        counts = {'updated': 0, 'unchanged': 0, 'unmatched': 0, 'failed': 0}
+        retagged = []
+        lock = threading.Lock()
+        verbose = self.progress_mode == 'bar'
+        step = max(len(file_list) // 200, 1)  # redraw the bar about 200 times
+
+        def work(file_path: str):
+            try:
+                result = retag(file_path)
+            except Exception as e:
+                metrics.error(e)
+                result = 'failed'
+                if verbose:
+                    print(f"\nERROR: Could not retag {os.path.relpath(file_path, self.dir)} ({type(e).__name__}: {e})")
+
+            with lock:
+                counts[result] += 1
+                if result == 'updated':
+                    retagged.append(file_path)
+                done = sum(counts.values())
+                if verbose and (done % step == 0 or done == len(file_list)):
+                    simple_bar(count=done, max_count=len(file_list), msg='Retagging')
+
+        if verbose:
+            print(len(file_list), 'files found')
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(work, file_list))
+
+        if verbose:
+            print('\n' + ', '.join(f"{count} {result}" for result, count in counts.items()))
+        elif self.progress_mode == 'json':
+            print(json.dumps({'event': 'retag', 'files': len(file_list), **counts}))
+
+        return retagged
+
     def set_dir(self, dir: str) -> None:
         """Sets download directory.
 
         :param str dir: Path to download directory
         """
         self.dir = dir
-        self.img_dir = dir + "\\Artwork"
+        self.img_dir = os.path.join(dir, "Artwork")
         if not os.path.exists(self.img_dir):
             os.mkdir(self.img_dir)
 
+    def set_quality(self, profile: QualityProfile = None) -> None:
+        """Sets the quality profile used to pick streams and encode MP3s.
+
+        Also See:
+            * :py:class:`QualityProfile` for parameter profile.
+
+        :param QualityProfile profile: Quality profile, None for the highest available bitrate
+        """
+        self.quality = profile
+
+    def set_targets(self, targets: list[OutputTarget] = None) -> None:
+        """Sets the files created for every downloaded track, e.g. a 320k MP3 archive and a 96k Opus copy for phones.
+        Each track is downloaded and decoded once, then encoded to all targets in parallel and tagged.
+
+        Example::
+
+            s.set_targets([OutputTarget('mp3', 320), OutputTarget('opus', 96, 'C:/Music/Phone')])
+
+        Also See:
+            * :py:class:`OutputTarget` for parameter targets.
+
+        :param list[OutputTarget] targets: Outputs, the first one is the path returned by downloads.
+            None for a single MP3 in the download directory
+        """
+        if targets:
+            check_targets(targets)
+            for target in targets:
+                if target.dir is not None:
+                    os.makedirs(target.dir, exist_ok=True)
+        self.targets = list(targets) if targets else None
+
+    def set_schedule(self, policy=None) -> None:
+        """Sets the order tracks are downloaded in, so a run that is stopped early has downloaded the most useful
+        tracks. Also applies to tracks added to a work queue.
+
+        Example::
+
+            s.set_schedule('shortest')
+            s.set_schedule(by_priority({'PLAYLIST_ID': 1}, then=newest_first))
+
+        Also See:
+            * :py:mod:`smp3.scheduler` for the policies: insertion, newest, shortest, round-robin, and by_priority.
+
+        :param policy: Name of a policy, or a function taking a TracksDict and returning its track IDs in download
+            order. None for the order tracks were found in
+        """
+        if isinstance(policy, str):
+            policy = get_policy(policy)
+        self.schedule = policy
+
+    def set_store(self, store: ContentStore = None) -> None:
+        """Sets a content store shared by all download directories. Tracks already in the store are linked into the
+        download directory, without searching, downloading or converting them again. New downloads are added to it.
+
+        Example::
+
+            s.set_store(ContentStore('C:/Music/.store'))
+            for playlist_id in playlists:
+                s.set_dir(f'C:/Music/{playlist_id}')
+                s.download_tracks(s.get_playlist_tracks(playlist_id))
+
+        Also See:
+            * :py:class:`ContentStore` for parameter store.
+
+        :param ContentStore store: Content store, None to not use one
+        """
+        self.store = store
+
+    def set_timeouts(self, timeouts: Timeouts = None) -> None:
+        """Sets how long each stage may take. Tracks whose search or download takes longer are skipped with an error,
+        so one stalled track does not hold up a batch.
+
+        Also See:
+            * :py:class:`Timeouts` for parameter timeouts.
+
+        :param Timeouts timeouts: Timeouts per stage, None for no limits
+        """
+        self.timeouts = timeouts if timeouts is not None else Timeouts()
+
+    def set_hedging(self, hedger: Hedger = None) -> None:
+        """Sends a duplicate of YouTube searches and Spotify requests that are slower than usual, and uses whichever
+        finishes first.
+
+        Also See:
+            * :py:class:`Hedger` for parameter hedger.
+
+        :param Hedger hedger: Hedger deciding when to send duplicates, None to turn hedging off
+        """
+        self.hedger = hedger
+
+    def set_executor(self, executor: Executor = None) -> None:
+        """Downloads the tracks of batches on a long-lived executor instead of a new thread pool for each batch. Each
+        batch still downloads at most `workers` tracks at once.
+
+        Example::
+
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                s.set_executor(pool)
+                for playlist_id in playlists:
+                    s.download_tracks(s.get_playlist_tracks(playlist_id), workers=4)
+
+        :param Executor executor: Executor to run downloads on, None for a thread pool per batch
+        """
+        self.executor = executor
+
+    def set_progress(self, mode: str = 'bar') -> None:
+        """Sets how download progress is shown.
+
+        :param str mode: 'bar' for a progress bar, 'quiet' for no output, 'json' for one JSON object per line
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        self.progress_mode = mode
+
     def get_dir(self) -> str:
         """Returns download directory.
 
@@ -669,7 +1293,7 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
         return self.dir
 
     def webm_to_mp3(self, check_subfolders: bool = True) -> list[str] | None:
-        """Converts .webm files to .mp3[s].
+        """Converts .webm files to .mp3[s]. Files are read within the bandwidth limit of the downloader's governor.
 
         :param bool check_subfolders: If subfolders should be searched for .webm[s]
         :return: Paths to mp3 files
@@ -695,10 +1319,10 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
         count = 0
         for webm_path in file_list:
             simple_bar(max_count=file_list_len, count=count,
-                                msg='Converting ' + webm_path.replace(self.dir + r''"\\", ''))
+                                msg='Converting ' + os.path.relpath(webm_path, self.dir))
 
             mp3_path = webm_path.replace('.webm', '.mp3')
-            AudioSegment.from_file(webm_path).export(mp3_path, format='mp3')
+            read_audio(webm_path, self.downloader.governor).export(mp3_path, format='mp3')
             os.remove(webm_path)
 
             simple_bar(max_count=file_list_len, count=count,
@@ -711,43 +1335,146 @@ See https://developer.spotify.com/ for Spotify API, and information on how to ob
 
         return mp3_paths
 
-    def __single_to_mp3(self, path: str, abr):
-        new_path = path.split('.')
-        new_path.pop()
-        new_path = '.'.join(new_path) + ".mp3"
-
-        AudioSegment.from_file(path).export(new_path, format='mp3',
-                                            parameters=['-acodec', 'libmp3lame', '-abr', 'true', '-b:a', abr[:-3:]])
-        os.remove(path)
+    def watch(self, extensions: tuple = ('.webm',), workers: int = 2, settle: float = 2.0, checkpoint: str = None,
+              recursive: bool = True, stop: threading.Event = None, use_inotify: bool = True) -> None:
+        """Watches the directory and converts new files as they appear, e.g. files dropped in by other tools.
+        Unlike :py:meth:`webm_to_mp3`, the directory is listed once, and files are converted in the background,
+        several at once, as soon as they are completely written. Files are converted to the output targets
+        (see :py:meth:`set_targets`) next to the source, which is then removed. Files are read within the bandwidth
+        limit of the downloader's governor.
 
-        return new_path
+        Do not watch a directory tracks are being downloaded to, the watcher would convert downloads too.
 
+        Also See:
+            * :py:class:`FolderWatcher` for how files are detected.
+
+        :param tuple extensions: Extensions of files to convert
+        :param int workers: Number of files to convert at once
+        :param float settle: Seconds a file must stay unchanged before it is converted
+        :param str checkpoint: JSON lines file recording converted files, so they are not converted again after a
+            restart. Defaults to .smp3-watch.jsonl in the directory
+        :param bool recursive: If subfolders are watched too
+        :param threading.Event stop: Event to stop watching, None to watch until Ctrl+C
+        :param bool use_inotify: If inotify is used when available, else the directory is polled
+        """
+        if self.dir is None:
+            warnings.warn("Directory not set")
+            return
 
-    def __add_metadata(self, file_path: str, title: str, artist: str, album: str, artwork_local_path: str = None):
+        targets = self.targets or [OutputTarget()]
+        bitrate = f"{self.quality.bitrate}k" if self.quality is not None and self.quality.bitrate else '192k'
+
+        def convert(path: str) -> list[str]:
+            output_paths = fan_out(path, targets, os.path.dirname(path), bitrate,
+                                   governor=self.downloader.governor)
+            if path not in output_paths:
+                os.remove(path)
+            metrics.add_bytes('encoded', sum(os.path.getsize(output_path) for output_path in output_paths))
+            return output_paths
+
+        def report(path: str, outputs: list[str] | None, error: str | None) -> None:
+            name = os.path.relpath(path, self.dir)
+            if self.progress_mode == 'json':
+                print(json.dumps({'event': 'converted' if error is None else 'error', 'path': path,
+                                  'outputs': outputs, 'error': error}), flush=True)
+            elif self.progress_mode == 'bar':
+                print(f"Converted {name}" if error is None else f"ERROR: Could not convert {name}: {error}")
+
+        watcher = FolderWatcher(self.dir, convert, extensions=extensions, recursive=recursive, settle=settle,
+                                workers=workers, use_inotify=use_inotify, callback=report,
+                                checkpoint=checkpoint if checkpoint is not None
+                                else os.path.join(self.dir, '.smp3-watch.jsonl'))
+
+        if self.progress_mode == 'bar':
+            print(f"Watching {self.dir} for {', '.join(extensions)} files ({watcher.backend}), Ctrl+C to stop")
+        try:
+            watcher.run(stop)
+        except KeyboardInterrupt:
+            pass
+        if self.progress_mode == 'bar':
+            print(f"{watcher.converted} files converted, {watcher.failed} failed")
+
+    def __call(self, stage: str, func, *args, hedge: bool = False, **kwargs):
+        """Calls func with the timeout of `stage`, hedged if `hedge` and hedging is on."""
+        return deadline.call(stage, func, *args, timeout=getattr(self.timeouts, stage),
+                             hedger=self.hedger if hedge else None, **kwargs)
+
+    def __spotify(self, method, *args, **kwargs):
+        return self.__call('spotify', method, *args, hedge=True, **kwargs)
+
+    def __resolve(self, query: str, track, planned: PlannedTrack = None):
+        # Getting the streams of a video is another request, so it is part of the search
+        with capture_output():
+            if planned is not None:  # exactly the video and stream of the plan
+                video = self.resolver.opener(planned.video_url)
+                stream = video.streams.get_by_itag(planned.itag)
+                if stream is None:
+                    raise NoMatchError(f"Planned stream of '{track.name}' is no longer available")
+            else:
+                video = self.resolver.resolve(query, track)
+                stream = select_stream(video.streams, self.quality)
+        return video, stream
+
+    def __stored(self, track_id: str) -> list[str] | None:
+        """Returns the stored files of a track for every output target, or None if not every output is stored."""
+        if self.store is None:
+            return None
+        stored = [self.store.get(track_id, profile_key(target, self.quality))
+                  for target in self.targets or [OutputTarget()]]
+        return stored if None not in stored else None
+
+    def __from_store(self, track_id: str) -> list[str] | None:
+        """Links the stored files of a track into the output directories. Returns their paths, or None if not every
+        output is stored."""
+        if self.store is None:
+            return None
+        hit = self.__stored(track_id) is not None
+        metrics.cache('store', hit=hit)
+        if not hit:
+            return None
+        targets = self.targets or [OutputTarget()]
+        return [self.store.place(track_id, profile_key(target, self.quality),
+                                 target.dir if target.dir is not None else self.dir)[0] for target in targets]
+
+    def __add_to_store(self, track_id: str, output_paths: list[str]) -> None:
+        if self.store is None:
+            return
+        for target, path in zip(self.targets or [OutputTarget()], output_paths):
+            self.store.add(track_id, profile_key(target, self.quality), path)
+
+    @profiled('artwork')
+    def __fetch_artwork(self, url: str) -> bytes:
+        governor = self.downloader.governor
+        with governor.connection():
+            img_data = self.downloader.session.get(url, timeout=self.downloader.timeout).content
+            governor.consume(len(img_data))
+        return img_data
+
+    @profiled('convert')
+    def __convert(self, path: str, bitrate: str, name: str = None) -> list[str]:
+        """Converts a downloaded file to every output target and removes it. Returns the paths of the outputs.
+        They are named `name`, or after the downloaded file."""
+        output_paths = fan_out(path, self.targets or [OutputTarget()], self.dir, bitrate, name)
+        if path not in output_paths:
+            os.remove(path)
+
+        metrics.add_bytes('encoded', sum(os.path.getsize(output_path) for output_path in output_paths))
+        return output_paths
+
+
+    @profiled('metadata')
+    def __add_metadata(self, file_path: str, title: str, artist: str, album: str, artwork_local_path: str = None,
+                       track_id: str = None):
         f = music_tag.load_file(file_path)
-        f['title'] = title
-        f['artist'] = artist
-        f['album'] = album
+        artwork = None
         if artwork_local_path is not None:
             with open(artwork_local_path, 'rb') as img:
-                f['artwork'] = img.read()
-                f['artwork'].first.thumbnail([512, 512])
+                artwork = img.read()
+        apply_tags(f, title=title, artist=artist, album=album, track_id=track_id, artwork=artwork)
         f.save()
 
-
-    @contextmanager
-    def __suppress_std(self):
-        """Supresses StdOut and StdErr.
-        Because some modules output too much to the terminal
-        """
-        with open(os.devnull, "w") as null:
-            org_stdout = sys.stdout
-            org_stderr = sys.stderr
-
-            sys.stdout = null
-            sys.stderr = null
-            try:
-                yield
-            finally:
-                sys.stdout = org_stdout
-                sys.stderr = org_stderr
+    def __artwork_path(self, track) -> str:
+        """Path of the cached artwork of a track's album."""
+        artwork_name = f"Artist-{track.artist}_Album-{track.album}"
+        artwork_name = re.sub(r'[/\:*?"<>|]', '_', artwork_name)  # noqa
+        return os.path.join(self.img_dir, f"{artwork_name}.jpg")
@@ -0,0 +1,163 @@
+import errno
+import os
+import shutil
+import threading
+
+import music_tag
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .quality import QualityProfile
+from .tags import read_track_id
+from .targets import FORMATS, OutputTarget
+
+LINK_MODES = ('hardlink', 'reflink', 'copy')
+_FICLONE = 0x40049409  # Linux ioctl to share the blocks of a file, on Btrfs, XFS and others
+
+
+def reflink(source: str, destination: str) -> None:
+    """Creates `destination` as a copy-on-write clone of `source`.
+
+    :raises OSError: If the platform or file system does not support reflinks
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform")
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(destination)
+            raise
+
+
+def link_file(source: str, destination: str, mode: str = 'hardlink') -> str:
+    """Creates or replaces `destination` with the content of `source`, as cheaply as the file system allows.
+    Hardlinks fall back to reflinks, and reflinks to copies.
+
+    :param str source: Existing file
+    :param str destination: File to create
+    :param str mode: First method to try, one of hardlink, reflink, copy
+    :return: Method used
+    :rtype: str
+    """
+    if mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode '{mode}', choose from {LINK_MODES}")
+
+    # Link next to the destination first, so an existing destination is replaced in one step
+    tmp_path = f"{destination}.{threading.get_ident()}.tmp"
+    for method in LINK_MODES[LINK_MODES.index(mode):]:
+        try:
+            if method == 'hardlink':
+                os.link(source, tmp_path)
+            elif method == 'reflink':
+                reflink(source, tmp_path)
+            else:
+                shutil.copy2(source, tmp_path)
+        except OSError:
+            if method == 'copy':
+                raise
+            continue
+        os.replace(tmp_path, destination)
+        return method
+
+
+def profile_key(target: OutputTarget, quality: QualityProfile = None) -> str:
+    """Returns the name of the output profile of a target, e.g. 'mp3-320k', 'opus-best' or 'flac'.
+    Files are only shared between downloads with the same profile."""
+    if not FORMATS[target.format][3]:
+        return target.format
+    bitrate = target.bitrate if target.bitrate is not None else quality.bitrate if quality is not None else None
+    return f"{target.format}-{bitrate}k" if bitrate is not None else f"{target.format}-best"
+
+
+class ContentStore:
+    """Files downloaded before, by Spotify track ID and output profile.
+
+    Downloading a track that is already in the store links the stored file into the download directory instead of
+    searching, downloading and converting it again, so a song in many playlist folders is stored once. Files are kept
+    as ``dir/PROFILE/TRACK_ID/NAME``.
+
+    Linked files share their content, so retagging one retags all of them.
+    """
+
+    def __init__(self, dir: str, link: str = 'hardlink'):
+        """
+        :param str dir: Directory of the store. Must be on the same drive as the download directories for hardlinks
+        :param str link: How files are put into download directories, one of hardlink, reflink, copy.
+            Falls back to the next one if it is not possible
+        """
+        if link not in LINK_MODES:
+            raise ValueError(f"Unknown link mode '{link}', choose from {LINK_MODES}")
+        self.dir = dir
+        self.link = link
+        os.makedirs(dir, exist_ok=True)
+
+    def get(self, track_id: str, profile: str) -> str | None:
+        """Returns the stored file of a track, or None if it is not stored.
+
+        :param str track_id: Spotify ID
+        :param str profile: Output profile, see :py:func:`profile_key`
+        :rtype: str | None
+        """
+        track_dir = os.path.join(self.dir, profile, track_id)
+        try:
+            names = [name for name in os.listdir(track_dir) if not name.endswith('.tmp')]
+        except FileNotFoundError:
+            return None
+        return os.path.join(track_dir, names[0]) if names else None
+
+    def add(self, track_id: str, profile: str, path: str) -> str:
+        """Stores a file, unless the track is stored already.
+
+        :param str track_id: Spotify ID
+        :param str profile: Output profile, see :py:func:`profile_key`
+        :param str path: Downloaded file
+        :return: Path of the stored file
+        :rtype: str
+        """
+        stored = self.get(track_id, profile)
+        if stored is not None:
+            return stored
+        track_dir = os.path.join(self.dir, profile, track_id)
+        os.makedirs(track_dir, exist_ok=True)
+        stored = os.path.join(track_dir, os.path.basename(path))
+        link_file(path, stored, self.link)
+        return stored
+
+    def place(self, track_id: str, profile: str, dir: str) -> tuple[str, str] | None:
+        """Puts the stored file of a track into a directory.
+
+        A file of the same name that holds another track is left alone, and the track is put next to it as
+        ``NAME (TRACK_ID)``, like :py:class:`OutputNames` does for downloads.
+
+        :param str track_id: Spotify ID
+        :param str profile: Output profile, see :py:func:`profile_key`
+        :param str dir: Directory to put the file in
+        :return: Path of the file and the method used (hardlink, reflink, copy, or exists if the track is there
+            already), or None if the track is not stored
+        :rtype: tuple[str, str] | None
+        """
+        stored = self.get(track_id, profile)
+        if stored is None:
+            return None
+        name, ext = os.path.splitext(os.path.basename(stored))
+        for path in (os.path.join(dir, name + ext), os.path.join(dir, f"{name} ({track_id}){ext}")):
+            if not os.path.exists(path):
+                break
+            if _holds(path, stored, track_id):
+                return path, 'exists'
+        return path, link_file(stored, path, self.link)
+
+
+def _holds(path: str, stored: str, track_id: str) -> bool:
+    """Returns if the file at `path` is `stored`, a link to it, or another file of the same track."""
+    if os.path.samefile(path, stored):
+        return True
+    try:
+        return read_track_id(music_tag.load_file(path)) == track_id
+    except Exception:  # not an audio file music_tag can read
+        return False
@@ -0,0 +1,67 @@
+import re
+
+# Extensions of files Spotify2MP3 can create, see targets.FORMATS
+AUDIO_EXTENSIONS = ('.mp3', '.opus', '.ogg', '.m4a', '.flac')
+
+_TRACK_URI = re.compile(r'spotify:track:([A-Za-z0-9]+)')
+
+
+def track_uri(track_id: str) -> str:
+    """Returns the Spotify URI stored in the comment tag of downloaded files, e.g. 'spotify:track:ID'."""
+    return f"spotify:track:{track_id}"
+
+
+def comment_with_uri(comment: str, track_id: str) -> str:
+    """Returns a comment with the Spotify URI of a track in it. A URI already in the comment is replaced, otherwise
+    the URI is added on a line of its own after the rest of the comment."""
+    uri = track_uri(track_id)
+    if _TRACK_URI.search(comment):
+        return _TRACK_URI.sub(uri, comment, count=1)
+    return f"{comment}\n{uri}" if comment.strip() else uri
+
+
+def read_track_id(f) -> str | None:
+    """Returns the Spotify ID stored in a music_tag file, or None if it has none.
+
+    :param f: File loaded with music_tag.load_file
+    :rtype: str | None
+    """
+    match = _TRACK_URI.search(str(f['comment']))
+    return match.group(1) if match else None
+
+
+def apply_tags(f, title: str, artist: str, album: str, track_id: str = None, artwork: bytes = None) -> bool:
+    """Sets the tags of a music_tag file that differ from the given ones. Does not save the file.
+
+    :param f: File loaded with music_tag.load_file
+    :param str title: Title
+    :param str artist: Artist
+    :param str album: Album
+    :param str track_id: Spotify ID, stored in the comment tag next to any comment already there
+    :param bytes artwork: Cover art, None to leave the artwork as it is
+    :return: If any tag was changed
+    :rtype: bool
+    """
+    wanted = {'title': title, 'artist': artist, 'album': album}
+    if track_id is not None:
+        wanted['comment'] = comment_with_uri(str(f['comment']), track_id)
+
+    changed = False
+    for key, value in wanted.items():
+        if str(f[key]) != value:
+            f[key] = value
+            changed = True
+
+    if artwork is not None and _artwork(f) != artwork:
+        f['artwork'] = artwork
+        changed = True
+
+    return changed
+
+
+def _artwork(f) -> bytes | None:
+    try:
+        current = f['artwork'].first
+    except KeyError:  # music_tag fails reading Ogg/Opus files without pictures
+        return None
+    return current.data if current is not None else None
@@ -0,0 +1,147 @@
+import io
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import NamedTuple
+
+from pydub import AudioSegment
+
+# format -> (file extension, ffmpeg muxer, ffmpeg codec arguments, lossy)
+FORMATS = {
+    'mp3': ('mp3', 'mp3', ['-acodec', 'libmp3lame', '-abr', 'true'], True),
+    'opus': ('opus', 'opus', ['-acodec', 'libopus'], True),
+    'ogg': ('ogg', 'ogg', ['-acodec', 'libvorbis'], True),
+    'm4a': ('m4a', 'ipod', ['-acodec', 'aac'], True),
+    'flac': ('flac', 'flac', ['-acodec', 'flac'], False),
+}
+
+
+class OutputTarget(NamedTuple):
+    """A file to create for every downloaded track.
+
+    * format: one of mp3, opus, ogg, m4a, flac
+    * bitrate: kbps to encode at. None to use the bitrate picked for the download (see :py:class:`QualityProfile`),
+      ignored for flac
+    * dir: directory to save to. None for the download directory
+    """
+    format: str = 'mp3'
+    bitrate: int | None = None
+    dir: str | None = None
+
+
+def check_targets(targets: list[OutputTarget]) -> None:
+    """Raises ValueError if a target has an unknown format, or two targets would write the same files."""
+    seen = set()
+    for target in targets:
+        if target.format not in FORMATS:
+            raise ValueError(f"Unknown format '{target.format}', choose from {tuple(FORMATS)}")
+        key = (os.path.abspath(target.dir) if target.dir is not None else None, FORMATS[target.format][0])
+        if key in seen:
+            raise ValueError(f"More than one {target.format} target in the same directory")
+        seen.add(key)
+
+
+def read_audio(path: str, governor=None, chunk_size: int = 1024 * 1024) -> AudioSegment:
+    """Decodes an audio file. With a governor, the file is read through its byte bucket first, so local conversions
+    stay within the bandwidth limit. No connection slot is held, so they never hold up downloads.
+
+    :param str path: Audio file
+    :param BandwidthGovernor governor: Governor to take the bytes read from, None to read at full speed
+    :param int chunk_size: Bytes read at once
+    :rtype: AudioSegment
+    """
+    if governor is None:
+        return AudioSegment.from_file(path)
+    data = io.BytesIO()
+    with open(path, 'rb') as file:
+        while chunk := file.read(chunk_size):
+            governor.consume(len(chunk))
+            data.write(chunk)
+    data.seek(0)
+    extension = os.path.splitext(path)[1][1:].lower()
+    # ffmpeg detects the container of piped input, pydub only needs the format to read WAV itself
+    return AudioSegment.from_file(data, format='wav' if extension == 'wav' else None)
+
+
+def fan_out(source_path: str, targets: list[OutputTarget], default_dir: str, default_bitrate: str,
+            name: str = None, governor=None) -> list[str]:
+    """Decodes `source_path` once and encodes it to every target in parallel.
+
+    :param str source_path: Downloaded audio file
+    :param list[OutputTarget] targets: Files to create
+    :param str default_dir: Directory for targets without one
+    :param str default_bitrate: ffmpeg bitrate for targets without one, e.g. '128k'
+    :param str name: File name of the outputs without extension, defaults to the name of `source_path`
+    :param BandwidthGovernor governor: Governor to read `source_path` through, see :py:func:`read_audio`
+    :return: Paths of the outputs, in the order of `targets`
+    :rtype: list[str]
+    """
+    audio = read_audio(source_path, governor)
+    if name is None:
+        name = os.path.splitext(os.path.basename(source_path))[0]
+
+    def encode(target: OutputTarget) -> str:
+        extension, muxer, codec, lossy = FORMATS[target.format]
+        path = os.path.join(target.dir if target.dir is not None else default_dir, f"{name}.{extension}")
+        parameters = list(codec)
+        if lossy:
+            parameters += ['-b:a', f"{target.bitrate}k" if target.bitrate is not None else default_bitrate]
+        if os.path.exists(path):  # may be linked to a content store or other folders, replace it instead
+            os.remove(path)
+        audio.export(path, format=muxer, parameters=parameters)
+        return path
+
+    if len(targets) == 1:
+        return [encode(targets[0])]
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        return list(pool.map(encode, targets))
+
+
+def copy_outputs(paths: list[str], name: str) -> list[str]:
+    """Copies outputs next to themselves under another file name. Returns the paths of the copies."""
+    copies = []
+    for path in paths:
+        copy = os.path.join(os.path.dirname(path), name + os.path.splitext(path)[1])
+        if os.path.exists(copy):  # may be linked to a content store or other folders, replace it instead
+            os.remove(copy)
+        shutil.copyfile(path, copy)
+        copies.append(copy)
+    return copies
+
+
+class OutputNames:
+    """File names of the tracks of a batch, so tracks downloaded at the same time never write the same files.
+
+    A track is named after its YouTube video. If another track of the batch already has that name, e.g. a
+    different recording with the same title, the track ID is added to it. Tracks resolving to the same video take
+    turns through :py:meth:`video`, so it is downloaded once and its outputs copied for the other tracks.
+    """
+
+    def __init__(self):
+        self.__names = {}  # file name, case-folded -> track ID
+        self.__videos = {}  # video ID -> (lock, output paths of the first track)
+        self.__lock = threading.Lock()
+
+    def claim(self, track_id: str, name: str) -> str:
+        """Returns the file name of a track's outputs, without extension.
+
+        :param str track_id: Spotify track ID
+        :param str name: Name the track would get on its own
+        :rtype: str
+        """
+        with self.__lock:
+            if self.__names.setdefault(name.casefold(), track_id) != track_id:
+                name = f"{name} ({track_id})"
+                self.__names[name.casefold()] = track_id
+            return name
+
+    @contextmanager
+    def video(self, video_id: str):
+        """Holds the lock of a video until the block ends. Yields the list of output paths of the first track that
+        downloaded it, empty if none has yet. The track that downloads it is expected to fill the list."""
+        with self.__lock:
+            lock, outputs = self.__videos.setdefault(video_id, (threading.Lock(), []))
+        with lock:
+            yield outputs
@@ -1,10 +1,11 @@
+import json
 from collections import namedtuple
 from typing import Union, NamedTuple
 
 
-class Track(namedtuple('TrackBase', ['id', 'name', 'artist', 'album', 'artwork'])):
-    def __new__(cls, id: str, name: str, artist: str, album: str, artwork: str):
-        return super().__new__(cls, id, name, artist, album, artwork)
+class Track(namedtuple('TrackBase', ['id', 'name', 'artist', 'album', 'artwork', 'duration_ms'])):
+    def __new__(cls, id: str, name: str, artist: str, album: str, artwork: str, duration_ms: int = 0):
+        return super().__new__(cls, id, name, artist, album, artwork, duration_ms)
 
 
 class TDValue(NamedTuple):
@@ -12,32 +13,66 @@ class TDValue(NamedTuple):
     artist: str
     album: str
     artwork: str
+    duration_ms: int = 0
+    added_at: str = ''  # when the track was added to the playlist, ISO 8601. Empty if unknown
+    source: str = ''  # ID of the playlist or album the track was found in. Empty if unknown
+
+
+def bare_id(id: str) -> str:
+    """Returns the bare Spotify ID of an ID, URI or URL, e.g. 'ID' for 'spotify:playlist:ID' and
+    'https://open.spotify.com/playlist/ID?si=...'."""
+    return id.split('?')[0].rstrip('/').rsplit('/', 1)[-1].rsplit(':', 1)[-1]
+
+
+TDValueLike = Union[TDValue, tuple[str, str, str, str], tuple[str, str, str, str, int],
+                    tuple[str, str, str, str, int, str, str]]
 
 
 class TracksDict(dict):
-    def __init__(self, *args, **kwargs: Union[TDValue, tuple[str, str, str, str]]):
+    def __init__(self, *args, **kwargs: TDValueLike):
         dict.__init__(self)
         self.update(*args, **kwargs)
 
     def __getitem__(self, key: str) -> str:
         return dict.__getitem__(self, key)
 
-    def __setitem__(self, key: str, value: Union[TDValue, tuple[str, str, str, str]]):
+    def __setitem__(self, key: str, value: TDValueLike):
         # Checks
-        if not len(value) == 4:
-            raise ValueError("Value must contain 4 arguments")
-        for item in value:
+        if not 4 <= len(value) <= 7:
+            raise ValueError("Value must contain 4 to 7 arguments")
+        for item in value[:4] + value[5:]:
             if not isinstance(item, str):
                 raise TypeError("Values must be of type str")
+        if len(value) >= 5 and not isinstance(value[4], int):
+            raise TypeError("Duration must be of type int")
 
         if isinstance(value, TDValue):
             dict.__setitem__(self, key, value)
         else:  # convert tuple to TDV
-            dict.__setitem__(self, key, TDValue(name=value[0], artist=value[1], album=value[2], artwork=value[3]))
+            dict.__setitem__(self, key, TDValue(*value))
 
-    def update(self, *args, **kwargs: Union[TDValue, tuple[str, str, str, str]]):
+    def update(self, *args, **kwargs: TDValueLike):
         for key, value in dict(*args, **kwargs).items():
             self[key] = value
 
     def add_track(self, track: Track):
-        self[track.id] = TDValue(name=track.name, artist=track.artist, album=track.album, artwork=track.artwork)
+        self[track.id] = TDValue(name=track.name, artist=track.artist, album=track.album, artwork=track.artwork,
+                                 duration_ms=track.duration_ms)
+
+    def save(self, path: str) -> None:
+        """Saves the tracks to a JSON manifest, to retag or download them later without asking Spotify again.
+
+        :param str path: Output file
+        """
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({id: list(value) for id, value in self.items()}, file, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, path: str) -> 'TracksDict':
+        """Loads tracks from a manifest saved with :py:meth:`save`.
+
+        :param str path: Manifest file
+        :rtype: TracksDict
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            return cls({id: tuple(value) for id, value in json.load(file).items()})
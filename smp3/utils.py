@@ -3,6 +3,9 @@ from os import path
 from pathlib import Path
 import music_tag
 
+from .store import link_file
+from .tags import read_track_id
+
 def find_duplicates(*paths, file_extensions=('*.mp3', '*.wav')):
 
     all_files = []
@@ -19,6 +22,46 @@ def find_duplicates(*paths, file_extensions=('*.mp3', '*.wav')):
 
     return duplicate_paths
 
+def collapse_duplicates(*paths, file_extensions=('*.mp3', '*.opus', '*.ogg', '*.m4a', '*.flac'), link='hardlink',
+                        dry_run=True):
+    """Replaces files of the same track and format with links to one copy, the largest.
+
+    Files are matched by the Spotify ID stored in them when they were downloaded, files without one are left alone.
+    Nothing is changed unless `dry_run` is False.
+
+    :param paths: Directories to search
+    :param file_extensions: Patterns of files to collapse
+    :param str link: One of hardlink, reflink, copy. Falls back to the next one if it is not possible
+    :param bool dry_run: Only count the bytes that would be freed
+    :return: Bytes freed, or that would be freed
+    :rtype: int
+    """
+
+    groups = {}
+
+    for file_path in __path_handler(*paths, file_extensions=file_extensions):
+        try:
+            track_id = read_track_id(music_tag.load_file(file_path))
+        except Exception:
+            continue
+        if track_id is not None:
+            groups.setdefault((track_id, file_path.suffix.lower()), []).append(str(file_path))
+
+    freed = 0
+
+    for files in groups.values():
+        keep = max(files, key=path.getsize)
+        for file_path in files:
+            if file_path == keep or path.samefile(file_path, keep):
+                continue
+            size = path.getsize(file_path)
+            if dry_run:
+                freed += size
+            elif link_file(keep, file_path, link) != 'copy':
+                freed += size
+
+    return freed
+
 def __path_handler(*paths, file_extensions):
     out = iter(())
     for path in paths:
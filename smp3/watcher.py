@@ -0,0 +1,314 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# inotify(7) constants
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class _Inotify:
+    """Minimal inotify binding through ctypes, Linux only."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.__add_watch = libc.inotify_add_watch
+        self.__add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(_IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}  # watch descriptor -> directory
+
+    def add(self, dir: str) -> None:
+        wd = self.__add_watch(self.fd, os.fsencode(dir), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {dir}")
+        self.watches[wd] = dir
+
+    def read(self, timeout: float) -> list[tuple[str | None, int]]:
+        """Returns (path, mask) of the events within `timeout` seconds. Path is None for queue overflows."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+            offset += _EVENT.size + length
+            if mask & _IN_Q_OVERFLOW:
+                events.append((None, mask))
+            elif mask & _IN_IGNORED:  # directory was removed
+                self.watches.pop(wd, None)
+            elif wd in self.watches:
+                events.append((os.path.join(self.watches[wd], os.fsdecode(name)), mask))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _Checkpoint:
+    """Files already processed, by path, size and modification time.
+
+    Saved as JSON lines, one line appended per file, so recording a file does not rewrite the others. Entries of files
+    that no longer exist are dropped when the checkpoint is loaded, and the file is rewritten without them.
+    """
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self.files = {}
+        self.__lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:  # blank, or cut off by a crash
+                        continue
+                    self.files[entry.pop('path')] = entry  # later lines win
+            self.files = {file_path: entry for file_path, entry in self.files.items() if os.path.exists(file_path)}
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                file.writelines(self.__line(file_path, entry) for file_path, entry in self.files.items())
+            os.replace(tmp_path, path)
+
+    def get(self, path: str, stat: os.stat_result) -> dict | None:
+        entry = self.files.get(path)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry
+        return None
+
+    def record(self, path: str, stat: os.stat_result, outputs: list[str] = None, error: str = None,
+               source: str = None) -> None:
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'time': time.time(), 'outputs': outputs,
+                 'error': error, 'source': source}
+        with self.__lock:
+            self.files[path] = entry
+            if self.path is not None:
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.write(self.__line(path, entry))
+
+    @staticmethod
+    def __line(path: str, entry: dict) -> str:
+        return json.dumps({'path': path, **entry}, ensure_ascii=False) + '\n'
+
+
+class FolderWatcher:
+    """Watches a folder for new files and converts each one once it is completely written.
+
+    Changes are picked up with inotify on Linux. Elsewhere, or if inotify is not available, the folder is polled:
+    only the modification times of known directories are checked, and a directory is listed again only when it has
+    changed. Either way the whole tree is only listed once, at start.
+
+    A file is converted once its size and modification time have not changed for `settle` seconds. Conversions run on
+    a pool of `workers` threads with at most twice as many files queued, further files wait until there is room.
+    Processed files are recorded in a checkpoint with their size and modification time, so a restarted watcher
+    does not convert them again. Files that failed are retried only once they change.
+
+    Outputs of conversions are recorded too, so outputs with one of the watched extensions are not converted again.
+    A file with the name of a file being converted, in any folder and with any extension, waits until that
+    conversion has finished, so outputs are known before they are looked at.
+    """
+
+    def __init__(self, dir: str, convert, extensions: tuple = ('.webm',), recursive: bool = True,
+                 settle: float = 2.0, workers: int = 2, checkpoint: str = None, poll_interval: float = 2.0,
+                 use_inotify: bool = True, callback=None):
+        """
+        :param str dir: Folder to watch
+        :param convert: Function taking the path of a file, converting it and returning the paths of the outputs.
+            It is expected to remove the file
+        :param tuple extensions: Extensions of files to convert
+        :param bool recursive: If subfolders are watched too
+        :param float settle: Seconds a file must stay unchanged before it is converted
+        :param int workers: Number of files to convert at once
+        :param str checkpoint: JSON lines file to record processed files in, None to not keep one
+        :param float poll_interval: Seconds between checks when polling
+        :param bool use_inotify: If inotify is used when available
+        :param callback: Function called with (path, outputs, error) after each file. error is None on success
+        """
+        self.dir = dir
+        self.convert = convert
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.recursive = recursive
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.callback = callback
+        self.checkpoint = _Checkpoint(checkpoint)
+        self.converted = 0
+        self.failed = 0
+
+        self.__inotify = None
+        if use_inotify and sys.platform.startswith('linux'):
+            try:
+                self.__inotify = _Inotify()
+            except (OSError, AttributeError):  # AttributeError: libc without inotify
+                self.__inotify = None
+
+        self.__workers = workers
+        self.__slots = threading.BoundedSemaphore(workers * 2)
+        self.__pending = {}  # path -> (size, mtime, time of last change)
+        self.__running = set()
+        self.__running_stems = {}  # file name without extension -> number of running conversions
+        self.__dir_mtimes = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def backend(self) -> str:
+        """'inotify' or 'polling'."""
+        return 'inotify' if self.__inotify is not None else 'polling'
+
+    def run(self, stop: threading.Event = None) -> None:
+        """Watches until `stop` is set, then waits for running conversions to finish.
+
+        :param threading.Event stop: Event to stop watching, None to watch until interrupted
+        """
+        stop = stop if stop is not None else threading.Event()
+        pool = ThreadPoolExecutor(max_workers=self.__workers, thread_name_prefix='smp3-watch')
+        try:
+            self.__scan(self.dir)
+            tick = min(self.settle, self.poll_interval) / 2 or 0.1
+            next_poll = time.monotonic() + self.poll_interval
+            while not stop.is_set():
+                if self.__inotify is not None:
+                    self.__handle_events(self.__inotify.read(tick))
+                else:
+                    stop.wait(tick)
+                    if time.monotonic() >= next_poll:
+                        self.__poll()
+                        next_poll = time.monotonic() + self.poll_interval
+                self.__submit_settled(pool)
+        finally:
+            pool.shutdown(wait=True)
+            if self.__inotify is not None:
+                self.__inotify.close()
+                self.__inotify = None
+
+    def __matches(self, path: str) -> bool:
+        return path.lower().endswith(self.extensions)
+
+    def __scan(self, dir: str) -> None:
+        """Lists a directory, adding matching files to the pending ones and watching subdirectories."""
+        try:
+            self.__dir_mtimes[dir] = os.stat(dir).st_mtime
+            if self.__inotify is not None:
+                self.__inotify.add(dir)
+            entries = list(os.scandir(dir))
+        except OSError:  # removed in the meantime
+            self.__dir_mtimes.pop(dir, None)
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if self.recursive and entry.path not in self.__dir_mtimes:
+                    self.__scan(entry.path)
+            elif self.__matches(entry.name):
+                self.__observe(entry.path)
+
+    def __poll(self) -> None:
+        for dir, mtime in list(self.__dir_mtimes.items()):
+            try:
+                changed = os.stat(dir).st_mtime != mtime
+            except OSError:
+                del self.__dir_mtimes[dir]
+                continue
+            if changed:
+                self.__scan(dir)
+
+    def __handle_events(self, events: list[tuple[str | None, int]]) -> None:
+        for path, mask in events:
+            if path is None:  # events were lost, look at everything again
+                self.__dir_mtimes.clear()
+                self.__scan(self.dir)
+            elif mask & _IN_ISDIR:
+                if self.recursive and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    self.__scan(path)  # files may have been added before the watch
+            elif self.__matches(path):
+                self.__observe(path)
+
+    def __observe(self, path: str) -> None:
+        """Adds a file to the pending ones, or notes that it changed."""
+        with self.__lock:
+            if path in self.__running:
+                return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        if self.checkpoint.get(path, stat) is not None:
+            return
+        previous = self.__pending.get(path)
+        if previous is None or previous[:2] != (stat.st_size, stat.st_mtime):
+            self.__pending[path] = (stat.st_size, stat.st_mtime, time.monotonic())
+
+    def __submit_settled(self, pool: ThreadPoolExecutor) -> None:
+        now = time.monotonic()
+        for path, (size, mtime, changed) in list(self.__pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:  # removed or moved away
+                del self.__pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime) != (size, mtime):  # still being written
+                self.__pending[path] = (stat.st_size, stat.st_mtime, now)
+                continue
+            if now - changed < self.settle:
+                continue
+            if self.checkpoint.get(path, stat) is not None:  # an output recorded after it was noticed
+                del self.__pending[path]
+                continue
+            with self.__lock:
+                if _stem(path) in self.__running_stems:  # may be an output of that conversion
+                    continue
+            if not self.__slots.acquire(blocking=False):  # queue is full, try again next time
+                return
+            del self.__pending[path]
+            with self.__lock:
+                self.__running.add(path)
+                self.__running_stems[_stem(path)] = self.__running_stems.get(_stem(path), 0) + 1
+            pool.submit(self.__convert, path, stat)
+
+    def __convert(self, path: str, stat: os.stat_result) -> None:
+        outputs, error = None, None
+        try:
+            outputs = self.convert(path)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        try:
+            for output in outputs or ():
+                try:
+                    self.checkpoint.record(output, os.stat(output), source=path)
+                except OSError:  # already moved away
+                    pass
+            if path not in (outputs or ()):  # else it was just recorded as its own output
+                self.checkpoint.record(path, stat, outputs=outputs, error=error)
+        finally:
+            with self.__lock:
+                self.__running.discard(path)
+                self.__running_stems[_stem(path)] -= 1
+                if not self.__running_stems[_stem(path)]:
+                    del self.__running_stems[_stem(path)]
+                if error is None:
+                    self.converted += 1
+                else:
+                    self.failed += 1
+            self.__slots.release()
+        if self.callback is not None:
+            self.callback(path, outputs, error)
+
+
+def _stem(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
@@ -0,0 +1,204 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import closing
+from typing import NamedTuple
+
+from .track import TracksDict, TDValue
+
+
+class Job(NamedTuple):
+    id: int
+    track_id: str
+    track: TDValue
+    batch: str
+    attempts: int
+    worker: str
+
+
+class WorkQueue:
+    """Queue of tracks to download, shared by any number of worker processes and machines.
+
+    Jobs live in a SQLite database, so a file on shared storage is all the nodes need. Workers lease a job, work on
+    it and acknowledge it. A lease that is not renewed or acknowledged in time (e.g. the worker crashed) expires,
+    and the job is handed to another worker, up to `max_attempts` times.
+
+    SQLite relies on file locks, which some network file systems implement poorly. Prefer NFSv4/SMB with working
+    locks, or a local disk shared by workers on the same machine.
+
+    Also See:
+        * :py:meth:`Spotify2MP3.enqueue_tracks` and :py:meth:`Spotify2MP3.work_queue`
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 600, max_attempts: int = 3):
+        """
+        :param str path: Path to the queue database, created if it does not exist
+        :param float lease_seconds: How long a worker may hold a job without renewing the lease
+        :param int max_attempts: How often a job is tried before it is marked as failed
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        with closing(self.__connect()) as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    track_id TEXT NOT NULL,
+                    batch TEXT NOT NULL,
+                    track TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_until REAL,
+                    result TEXT,
+                    error TEXT,
+                    updated REAL NOT NULL,
+                    UNIQUE (batch, track_id)
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def __connect(self) -> sqlite3.Connection:
+        # autocommit mode, transactions are started explicitly where they are needed
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def push(self, tracks: TracksDict, batch: str = 'default') -> int:
+        """Adds tracks to the queue. Tracks already in the same batch are skipped.
+
+        :param TracksDict tracks: Tracks to add
+        :param str batch: Name of the batch, e.g. the playlist or run they belong to
+        :return: Number of jobs added
+        :rtype: int
+        """
+        now = time.time()
+        rows = [(track_id, batch, json.dumps(list(track)), now) for track_id, track in tracks.items()]
+        db = self.__connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            before = db.total_changes
+            db.executemany("INSERT OR IGNORE INTO jobs (track_id, batch, track, updated) VALUES (?, ?, ?, ?)", rows)
+            added = db.total_changes - before
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+        return added
+
+    def lease(self, worker: str) -> Job | None:
+        """Leases the next pending job, after putting jobs with expired leases back in the queue.
+
+        :param str worker: Name of the worker taking the job
+        :return: The leased job, or None if nothing is pending
+        :rtype: Job | None
+        """
+        now = time.time()
+        db = self.__connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            self.__expire(db, now)
+            row = db.execute("SELECT id, track_id, track, batch, attempts FROM jobs "
+                             "WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+
+            id, track_id, track, batch, attempts = row
+            db.execute("UPDATE jobs SET status = 'leased', worker = ?, attempts = attempts + 1, lease_until = ?, "
+                       "updated = ? WHERE id = ?", (worker, now + self.lease_seconds, now, id))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+        return Job(id=id, track_id=track_id, track=TDValue(*json.loads(track)), batch=batch, attempts=attempts + 1,
+                   worker=worker)
+
+    def renew(self, job: Job) -> bool:
+        """Extends the lease of a job that is still being worked on.
+
+        :param Job job: Leased job
+        :return: False if the lease was lost, e.g. because it had already expired and was given to another worker
+        :rtype: bool
+        """
+        now = time.time()
+        with closing(self.__connect()) as db:
+            cursor = db.execute("UPDATE jobs SET lease_until = ?, updated = ? "
+                                "WHERE id = ? AND status = 'leased' AND worker = ?",
+                                (now + self.lease_seconds, now, job.id, job.worker))
+            return cursor.rowcount == 1
+
+    def ack(self, job: Job, result: str = None) -> None:
+        """Marks a job as done.
+
+        :param Job job: Leased job
+        :param str result: Result to store, e.g. path to the downloaded file
+        """
+        with closing(self.__connect()) as db:
+            db.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated = ? "
+                       "WHERE id = ? AND worker = ?", (result, time.time(), job.id, job.worker))
+
+    def fail(self, job: Job, error: str) -> None:
+        """Reports that a job failed. It is retried until it has been attempted `max_attempts` times.
+
+        :param Job job: Leased job
+        :param str error: Description of the error
+        """
+        status = 'failed' if job.attempts >= self.max_attempts else 'pending'
+        with closing(self.__connect()) as db:
+            db.execute("UPDATE jobs SET status = ?, error = ?, worker = NULL, lease_until = NULL, updated = ? "
+                       "WHERE id = ? AND worker = ?", (status, error, time.time(), job.id, job.worker))
+
+    def status(self) -> dict:
+        """Returns the number of jobs by status, overall and per batch, and the workers holding leases.
+
+        :return: {'total': {status: count}, 'batches': {batch: {status: count}}, 'workers': {worker: count}}
+        :rtype: dict
+        """
+        with closing(self.__connect()) as db:
+            self.__expire(db, time.time())
+            total, batches, workers = {}, {}, {}
+            for batch, status, count in db.execute("SELECT batch, status, COUNT(*) FROM jobs GROUP BY batch, status"):
+                total[status] = total.get(status, 0) + count
+                batches.setdefault(batch, {})[status] = count
+            for worker, count in db.execute("SELECT worker, COUNT(*) FROM jobs WHERE status = 'leased' "
+                                            "GROUP BY worker"):
+                workers[worker] = count
+        return {'total': total, 'batches': batches, 'workers': workers}
+
+    def failures(self) -> list[dict]:
+        """Returns jobs that failed for good, and the last error of each.
+
+        :rtype: list[dict]
+        """
+        with closing(self.__connect()) as db:
+            rows = db.execute("SELECT track_id, batch, track, attempts, error FROM jobs WHERE status = 'failed' "
+                              "ORDER BY id").fetchall()
+        return [{'track_id': track_id, 'batch': batch, 'name': json.loads(track)[0], 'attempts': attempts,
+                 'error': error} for track_id, batch, track, attempts, error in rows]
+
+    def retry_failed(self) -> int:
+        """Puts all failed jobs back in the queue with their attempts reset.
+
+        :return: Number of jobs requeued
+        :rtype: int
+        """
+        with closing(self.__connect()) as db:
+            return db.execute("UPDATE jobs SET status = 'pending', attempts = 0, updated = ? "
+                              "WHERE status = 'failed'", (time.time(),)).rowcount
+
+    def __expire(self, db: sqlite3.Connection, now: float) -> None:
+        db.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                   "error = 'lease expired (worker ' || worker || ' stopped responding)', worker = NULL, "
+                   "lease_until = NULL, updated = ? WHERE status = 'leased' AND lease_until < ?",
+                   (self.max_attempts, now, now))
+
+
+def default_worker_name() -> str:
+    """Returns a worker name unique to this machine and process, e.g. 'host-1234'."""
+    return f"{socket.gethostname()}-{os.getpid()}"
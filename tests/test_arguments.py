@@ -0,0 +1,53 @@
+import argparse
+
+import pytest
+
+from smp3.arguments import add_quality_arguments, add_store_arguments, add_target_arguments, apply_quality, \
+    parse_targets
+from smp3.quality import QualityProfile
+from smp3.targets import OutputTarget
+
+
+class Client:
+    quality = None
+
+    def set_quality(self, profile):
+        self.quality = profile
+
+
+def parser(streams: bool = True) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    add_quality_arguments(parser, streams=streams)
+    add_target_arguments(parser)
+    add_store_arguments(parser)
+    return parser
+
+
+def test_parse_targets():
+    args = parser().parse_args(['--target', 'mp3', '320', '--target', 'opus', '96', 'phone/', '--target', 'flac'])
+    assert parse_targets(args.target) == [OutputTarget('mp3', 320), OutputTarget('opus', 96, 'phone/'),
+                                          OutputTarget('flac')]
+    with pytest.raises(ValueError):
+        parse_targets([['mp3', '320', 'dir', 'extra']])
+
+
+def test_apply_quality():
+    s = Client()
+    apply_quality(s, parser().parse_args([]))
+    assert s.quality is None
+
+    apply_quality(s, parser().parse_args(['--bitrate', '128', '--codec', 'opus', '--max-size', '1.5']))
+    assert s.quality == QualityProfile(bitrate=128, codec='opus', max_size=1572864)
+
+
+def test_apply_quality_without_streams():
+    s = Client()
+    apply_quality(s, parser(streams=False).parse_args(['--bitrate', '256']))
+    assert s.quality == QualityProfile(bitrate=256)
+    with pytest.raises(SystemExit):
+        parser(streams=False).parse_args(['--codec', 'opus'])
+
+
+def test_store_arguments():
+    args = parser().parse_args(['--store', '/music/.store'])
+    assert (args.store, args.link) == ('/music/.store', 'hardlink')
@@ -0,0 +1,28 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from smp3.capture import capture_output, carry
+
+
+def shout(word: str) -> str:
+    print(word)
+    return word
+
+
+def test_capture_is_per_thread(capsys):
+    with capture_output() as buffer:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(shout, 'outside').result()
+        shout('inside')
+    assert buffer.getvalue() == 'inside\n'
+    assert 'outside' in capsys.readouterr().out
+
+
+def test_carry_captures_pool_workers():
+    with capture_output() as buffer:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            assert list(pool.map(carry(shout), ['a', 'b', 'c'])) == ['a', 'b', 'c']
+    assert sorted(buffer.getvalue().split()) == ['a', 'b', 'c']
+
+
+def test_carry_without_capture_returns_func():
+    assert carry(shout) is shout
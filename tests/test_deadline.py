@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from smp3 import deadline
+from smp3.capture import capture_output
+from smp3.deadline import Hedger, StageTimeoutError, call
+from smp3.profiling import Profiler, profile_stage
+
+
+class Calls:
+    """Returns or raises the next of `outcomes` after its delay, one per call."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.count = 0
+        self.__lock = threading.Lock()
+
+    def __call__(self):
+        with self.__lock:
+            delay, outcome = self.outcomes[self.count]
+            self.count += 1
+        time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def warm_hedger(seconds: float = 0.05) -> Hedger:
+    hedger = Hedger(min_samples=3)
+    for _ in range(3):
+        hedger.record('search', seconds)
+    return hedger
+
+
+def test_hedger_needs_samples():
+    hedger = Hedger(quantile=0.5, min_samples=4)
+    for seconds in (0.1, 0.2, 0.3):
+        hedger.record('search', seconds)
+    assert hedger.delay('search') is None
+    hedger.record('search', 0.4)
+    assert hedger.delay('search') == 0.3
+    assert hedger.delay('spotify') is None
+
+
+def test_timeout():
+    start = time.monotonic()
+    with pytest.raises(StageTimeoutError):
+        call('download', Calls((1, 'late')), timeout=0.1)
+    assert time.monotonic() - start < 0.5
+
+
+def test_no_timeout_or_hedging_runs_in_caller():
+    assert call('search', threading.current_thread) is threading.current_thread()
+
+
+def test_hedge_after_slow_call():
+    calls = Calls((1, 'primary'), (0, 'duplicate'))
+    start = time.monotonic()
+    assert call('search', calls, hedger=warm_hedger()) == 'duplicate'
+    assert time.monotonic() - start < 0.5
+    assert calls.count == 2
+
+
+def test_fast_call_is_not_hedged():
+    calls = Calls((0, 'primary'), (0, 'duplicate'))
+    assert call('search', calls, hedger=warm_hedger(1)) == 'primary'
+    assert calls.count == 1
+
+
+def test_first_success_wins_over_failed_call():
+    calls = Calls((0.2, ValueError('primary failed')), (0.3, 'duplicate'))
+    assert call('search', calls, hedger=warm_hedger()) == 'duplicate'
+
+
+def test_error_raised_when_every_call_fails():
+    calls = Calls((0.2, ValueError('primary failed')), (0.1, KeyError('duplicate failed')))
+    with pytest.raises(KeyError):
+        call('search', calls, hedger=warm_hedger())
+
+    with pytest.raises(ValueError):  # failing before the duplicate is due
+        call('search', Calls((0, ValueError('failed'))), hedger=warm_hedger(1))
+
+
+def test_output_and_stages_follow_the_call():
+    def work():
+        print('inside')
+        sum(range(10 ** 6))
+
+    with Profiler(trace_memory=False) as profiler:
+        with capture_output() as buffer, profile_stage('search'):
+            call('search', work, timeout=5)
+    assert buffer.getvalue() == 'inside\n'
+    stats = profiler.stages['search']
+    assert stats.calls == 1  # counted once, by the calling thread
+    assert stats.cpu > 0
+
+
+def test_pool_is_bounded():
+    pool = deadline._Pool(2)
+    release = threading.Event()
+    done = []
+    for n in range(5):
+        pool.submit(lambda n=n: (release.wait(5), done.append(n)))
+    time.sleep(0.1)
+    assert pool.threads == 2 and done == []
+
+    release.set()
+    for _ in range(50):
+        if len(done) == 5:
+            break
+        time.sleep(0.02)
+    assert sorted(done) == [0, 1, 2, 3, 4]
+    pool.submit(lambda: done.append(5))  # reuses an idle thread
+    time.sleep(0.05)
+    assert pool.threads == 2 and done[-1] == 5
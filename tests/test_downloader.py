@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from smp3.downloader import Downloader, DownloadError
+from smp3.governor import BandwidthGovernor
+
+DATA = bytes(range(256)) * 4000  # 1,024,000 bytes
+
+
+class Server:
+    """Serves DATA with Range support. The first `drops` responses are cut off after `drop_after` bytes."""
+
+    def __init__(self):
+        self.drops = 0
+        self.drop_after = 0
+        self.ranges = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                start = 0
+                header = self.headers.get('Range')
+                if header is not None:
+                    first, _, last = header.removeprefix('bytes=').partition('-')
+                    start, end = int(first), int(last) if last else len(DATA) - 1
+                    server.ranges.append((start, end))
+                    if start >= len(DATA):
+                        self.send_response(416)
+                        self.end_headers()
+                        return
+                    body = DATA[start:end + 1]
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{len(DATA)}")
+                else:
+                    body = DATA
+                    self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if server.drops > 0:
+                    server.drops -= 1
+                    self.wfile.write(body[:server.drop_after])
+                    self.wfile.flush()
+                    self.connection.close()
+                    return
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/audio"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    server = Server()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def downloader():
+    return Downloader(chunk_size=64 * 1024, retries=3, backoff=0, timeout=5, governor=BandwidthGovernor())
+
+
+def read(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def test_download(server, downloader, tmp_path):
+    path = downloader.download(server.url, str(tmp_path), 'song.webm', size=len(DATA))
+    assert read(path) == DATA
+    assert os.listdir(tmp_path) == ['song.webm']
+
+
+def test_download_unknown_size(server, downloader, tmp_path):
+    path = downloader.download(server.url, str(tmp_path), 'song.webm')
+    assert read(path) == DATA
+
+
+def test_resume_after_drop(server, downloader, tmp_path):
+    server.drops, server.drop_after = 1, 5 * 64 * 1024
+    path = downloader.download(server.url, str(tmp_path), 'song.webm', size=len(DATA))
+    assert read(path) == DATA
+    assert server.ranges[-1][0] == 5 * 64 * 1024  # resumed, not started over
+
+
+def test_resume_partial_of_same_stream(server, downloader, tmp_path):
+    part = tmp_path / 'song.webm.part'
+    part.write_bytes(DATA[:500_000])
+    (tmp_path / 'song.webm.part.json').write_text(json.dumps({'key': 'v1-251', 'size': len(DATA)}))
+
+    path = downloader.download(server.url, str(tmp_path), 'song.webm', size=len(DATA), key='v1-251')
+    assert read(path) == DATA
+    assert server.ranges[-1][0] == 500_000
+
+
+def test_smaller_partial_of_other_stream_is_discarded(server, downloader, tmp_path):
+    (tmp_path / 'song.webm.part').write_bytes(b'\xff' * 500_000)
+    (tmp_path / 'song.webm.part.json').write_text(json.dumps({'key': 'v2-140', 'size': len(DATA)}))
+
+    path = downloader.download(server.url, str(tmp_path), 'song.webm', size=len(DATA), key='v1-251')
+    assert read(path) == DATA
+    assert os.listdir(tmp_path) == ['song.webm']
+
+
+def test_larger_partial_without_metadata_is_discarded(server, downloader, tmp_path):
+    (tmp_path / 'song.webm.part').write_bytes(b'\xff' * 1_500_000)
+
+    path = downloader.download(server.url, str(tmp_path), 'song.webm', size=len(DATA), key='v1-251')
+    assert read(path) == DATA
+
+
+def test_size_mismatch_discards_partial(server, downloader, tmp_path):
+    with pytest.raises(DownloadError):
+        downloader.download(server.url, str(tmp_path), 'song.webm', size=len(DATA) + 10, key='v1-251')
+    assert os.listdir(tmp_path) == []
+
+    # the next attempt with the right size starts clean
+    path = downloader.download(server.url, str(tmp_path), 'song.webm', size=len(DATA), key='v1-251')
+    assert read(path) == DATA
+
+
+def test_segmented(server, tmp_path):
+    downloader = Downloader(chunk_size=64 * 1024, backoff=0, segments=4, segment_threshold=0,
+                            governor=BandwidthGovernor())
+    path = downloader.download(server.url, str(tmp_path), 'song.webm', size=len(DATA))
+    assert read(path) == DATA
+    assert os.listdir(tmp_path) == ['song.webm']
+
+
+def test_gives_up_after_retries(server, downloader, tmp_path):
+    server.drops, server.drop_after = 100, 0
+    with pytest.raises(DownloadError):
+        downloader.download(server.url, str(tmp_path), 'song.webm', size=len(DATA))
+
+
+def test_stale_segments_are_discarded(server, tmp_path):
+    downloader = Downloader(chunk_size=64 * 1024, backoff=0, segments=4, segment_threshold=0,
+                            governor=BandwidthGovernor())
+    for i in range(4):
+        (tmp_path / f'song.webm.part.{i}').write_bytes(b'\xff' * 1000)
+    (tmp_path / 'other.webm.part.0').write_bytes(b'\xff')
+
+    path = downloader.download(server.url, str(tmp_path), 'song.webm', size=len(DATA), key='v1-251')
+    assert read(path) == DATA
+    assert sorted(os.listdir(tmp_path)) == ['other.webm.part.0', 'song.webm']
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from smp3.governor import BandwidthGovernor
+
+
+def timed(func, *args) -> float:
+    start = time.monotonic()
+    func(*args)
+    return time.monotonic() - start
+
+
+def test_unlimited_does_not_wait():
+    governor = BandwidthGovernor()
+    assert timed(governor.consume, 100 * 1024 * 1024) < 0.05
+
+
+def test_token_bucket_limits_rate():
+    governor = BandwidthGovernor(rate=100_000, burst=10_000)
+    governor.consume(10_000)  # empty the bucket
+    # 30,000 bytes at 100,000 bytes per second
+    elapsed = timed(lambda: [governor.consume(10_000) for _ in range(3)])
+    assert 0.25 <= elapsed < 0.6
+
+
+def test_burst_is_not_throttled():
+    governor = BandwidthGovernor(rate=100_000, burst=50_000)
+    time.sleep(0.5)  # fill the bucket
+    assert timed(governor.consume, 50_000) < 0.05
+
+
+def test_set_rate_at_runtime():
+    governor = BandwidthGovernor(rate=10_000)
+    governor.consume(10_000)
+    governor.set_rate(None)
+    assert timed(governor.consume, 1_000_000) < 0.05
+
+    governor.set_rate(1_000_000)
+    governor.consume(1_000_000)
+    assert 0.05 <= timed(governor.consume, 100_000) < 0.3
+
+
+def test_max_connections():
+    governor = BandwidthGovernor(max_connections=1)
+    entered = threading.Event()
+
+    def second():
+        with governor.connection():
+            entered.set()
+
+    with governor.connection():
+        thread = threading.Thread(target=second)
+        thread.start()
+        assert not entered.wait(0.1)
+        assert governor.utilization()['waiting_connections'] == 1
+    assert entered.wait(1)
+    thread.join()
+
+
+def test_raising_max_connections_wakes_waiting():
+    governor = BandwidthGovernor(max_connections=1)
+    entered = threading.Event()
+
+    def second():
+        with governor.connection():
+            entered.set()
+
+    with governor.connection():
+        thread = threading.Thread(target=second)
+        thread.start()
+        assert not entered.wait(0.1)
+        governor.set_max_connections(2)
+        assert entered.wait(1)  # while the first connection is still open
+    thread.join()
+
+
+def test_utilization():
+    governor = BandwidthGovernor(rate=1_000_000, window=1.0)
+    governor.consume(200_000)
+    with governor.connection():
+        utilization = governor.utilization()
+    assert utilization == {'rate_limit': 1_000_000, 'current_rate': 200_000, 'bandwidth_used': 0.2,
+                           'max_connections': None, 'active_connections': 1, 'waiting_connections': 0,
+                           'bytes_total': 200_000}
+
+    time.sleep(1.1)  # out of the window
+    utilization = governor.utilization()
+    assert (utilization['current_rate'], utilization['active_connections'], utilization['bytes_total']) == \
+        (0, 0, 200_000)
+    governor.set_rate(None)
+    assert governor.utilization()['bandwidth_used'] is None
@@ -0,0 +1,80 @@
+import pytest
+
+from smp3.planner import Plan, PlannedTrack, ARTWORK_BYTES, DEFAULT_RATES, estimate_output_bytes, measured_rates
+from smp3.targets import OutputTarget
+from smp3.track import TDValue
+
+MB = 1024 * 1024
+
+
+def track(name: str, duration_ms: int = 180000) -> TDValue:
+    return TDValue(name, 'Artist', 'Album', 'https://img', duration_ms, '2024-01-01T00:00:00Z', 'pl1')
+
+
+@pytest.fixture
+def plan():
+    return Plan([
+        PlannedTrack('a', track('Song A'), 'download', 'https://youtube.com/watch?v=a', 251, 3 * MB, 4 * MB),
+        PlannedTrack('b', track('Song B', 120000), 'download', 'https://youtube.com/watch?v=b', 140, 1 * MB, 2 * MB),
+        PlannedTrack('c', track('Song C'), 'exists', path='/music/Song C.mp3'),
+        PlannedTrack('d', track('Song D'), 'no_match', error='no result close enough'),
+        PlannedTrack('e', track('Song E'), 'stored', path='/music/.store/mp3-best/e/Song E.mp3'),
+    ], dir='/music', artwork_fetches=1, rates={'search_s': 1.0}, created=1700000000.0)
+
+
+def test_save_load_round_trip(plan, tmp_path):
+    path = str(tmp_path / 'plan.json')
+    plan.save(path)
+    loaded = Plan.load(path)
+
+    assert loaded.tracks == plan.tracks
+    assert isinstance(loaded.tracks[0].track, TDValue)
+    assert (loaded.dir, loaded.search_syntax, loaded.with_artwork, loaded.artwork_fetches, loaded.rates,
+            loaded.created) == ('/music', 'ARTIST - NAME', True, 1, {'search_s': 1.0}, 1700000000.0)
+    assert loaded.describe() == plan.describe()
+
+
+def test_totals(plan):
+    assert plan.totals() == {
+        'tracks': {'download': 2, 'stored': 1, 'exists': 1, 'no_match': 1, 'error': 0},
+        'download_bytes': 4 * MB,
+        'output_bytes': 6 * MB + ARTWORK_BYTES,
+        'duration_s': 300,
+    }
+    assert [planned.id for planned in plan.to_download()] == ['a', 'b']
+
+
+def test_describe(plan):
+    assert plan.describe().splitlines()[0] == ("5 tracks: 2 to download, 1 to link from the store, 1 already downloaded, "
+                                               "1 without a match, 0 could not be resolved")
+
+
+def test_projection(plan):
+    projection = plan.projection(workers=2)
+    assert projection['measured'] == ['search_s']
+    assert projection['stages'] == {
+        'search': 1.0,  # 2 tracks at the measured 1s, over 2 workers
+        'download': 4 * MB / (DEFAULT_RATES['download_bps'] * 2),
+        'convert': 4 * DEFAULT_RATES['convert_s_per_mb'] / 2,
+        'tag': 2 * DEFAULT_RATES['tag_s'] / 2,
+    }
+    assert projection['seconds'] == sum(projection['stages'].values())
+
+    # a bandwidth limit caps the download stage
+    assert plan.projection(workers=2, rate=MB)['stages']['download'] == 4
+
+
+def test_estimate_output_bytes():
+    targets = [OutputTarget('mp3'), OutputTarget('opus', 64), OutputTarget('flac')]
+    assert estimate_output_bytes(targets, '128k', 10, with_artwork=False) == (128 + 64 + 850) * 1000 // 8 * 10
+    assert estimate_output_bytes(targets[:1], '128k', 10, with_artwork=True) == 160000 + ARTWORK_BYTES
+
+
+def test_measured_rates():
+    snapshot = {
+        'stages': {'searching': {'count': 4, 'sum': 2.0}, 'downloading': {'count': 4, 'sum': 8.0},
+                   'converting': {'count': 4, 'sum': 4.0}},
+        'bytes': {'downloaded': 16 * MB},
+    }
+    assert measured_rates(snapshot) == {'search_s': 0.5, 'download_bps': 2 * MB, 'convert_s_per_mb': 0.25}
+    assert measured_rates({}) == {}
@@ -0,0 +1,89 @@
+import pytest
+
+from smp3.quality import QualityProfile, select_stream, encode_bitrate
+from smp3.resolver import NoMatchError
+
+
+class Stream:
+    def __init__(self, abr: int, codec: str, size: int = None):
+        self.abr = f"{abr}kbps"
+        self.audio_codec = codec
+        self._filesize = size or 0
+
+    def __repr__(self):
+        return f"Stream({self.abr}, {self.audio_codec}, {self._filesize})"
+
+
+class Streams(list):
+    def filter(self, only_audio: bool = False):
+        return self
+
+
+# Audio streams YouTube usually offers
+OPUS_50 = Stream(50, 'opus', 1_000_000)
+OPUS_70 = Stream(70, 'opus', 1_400_000)
+MP4A_128 = Stream(128, 'mp4a.40.2', 2_600_000)
+OPUS_160 = Stream(160, 'opus', 3_000_000)
+STREAMS = Streams([OPUS_50, OPUS_70, MP4A_128, OPUS_160])
+
+
+def test_no_profile_picks_highest_bitrate():
+    assert select_stream(STREAMS) is OPUS_160
+    assert select_stream(STREAMS, QualityProfile()) is OPUS_160
+
+
+def test_no_audio_streams():
+    for profile in (None, QualityProfile(bitrate=128, codec='opus', max_size=10)):
+        with pytest.raises(NoMatchError):
+            select_stream(Streams(), profile)
+
+
+def test_smallest_bitrate_meeting_target():
+    assert select_stream(STREAMS, QualityProfile(bitrate=64)) is OPUS_70
+    assert select_stream(STREAMS, QualityProfile(bitrate=100)) is MP4A_128
+
+
+def test_highest_bitrate_if_target_is_not_met():
+    assert select_stream(STREAMS, QualityProfile(bitrate=320)) is OPUS_160
+
+
+def test_codec_preferred_within_tolerance():
+    assert select_stream(STREAMS, QualityProfile(bitrate=100, codec='opus')) is OPUS_160
+    assert select_stream(STREAMS, QualityProfile(bitrate=128, codec='mp4a')) is MP4A_128
+    # 70kbps is too far from 128kbps to count as equal
+    assert select_stream(STREAMS, QualityProfile(bitrate=60, codec='mp4a')) is OPUS_70
+
+
+def test_codec_without_bitrate():
+    assert select_stream(STREAMS, QualityProfile(codec='mp4a')) is MP4A_128
+    assert select_stream(STREAMS, QualityProfile(codec='flac')) is OPUS_160
+
+
+def test_codec_breaks_bitrate_ties():
+    mp4a = Stream(128, 'mp4a.40.2', 2_000_000)
+    opus = Stream(128, 'opus', 2_100_000)
+    assert select_stream(Streams([mp4a, opus]), QualityProfile(bitrate=128, codec='opus')) is opus
+    assert select_stream(Streams([mp4a, opus]), QualityProfile(bitrate=128)) is mp4a  # smaller file
+
+
+def test_max_size_skips_larger_streams():
+    assert select_stream(STREAMS, QualityProfile(max_size=2_000_000)) is OPUS_70
+    assert select_stream(STREAMS, QualityProfile(bitrate=128, max_size=2_000_000)) is OPUS_70
+
+
+def test_max_size_skips_unknown_sizes():
+    unknown = Stream(160, 'opus')
+    streams = Streams([OPUS_70, unknown])
+    assert select_stream(streams, QualityProfile(max_size=2_000_000)) is OPUS_70
+
+
+def test_max_size_falls_back_to_smallest_stream():
+    assert select_stream(STREAMS, QualityProfile(max_size=10)) is OPUS_50
+    unknown = Streams([Stream(160, 'opus'), Stream(70, 'opus')])
+    assert select_stream(unknown, QualityProfile(max_size=10)) is unknown[1]
+
+
+def test_encode_bitrate():
+    assert encode_bitrate(OPUS_160) == '160k'
+    assert encode_bitrate(OPUS_160, QualityProfile(bitrate=128)) == '128k'
+    assert encode_bitrate(OPUS_70, QualityProfile(bitrate=128)) == '70k'
@@ -0,0 +1,75 @@
+import pytest
+
+from smp3.resolver import Resolver, NoMatchError, _normalize
+from smp3.track import TDValue
+
+TRACK = TDValue('Golden Hour', 'Luna Park', 'Summer', '', 200000)
+
+
+class Video:
+    def __init__(self, title: str, author: str, length: int):
+        self.title = title
+        self.author = author
+        self.length = length
+
+    def __repr__(self):
+        return self.title
+
+
+OFFICIAL = Video('Luna Park - Golden Hour (Official Audio)', 'Luna Park', 201)
+LIVE = Video('Luna Park - Golden Hour (Live at Wembley)', 'Luna Park', 205)
+COVER = Video('Golden Hour cover', 'Bedroom Covers', 198)
+LONG = Video('Luna Park - Golden Hour [Official Video]', 'Luna Park', 290)
+OTHER = Video('Completely different song', 'Someone', 188)
+
+
+def test_normalize_removes_upload_info():
+    assert _normalize('Luna Park - Golden Hour [Official Video]') == 'luna park golden hour'
+    assert _normalize('Golden Hour (Lyrics) (HD)') == 'golden hour'
+
+
+def test_normalize_keeps_text_between_brackets():
+    assert _normalize('Song (feat. X) Remastered [Official Video]') == 'song feat x remastered'
+    assert _normalize('Song (feat. X) [Official Video]') == 'song feat x'
+    assert _normalize('Song [Remix] Part 2 (Official Audio)') == 'song remix part 2'
+
+
+def test_rank_prefers_matching_upload():
+    ranked = Resolver().rank([COVER, LIVE, OFFICIAL, OTHER], TRACK)
+    assert [video for _, video in ranked][0] is OFFICIAL
+    assert ranked == sorted(ranked, key=lambda item: item[0], reverse=True)
+    assert [video for _, video in ranked] == [OFFICIAL, LIVE, COVER]  # the unrelated song is below min_score
+
+
+def test_alternative_versions_allowed_when_named():
+    live_track = TDValue('Golden Hour (Live at Wembley)', 'Luna Park', 'Live', '', 205000)
+    assert Resolver().rank([OFFICIAL, LIVE], live_track)[0][1] is LIVE
+
+
+def test_duration_mismatch_is_rejected():
+    resolver = Resolver(duration_tolerance=15)
+    assert resolver.score(LONG, TRACK) is None
+    assert LONG not in [video for _, video in resolver.rank([LONG, OFFICIAL], TRACK)]
+    # unknown durations are neither rewarded nor rejected
+    assert resolver.score(LONG, TDValue('Golden Hour', 'Luna Park', 'Summer', '')) is not None
+
+
+def test_min_score():
+    assert [video for _, video in Resolver(min_score=0.4).rank([OTHER], TRACK)] == []
+    assert [video for _, video in Resolver(min_score=0.0).rank([OTHER], TRACK)] == [OTHER]
+    assert Resolver(min_score=1.01).rank([OFFICIAL], TRACK) == []
+
+
+def test_resolve():
+    queries = []
+
+    def search(query):
+        queries.append(query)
+        return [LONG, COVER, LIVE, OTHER, OFFICIAL]
+
+    assert Resolver(search=search).resolve('Luna Park - Golden Hour', TRACK) is OFFICIAL
+    assert queries == ['Luna Park - Golden Hour']
+    # only the first `candidates` results are considered
+    assert Resolver(candidates=3, search=search).resolve('q', TRACK) is LIVE
+    with pytest.raises(NoMatchError):
+        Resolver(candidates=1, search=search).resolve('q', TRACK)
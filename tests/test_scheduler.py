@@ -0,0 +1,71 @@
+import pytest
+
+from smp3.scheduler import by_priority, get_policy, insertion_order, newest_first, round_robin, schedule, \
+    shortest_first
+from smp3.track import TracksDict, TDValue
+
+
+def track(duration_ms: int, added_at: str, source: str) -> TDValue:
+    return TDValue('Song', 'Artist', 'Album', '', duration_ms, added_at, source)
+
+
+TRACKS = TracksDict({
+    'a': track(200000, '2024-01-03T00:00:00Z', 'pl1'),
+    'b': track(100000, '', 'pl1'),
+    'c': track(0, '2024-01-05T00:00:00Z', 'pl1'),
+    'd': track(300000, '2024-01-01T00:00:00Z', 'pl2'),
+    'e': track(150000, '2024-01-04T00:00:00Z', 'pl3'),
+})
+
+
+def test_insertion_order():
+    assert insertion_order(TRACKS) == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_newest_first():
+    assert newest_first(TRACKS) == ['c', 'e', 'a', 'd', 'b']  # undated last
+
+
+def test_shortest_first():
+    assert shortest_first(TRACKS) == ['b', 'e', 'a', 'd', 'c']  # unknown length last
+
+
+def test_round_robin():
+    assert round_robin(TRACKS) == ['a', 'd', 'e', 'b', 'c']
+
+
+def test_by_priority():
+    policy = by_priority({'pl2': 5, 'e': 10, 'pl3': 1})
+    assert policy(TRACKS) == ['e', 'd', 'a', 'b', 'c']  # a track's own priority wins over its playlist's
+
+
+def test_by_priority_orders_ties():
+    policy = by_priority({'pl1': 5}, then=shortest_first)
+    assert policy(TRACKS) == ['b', 'a', 'c', 'e', 'd']
+    assert by_priority({}, default=3)(TRACKS) == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_schedule():
+    scheduled = schedule(TRACKS, 'shortest')
+    assert isinstance(scheduled, TracksDict)
+    assert list(scheduled) == ['b', 'e', 'a', 'd', 'c']
+    assert scheduled['b'] == TRACKS['b']
+
+
+def test_schedule_checks_policy():
+    with pytest.raises(ValueError):
+        schedule(TRACKS, 'random')
+    with pytest.raises(ValueError):
+        schedule(TRACKS, lambda tracks: ['a', 'a', 'b', 'c', 'd'])
+    with pytest.raises(ValueError):
+        schedule(TRACKS, lambda tracks: ['a', 'b'])
+    assert get_policy('round-robin') is round_robin
+
+
+def test_by_priority_matches_uris_and_urls():
+    tracks = TracksDict({
+        'a': track(0, '', 'pl1'),
+        'b': track(0, '', 'https://open.spotify.com/playlist/pl2?si=x'),
+    })
+    assert by_priority({'spotify:playlist:pl2': 1})(tracks) == ['b', 'a']
+    assert by_priority({'https://open.spotify.com/track/a?si=y': 1, 'pl2': 0})(tracks) == ['a', 'b']
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from smp3.capture import carry
+from smp3.service import Service, ServiceClient
+from smp3.track import TracksDict, TDValue
+
+TRACKS = TracksDict({f'tr{n}': TDValue(f'Song {n}', 'Artist', 'Album', '') for n in range(4)})
+
+
+class FakeClient:
+    """Stands in for Spotify2MP3. Downloads print from the executor the service sets, like a real batch does."""
+
+    def __init__(self):
+        self.dir = None
+        self.executor = None
+        self.executors = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def set_progress(self, mode):
+        pass
+
+    def set_dir(self, dir):
+        self.dir = dir
+
+    def set_schedule(self, policy):
+        pass
+
+    def set_executor(self, executor):
+        self.executor = executor
+
+    def search_id(self, query, type):
+        return None if query == 'missing' else 'pl1'
+
+    def get_tracks(self, id, type):
+        return TRACKS
+
+    def download_tracks(self, tracks, search_syntax, with_artwork, workers, cancel):
+        self.executors.append(self.executor)
+        self.release.wait(5)
+
+        @carry
+        def work(track_id):
+            if cancel.is_set():
+                return None
+            print('downloading', track_id)
+            return f'{self.dir}/{track_id}.mp3'
+
+        paths = [future.result() for future in [self.executor.submit(work, track_id) for track_id in tracks]]
+        return [path for path in paths if path is not None]
+
+
+@pytest.fixture
+def service():
+    client = FakeClient()
+    service = Service(client, jobs=1, workers=2)
+    thread = threading.Thread(target=service.serve, kwargs={'port': 0}, daemon=True)
+    thread.start()
+    while service.address is None:
+        time.sleep(0.01)
+    yield service, client, ServiceClient(f'http://127.0.0.1:{service.address[1]}', timeout=5)
+    client.release.set()
+    service.shutdown()
+
+
+def test_submit_and_status(service):
+    service, client, api = service
+    job = api.submit({'type': 'playlist', 'namelist': ['Mix', 'missing'], 'dir': '/music'})
+    assert job['status'] in ('queued', 'running')
+
+    done = api.wait(job['id'], poll_interval=0.05)
+    assert (done['status'], done['tracks'], done['downloaded']) == ('done', 4, 4)
+    assert done['paths'] == [f'/music/tr{n}.mp3' for n in range(4)]
+    # Output of the job thread and of the track pool both end up in the job's log
+    assert 'Could not find missing' in done['log']
+    assert done['log'].count('downloading') == 4
+    assert [job['id'] for job in api.jobs()] == [job['id']]
+
+
+def test_jobs_share_one_track_pool(service):
+    service, client, api = service
+    for _ in range(2):
+        api.wait(api.submit({'type': 'playlist', 'id': 'pl1', 'dir': '/music'})['id'], poll_interval=0.05)
+    assert len(client.executors) == 2
+    assert client.executors[0] is client.executors[1] is not None
+
+
+def test_cancel(service):
+    service, client, api = service
+    client.release.clear()
+    running = api.submit({'type': 'playlist', 'id': 'pl1', 'dir': '/music'})
+    queued = api.submit({'type': 'playlist', 'id': 'pl1', 'dir': '/music'})
+
+    assert api.cancel(queued['id'])['status'] == 'cancelled'  # only one job runs at once, so it never started
+    api.cancel(running['id'])
+    client.release.set()
+    assert api.wait(running['id'], poll_interval=0.05)['status'] == 'cancelled'
+    assert api.status(queued['id'])['started'] is None
+
+    with pytest.raises(KeyError):
+        api.cancel('nope')
+
+
+@pytest.mark.parametrize('request_', [
+    {'type': 'song', 'id': 'x'},
+    {'type': 'track', 'id': 'x', 'name': 'y'},
+    {'type': 'track', 'id': 'x', 'workers': '4'},
+    {'type': 'track', 'id': 'x', 'workers': 0},
+    {'type': 'track', 'id': 'x', 'action': 'save'},
+])
+def test_invalid_jobs_are_rejected(service, request_):
+    service, client, api = service
+    with pytest.raises(ValueError):
+        api.submit(request_)
+    assert api.jobs() == []
@@ -0,0 +1,114 @@
+import os
+
+import music_tag
+import pytest
+
+from smp3 import store
+from smp3.quality import QualityProfile
+from smp3.store import ContentStore, link_file, profile_key
+from smp3.targets import OutputTarget
+from smp3.utils import collapse_duplicates
+
+FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413  # one silent MPEG-1 layer 3 frame, enough for music_tag to read
+
+
+def write_mp3(path, track_id: str = None, frames: int = 20) -> str:
+    path = str(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(FRAME * frames)
+    if track_id is not None:
+        f = music_tag.load_file(path)
+        f['comment'] = f"spotify:track:{track_id}"
+        f.save()
+    return path
+
+
+def refuse(*args):
+    raise OSError("not supported here")
+
+
+def test_link_file_hardlink(tmp_path):
+    source = write_mp3(tmp_path / 'a.mp3')
+    assert link_file(source, str(tmp_path / 'b.mp3')) == 'hardlink'
+    assert os.path.samefile(source, tmp_path / 'b.mp3')
+
+
+def test_link_file_falls_back_to_reflink(tmp_path, monkeypatch):
+    source = write_mp3(tmp_path / 'a.mp3')
+    monkeypatch.setattr(store.os, 'link', refuse)
+    monkeypatch.setattr(store, 'reflink', lambda src, dst: open(dst, 'wb').write(open(src, 'rb').read()))
+    assert link_file(source, str(tmp_path / 'b.mp3')) == 'reflink'
+
+
+def test_link_file_falls_back_to_copy(tmp_path, monkeypatch):
+    source = write_mp3(tmp_path / 'a.mp3')
+    destination = tmp_path / 'b.mp3'
+    destination.write_bytes(b'old')
+    monkeypatch.setattr(store.os, 'link', refuse)
+    monkeypatch.setattr(store, 'reflink', refuse)
+
+    assert link_file(source, str(destination)) == 'copy'
+    assert destination.read_bytes() == open(source, 'rb').read()  # replaced
+    assert not os.path.samefile(source, destination)
+    assert sorted(os.listdir(tmp_path)) == ['a.mp3', 'b.mp3']  # no temporary files left
+
+    with pytest.raises(ValueError):
+        link_file(source, str(destination), 'symlink')
+
+
+def test_link_file_starts_at_mode(tmp_path):
+    source = write_mp3(tmp_path / 'a.mp3')
+    assert link_file(source, str(tmp_path / 'b.mp3'), 'copy') == 'copy'
+
+
+def test_profile_key():
+    assert profile_key(OutputTarget('mp3', 320)) == 'mp3-320k'
+    assert profile_key(OutputTarget('mp3'), QualityProfile(bitrate=128)) == 'mp3-128k'
+    assert profile_key(OutputTarget('opus', 96), QualityProfile(bitrate=128)) == 'opus-96k'
+    assert profile_key(OutputTarget('opus')) == 'opus-best'
+    assert profile_key(OutputTarget('flac', 320)) == 'flac'
+
+
+def test_add_and_place(tmp_path):
+    content = ContentStore(str(tmp_path / 'store'))
+    assert content.place('abc', 'mp3-best', str(tmp_path)) is None
+
+    stored = content.add('abc', 'mp3-best', write_mp3(tmp_path / 'dl' / 'Song.mp3', 'abc'))
+    assert stored == str(tmp_path / 'store' / 'mp3-best' / 'abc' / 'Song.mp3')
+    assert content.add('abc', 'mp3-best', write_mp3(tmp_path / 'dl' / 'Other.mp3', 'abc')) == stored
+
+    playlist = tmp_path / 'playlist'
+    playlist.mkdir()
+    path, method = content.place('abc', 'mp3-best', str(playlist))
+    assert (path, method) == (str(playlist / 'Song.mp3'), 'hardlink')
+    assert content.place('abc', 'mp3-best', str(playlist)) == (path, 'exists')
+
+
+def test_place_next_to_another_track_of_the_same_name(tmp_path):
+    content = ContentStore(str(tmp_path / 'store'), link='copy')
+    content.add('abc', 'mp3-best', write_mp3(tmp_path / 'dl' / 'Song.mp3', 'abc'))
+    other = write_mp3(tmp_path / 'playlist' / 'Song.mp3', 'xyz')
+
+    path, method = content.place('abc', 'mp3-best', str(tmp_path / 'playlist'))
+    assert (path, method) == (str(tmp_path / 'playlist' / 'Song (abc).mp3'), 'copy')
+    assert music_tag.load_file(other)['comment'].value == 'spotify:track:xyz'  # left alone
+
+    # a copy of the same track counts as placed, by the ID stored in it
+    assert content.place('abc', 'mp3-best', str(tmp_path / 'playlist')) == (path, 'exists')
+
+
+def test_collapse_duplicates(tmp_path):
+    big = write_mp3(tmp_path / 'a' / 'Song.mp3', 'abc', frames=30)
+    small = write_mp3(tmp_path / 'b' / 'Song.mp3', 'abc')
+    other = write_mp3(tmp_path / 'b' / 'Other.mp3', 'xyz')
+    untagged = write_mp3(tmp_path / 'c' / 'Song.mp3')
+    size = os.path.getsize(small)
+
+    assert collapse_duplicates(str(tmp_path)) == size  # dry run
+    assert not os.path.samefile(big, small)
+
+    assert collapse_duplicates(str(tmp_path), dry_run=False) == size
+    assert os.path.samefile(big, small)  # the largest copy is kept
+    assert not os.path.samefile(big, other) and not os.path.samefile(big, untagged)
+    assert collapse_duplicates(str(tmp_path)) == 0
@@ -0,0 +1,34 @@
+from smp3.tags import apply_tags, comment_with_uri, read_track_id
+
+
+class File(dict):
+    """Stand-in for a music_tag file without artwork."""
+
+    def __getitem__(self, key):
+        if key == 'artwork':
+            raise KeyError(key)
+        return self.get(key, '')
+
+
+def test_comment_with_uri():
+    assert comment_with_uri('', 'abc') == 'spotify:track:abc'
+    assert comment_with_uri('Ripped from vinyl', 'abc') == 'Ripped from vinyl\nspotify:track:abc'
+    assert comment_with_uri('Ripped from vinyl\nspotify:track:old', 'abc') == 'Ripped from vinyl\nspotify:track:abc'
+    assert comment_with_uri('spotify:track:abc', 'abc') == 'spotify:track:abc'
+
+
+def test_apply_tags_keeps_comment():
+    f = File(title='Old', artist='Artist', album='Album', comment='Ripped from vinyl')
+    assert apply_tags(f, title='Song', artist='Artist', album='Album', track_id='abc')
+    assert f == {'title': 'Song', 'artist': 'Artist', 'album': 'Album',
+                 'comment': 'Ripped from vinyl\nspotify:track:abc'}
+    assert read_track_id(f) == 'abc'
+
+    # nothing changes the second time
+    assert not apply_tags(f, title='Song', artist='Artist', album='Album', track_id='abc')
+
+
+def test_apply_tags_without_track_id():
+    f = File(title='Song', artist='Artist', album='Album', comment='Mine')
+    assert not apply_tags(f, title='Song', artist='Artist', album='Album')
+    assert read_track_id(f) is None
@@ -0,0 +1,71 @@
+import threading
+import time
+import wave
+
+import pytest
+
+from smp3.governor import BandwidthGovernor
+from smp3.targets import OutputTarget, OutputNames, check_targets, copy_outputs, read_audio
+
+
+def test_check_targets():
+    check_targets([OutputTarget('mp3'), OutputTarget('opus'), OutputTarget('mp3', dir='phone')])
+    with pytest.raises(ValueError):
+        check_targets([OutputTarget('wav')])
+    with pytest.raises(ValueError):
+        check_targets([OutputTarget('mp3', 320), OutputTarget('mp3', 128)])
+
+
+def test_claim_keeps_names_apart():
+    names = OutputNames()
+    assert names.claim('a', 'Song') == 'Song'
+    assert names.claim('a', 'Song') == 'Song'  # the same track again
+    assert names.claim('b', 'Song') == 'Song (b)'
+    assert names.claim('c', 'song') == 'song (c)'  # names differing in case are the same file on some systems
+    assert names.claim('d', 'Other') == 'Other'
+
+
+def test_video_is_downloaded_once():
+    names = OutputNames()
+    downloads = []
+
+    def track(track_id: str):
+        with names.video('v1') as first_outputs:
+            if not first_outputs:
+                time.sleep(0.05)
+                downloads.append(track_id)
+                first_outputs.append(f"{track_id}.mp3")
+
+    threads = [threading.Thread(target=track, args=(track_id,)) for track_id in 'abcd']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(downloads) == 1
+
+
+def test_copy_outputs(tmp_path):
+    (tmp_path / 'phone').mkdir()
+    paths = [tmp_path / 'Song.mp3', tmp_path / 'phone' / 'Song.opus']
+    for path in paths:
+        path.write_bytes(path.suffix.encode())
+    (tmp_path / 'Song (b).mp3').write_bytes(b'old')
+
+    copies = copy_outputs([str(path) for path in paths], 'Song (b)')
+    assert copies == [str(tmp_path / 'Song (b).mp3'), str(tmp_path / 'phone' / 'Song (b).opus')]
+    assert [open(copy, 'rb').read() for copy in copies] == [b'.mp3', b'.opus']
+
+
+def test_read_audio_takes_bytes_from_governor(tmp_path):
+    path = tmp_path / 'tone.wav'
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(1)
+        wav.setframerate(8000)
+        wav.writeframes(bytes(range(256)) * 125)
+
+    governor = BandwidthGovernor()
+    audio = read_audio(str(path), governor, chunk_size=4096)
+    assert len(audio) == 4000  # milliseconds
+    assert governor.utilization()['bytes_total'] == path.stat().st_size
+    assert governor.utilization()['active_connections'] == 0
@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from smp3.watcher import FolderWatcher, _Checkpoint
+
+
+class Converter:
+    """Converts NAME.webm to NAME.mp3 and removes the source, like Spotify2MP3.watch does."""
+
+    def __init__(self, extension: str = '.mp3', block: threading.Event = None):
+        self.extension = extension
+        self.block = block
+        self.converted = []
+        self.running = 0
+        self.max_running = 0
+        self.__lock = threading.Lock()
+
+    def __call__(self, path: str) -> list[str]:
+        with self.__lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            if self.block is not None:
+                self.block.wait(5)
+            with open(path, 'rb') as file:
+                data = file.read()
+            output = os.path.splitext(path)[0] + self.extension
+            if output != path:
+                os.remove(path)
+            with open(output, 'wb') as file:
+                file.write(b'converted ' + data)
+            with self.__lock:
+                self.converted.append((path, data))
+            return [output]
+        finally:
+            with self.__lock:
+                self.running -= 1
+
+
+def run(watcher: FolderWatcher, seconds: float, during=None) -> None:
+    stop = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(stop,))
+    thread.start()
+    try:
+        if during is not None:
+            during()
+        time.sleep(seconds)
+    finally:
+        stop.set()
+        thread.join()
+
+
+def watcher(dir, convert, **kwargs) -> FolderWatcher:
+    kwargs = {'settle': 0.2, 'poll_interval': 0.05, 'use_inotify': False, 'checkpoint': str(dir / 'checkpoint.jsonl'),
+              **kwargs}
+    return FolderWatcher(str(dir), convert, **kwargs)
+
+
+@pytest.mark.parametrize('use_inotify', [False, True])
+def test_waits_until_file_is_written(tmp_path, use_inotify):
+    convert = Converter()
+
+    def write():
+        with open(tmp_path / 'song.webm', 'wb') as file:
+            for chunk in range(5):
+                file.write(b'%d' % chunk)
+                file.flush()
+                time.sleep(0.08)
+
+    run(watcher(tmp_path, convert, use_inotify=use_inotify), 0.6, during=write)
+    assert convert.converted == [(str(tmp_path / 'song.webm'), b'01234')]
+
+
+def test_checkpoint_appends_and_prunes(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    kept, removed = tmp_path / 'kept.webm', tmp_path / 'removed.webm'
+    kept.write_bytes(b'a')
+    removed.write_bytes(b'b')
+
+    checkpoint = _Checkpoint(path)
+    checkpoint.record(str(kept), os.stat(kept), outputs=['kept.mp3'])
+    checkpoint.record(str(removed), os.stat(removed), error='ValueError: bad')
+    checkpoint.record(str(kept), os.stat(kept), outputs=['kept.opus'])
+    with open(path) as file:
+        assert len(file.readlines()) == 3  # one line per record, nothing rewritten
+
+    removed.unlink()
+    with open(path, 'a') as file:
+        file.write('{"path": "cut off')  # left by a crash
+    checkpoint = _Checkpoint(path)
+    assert list(checkpoint.files) == [str(kept)]
+    assert checkpoint.get(str(kept), os.stat(kept))['outputs'] == ['kept.opus']
+    with open(path) as file:
+        assert [json.loads(line)['path'] for line in file] == [str(kept)]
+
+    kept.write_bytes(b'changed')
+    assert checkpoint.get(str(kept), os.stat(kept)) is None
+
+
+def test_restart_skips_converted_files(tmp_path):
+    convert = Converter()
+    (tmp_path / 'a.webm').write_bytes(b'a')
+    run(watcher(tmp_path, lambda path: [path]), 0.4)  # converted in place, the source is kept
+
+    run(watcher(tmp_path, convert), 0.4)
+    assert convert.converted == []
+
+
+@pytest.mark.parametrize('extension', ['.mp3', '.webm'])
+def test_outputs_are_not_converted_again(tmp_path, extension):
+    convert = Converter(extension=extension)
+    (tmp_path / 'song.webm').write_bytes(b'x')
+    run(watcher(tmp_path, convert, extensions=('.webm', '.mp3')), 0.8)
+    assert convert.converted == [(str(tmp_path / 'song.webm'), b'x')]
+
+
+def test_bounded_pool(tmp_path):
+    block = threading.Event()
+    convert = Converter(block=block)
+    for n in range(10):
+        (tmp_path / f'{n}.webm').write_bytes(b'%d' % n)
+
+    w = watcher(tmp_path, convert, workers=2)
+
+    def release():
+        time.sleep(0.5)
+        assert convert.running == 2
+        assert len(list(tmp_path.glob('*.webm'))) == 10  # nothing finished while blocked
+        block.set()
+
+    run(w, 0.6, during=release)
+    assert convert.max_running == 2
+    assert len(convert.converted) == w.converted == 10
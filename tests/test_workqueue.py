@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from smp3.track import TracksDict, TDValue
+from smp3.workqueue import WorkQueue
+
+TRACKS = TracksDict({
+    'a': TDValue('Song A', 'Artist', 'Album', 'https://img/a'),
+    'b': TDValue('Song B', 'Artist', 'Album', 'https://img/b', 200000, '2024-01-01T00:00:00Z', 'pl1'),
+})
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'), lease_seconds=0.5, max_attempts=2)
+    queue.push(TRACKS)
+    return queue
+
+
+def test_push_skips_tracks_already_in_batch(queue):
+    assert queue.push(TRACKS) == 0
+    assert queue.push(TRACKS, batch='other') == 2
+    assert queue.status()['total'] == {'pending': 4}
+
+
+def test_lease_in_order(queue):
+    job = queue.lease('w1')
+    assert (job.track_id, job.track, job.batch, job.attempts, job.worker) == ('a', TRACKS['a'], 'default', 1, 'w1')
+    assert queue.lease('w2').track_id == 'b'
+    assert queue.lease('w3') is None
+    assert queue.status()['workers'] == {'w1': 1, 'w2': 1}
+
+
+def test_ack(queue):
+    job = queue.lease('w1')
+    queue.ack(job, 'a.mp3')
+    assert queue.status()['total'] == {'done': 1, 'pending': 1}
+
+
+def test_expired_lease_goes_to_another_worker(queue):
+    job = queue.lease('w1')
+    queue.lease('w1')
+    time.sleep(0.7)
+    again = queue.lease('w2')
+    assert (again.id, again.attempts, again.worker) == (job.id, 2, 'w2')
+    assert not queue.renew(job)  # w1 lost it
+
+    queue.ack(job, 'late.mp3')  # acknowledging a lost lease changes nothing
+    assert queue.status()['workers'] == {'w2': 1}
+
+
+def test_renew_keeps_lease(queue):
+    job = queue.lease('w1')
+    for _ in range(4):
+        time.sleep(0.2)
+        assert queue.renew(job)
+    assert queue.lease('w2').track_id == 'b'  # 'a' is still leased after longer than lease_seconds
+
+
+def test_expired_lease_fails_after_max_attempts(queue):
+    queue.lease('w1')
+    queue.lease('w1')
+    time.sleep(0.7)
+    queue.lease('w2')
+    queue.lease('w2')
+    time.sleep(0.7)
+    assert queue.status()['total'] == {'failed': 2}
+    assert 'lease expired' in queue.failures()[0]['error']
+
+
+def test_fail_retries_then_gives_up(queue):
+    job = queue.lease('w1')
+    queue.fail(job, 'DownloadError: connection reset')
+    job = queue.lease('w1')
+    assert (job.track_id, job.attempts) == ('a', 2)
+    queue.fail(job, 'DownloadError: connection reset')
+
+    assert queue.lease('w1').track_id == 'b'
+    assert queue.failures() == [{'track_id': 'a', 'batch': 'default', 'name': 'Song A', 'attempts': 2,
+                                 'error': 'DownloadError: connection reset'}]
+
+    assert queue.retry_failed() == 1
+    job = queue.lease('w1')
+    assert (job.track_id, job.attempts) == ('a', 1)
+
+
+def test_status_by_batch(queue):
+    queue.push(TracksDict({'c': TDValue('Song C', 'Artist', 'Album', '')}), batch='pl2')
+    queue.ack(queue.lease('w1'))
+    assert queue.status()['batches'] == {'default': {'done': 1, 'pending': 1}, 'pl2': {'pending': 1}}
@@ -0,0 +1,45 @@
+import argparse
+from os.path import exists, isdir
+# Local
+from smp3 import Spotify2MP3, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, DOWNLOAD_PATH
+from smp3.arguments import add_network_arguments, add_quality_arguments, add_target_arguments, apply_network, \
+    apply_quality, apply_targets
+
+parser = argparse.ArgumentParser(description="""Watches a folder and converts audio files as they are added, e.g. by other
+download tools. Files are converted once they are completely written, several at once, and the originals are removed.""",
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+
+parser.add_argument('dir', metavar='dir', type=str, nargs='?', help='Folder to watch, defaults to the download path set in __init__')
+parser.add_argument('--ext', metavar='EXT', type=str, nargs='+', default=['.webm'], help='Extensions of files to convert, e.g. --ext .webm .m4a')
+add_target_arguments(parser)
+add_quality_arguments(parser, streams=False)
+add_network_arguments(parser, connections=False)
+parser.add_argument('--workers', metavar='N', type=int, default=2, help='Number of files to convert at once')
+parser.add_argument('--settle', metavar='seconds', type=float, default=2.0, help='Seconds a file must stay unchanged before it is converted')
+parser.add_argument('--checkpoint', metavar='path', type=str, help='File recording converted files, defaults to .smp3-watch.jsonl in the folder')
+parser.add_argument('--no-subfolders', action='store_true', help='Only watch the folder itself')
+parser.add_argument('--poll', action='store_true', help='Poll the folder instead of using inotify')
+parser.add_argument('--progress', type=str, choices=['bar', 'quiet', 'json'], default='bar', help='Progress output. Choices: bar, quiet, json')
+
+
+args = parser.parse_args()
+
+apply_network(args)
+
+watchpath = args.dir if args.dir is not None else DOWNLOAD_PATH
+
+if not isinstance(watchpath, str):
+    raise ValueError("Watch path must be a str type")
+elif not exists(watchpath):
+    raise FileNotFoundError("Watch directory does not exist.")
+elif not isdir(watchpath):
+    raise ValueError("Provided path is not a directory")
+
+s = Spotify2MP3(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
+s.set_dir(dir=watchpath)
+s.set_progress(args.progress)
+apply_targets(s, args)
+apply_quality(s, args)
+
+s.watch(extensions=tuple(ext if ext.startswith('.') else '.' + ext for ext in args.ext), workers=args.workers,
+        settle=args.settle, checkpoint=args.checkpoint, recursive=not args.no_subfolders, use_inotify=not args.poll)
@@ -0,0 +1,72 @@
+import argparse
+import json
+from contextlib import nullcontext
+from os.path import exists, isdir
+# Local
+from smp3 import Spotify2MP3, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, DOWNLOAD_PATH, metrics, profile, WorkQueue
+from smp3.arguments import add_network_arguments, add_quality_arguments, add_target_arguments, add_store_arguments, \
+    apply_network, apply_quality, apply_targets, apply_store
+
+parser = argparse.ArgumentParser(description="""Worker for a Spotify2MP3 work queue. Tracks are added to the queue with
+`cli.py TYPE ... --queue QUEUE`. Run a worker on every machine that should download, all pointing at the same queue.""",
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+
+parser.add_argument('queue', metavar='queue', type=str, help='Work queue database, e.g. on a shared drive')
+group = parser.add_mutually_exclusive_group(required=True)
+group.add_argument('-d', '--download', metavar='download', help='Path/folder to download tracks, leave value empty if set in __init__', nargs='?', const=True)
+group.add_argument('--status', action='store_true', help='Print the state of the queue and exit')
+group.add_argument('--retry-failed', action='store_true', help='Put failed tracks back in the queue and exit')
+
+parser.add_argument('--id', metavar='name', type=str, help='Name of this worker, defaults to hostname-pid')
+parser.add_argument('--workers', metavar='N', type=int, default=1, help='Number of tracks to download at once')
+parser.add_argument('--wait', action='store_true', help='Keep waiting for new tracks when the queue is empty')
+parser.add_argument('--lease', metavar='seconds', type=float, default=600, help='Seconds before a track held by an unresponsive worker is given to another')
+parser.add_argument('--max-attempts', metavar='N', type=int, default=3, help='Attempts per track before it is marked as failed')
+add_network_arguments(parser)
+add_quality_arguments(parser)
+add_target_arguments(parser)
+add_store_arguments(parser)
+parser.add_argument('--progress', type=str, choices=['bar', 'quiet', 'json'], default='bar', help='Progress output. Choices: bar, quiet, json')
+parser.add_argument('--profile', metavar='path', type=str, help='Profile the run by stage and save the report (JSON) to path')
+parser.add_argument('--metrics', metavar='path', type=str, help='File to export download metrics to, Prometheus format if it ends with .prom, else JSON')
+
+
+args = parser.parse_args()
+
+queue = WorkQueue(args.queue, lease_seconds=args.lease, max_attempts=args.max_attempts)
+
+if args.status:
+    print(json.dumps({**queue.status(), 'failures': queue.failures()}, indent=2))
+
+elif args.retry_failed:
+    print(queue.retry_failed(), 'tracks requeued')
+
+else:
+    if args.download == True:
+        downloadpath = DOWNLOAD_PATH
+    else:
+        downloadpath = args.download
+
+    if not isinstance(downloadpath, str):
+        raise ValueError("Download path must be a str type")
+    elif not exists(downloadpath):
+        raise FileNotFoundError("Download directory does not exist.")
+    elif not isdir(downloadpath):
+        raise ValueError("Provided path is not a directory")
+
+    apply_network(args)
+
+    with profile(args.profile) if args.profile else nullcontext():
+        s = Spotify2MP3(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
+        s.set_dir(dir=downloadpath)
+        s.set_progress(args.progress)
+        apply_targets(s, args)
+        apply_store(s, args)
+        apply_quality(s, args)
+        s.work_queue(queue=queue, worker=args.id, workers=args.workers, wait=args.wait)
+
+    if args.metrics is not None:
+        if args.metrics.endswith('.prom'):
+            metrics.export_prometheus(args.metrics)
+        else:
+            metrics.export_json(args.metrics)